@@ -5,6 +5,12 @@ SET FOREIGN_KEY_CHECKS = 0;
 
 -- Dropar tabelas existentes se elas existirem (para garantir um estado limpo)
 DROP TABLE IF EXISTS auditoria;
+DROP TABLE IF EXISTS relatorio_jobs;
+DROP TABLE IF EXISTS auditoria_resumo_diario;
+DROP TABLE IF EXISTS profissionais_contagem;
+DROP TABLE IF EXISTS versoes_dados;
+DROP TABLE IF EXISTS tokens_revogados;
+DROP TABLE IF EXISTS profissionais_busca;
 DROP TABLE IF EXISTS profissionais;
 DROP TABLE IF EXISTS usuarios;
 DROP TABLE IF EXISTS equipamentos;
@@ -36,6 +42,7 @@ CREATE TABLE usuarios (
     nivel_acesso INT NOT NULL DEFAULT 1,
     cidade_id INT,
     data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
+    versao_autorizacao INT NOT NULL DEFAULT 1,
     FOREIGN KEY (cidade_id) REFERENCES cidades(id) ON DELETE SET NULL
 );
 
@@ -59,12 +66,85 @@ CREATE TABLE profissionais (
     equipamento_id INT,
     ativo TINYINT(1) DEFAULT 1,
     motivo_inativacao TEXT,
+    versao INT NOT NULL DEFAULT 1,
     data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
     data_atualizacao DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX ix_profissionais_cidade_ativo_equipamento (cidade_id, ativo, equipamento_id),
+    INDEX ix_profissionais_cidade_ativo_nome (cidade_id, ativo, nome_completo),
+    INDEX ix_profissionais_equipamento_ativo (equipamento_id, ativo),
     FOREIGN KEY (cidade_id) REFERENCES cidades(id) ON DELETE SET NULL,
     FOREIGN KEY (equipamento_id) REFERENCES equipamentos(id) ON DELETE SET NULL
 );
 
+-- Criar tabela profissionais_busca (índice de busca por tokens normalizados)
+CREATE TABLE profissionais_busca (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    profissional_id INT NOT NULL,
+    campo VARCHAR(20) NOT NULL,
+    token VARCHAR(255) NOT NULL,
+    peso INT NOT NULL DEFAULT 1,
+    INDEX ix_profissionais_busca_profissional_id (profissional_id),
+    INDEX ix_profissionais_busca_token (token, campo, profissional_id),
+    FOREIGN KEY (profissional_id) REFERENCES profissionais(id) ON DELETE CASCADE
+);
+
+-- Criar tabela versoes_dados (contadores usados nos ETags das listagens)
+CREATE TABLE versoes_dados (
+    escopo VARCHAR(100) PRIMARY KEY,
+    versao INT NOT NULL DEFAULT 0
+);
+
+-- Criar tabela profissionais_contagem (contagens usadas nas estatísticas de relatórios)
+CREATE TABLE profissionais_contagem (
+    cidade_id INT NOT NULL,
+    equipamento_id INT NOT NULL,
+    profissao VARCHAR(100) NOT NULL,
+    ativo BOOLEAN NOT NULL,
+    total INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (cidade_id, equipamento_id, profissao, ativo)
+);
+
+-- Criar tabela tokens_revogados (jti revogados por rotação do refresh token ou logout)
+CREATE TABLE tokens_revogados (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    jti VARCHAR(36) NOT NULL UNIQUE,
+    usuario_id INT NOT NULL,
+    tipo VARCHAR(10) NOT NULL,
+    motivo VARCHAR(20) NOT NULL,
+    expira_em DATETIME NOT NULL,
+    data_revogacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_tokens_revogados_expira_em (expira_em)
+);
+
+-- Criar tabela relatorio_jobs (relatórios gerados em segundo plano; também é a fila dos jobs)
+CREATE TABLE relatorio_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    usuario_id INT NOT NULL,
+    formato VARCHAR(10) NOT NULL,
+    filtros JSON NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente',
+    linhas_processadas INT NOT NULL DEFAULT 0,
+    total_linhas INT,
+    arquivo VARCHAR(255),
+    erro TEXT,
+    data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+    data_inicio DATETIME,
+    data_conclusao DATETIME,
+    expira_em DATETIME,
+    INDEX ix_relatorio_jobs_usuario_status (usuario_id, status),
+    INDEX ix_relatorio_jobs_expira_em (expira_em)
+);
+
+-- Criar tabela auditoria_resumo_diario (contagem diária usada nas estatísticas de auditoria)
+CREATE TABLE auditoria_resumo_diario (
+    dia DATE NOT NULL,
+    acao VARCHAR(50) NOT NULL,
+    tabela VARCHAR(100) NOT NULL,
+    usuario_id INT NOT NULL,
+    total INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, acao, tabela, usuario_id)
+);
+
 -- Criar tabela auditoria
 CREATE TABLE auditoria (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -74,8 +154,14 @@ CREATE TABLE auditoria (
     registro_id INT,
     dados_antigos JSON,
     dados_novos JSON,
+    snapshot TINYINT(1),
     ip_origem VARCHAR(45),
     data_hora DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_auditoria_data_hora (data_hora, id),
+    INDEX ix_auditoria_registro_data_hora (tabela, registro_id, data_hora),
+    INDEX ix_auditoria_tabela_data_hora (tabela, data_hora),
+    INDEX ix_auditoria_acao_data_hora (acao, data_hora),
+    INDEX ix_auditoria_usuario_data_hora (usuario_id, data_hora),
     FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL
 );
 
@@ -0,0 +1,137 @@
+"""
+Mede o espaço ocupado pela auditoria de profissionais antes e depois de
+`flask auditoria compactar`.
+
+Uso:
+    python benchmarks/auditoria_armazenamento.py [--profissionais 2000] [--alteracoes 10] [--compressao 0,512]
+
+Para cada valor de --compressao (AUDITORIA_COMPRESSAO_BYTES), cria um banco
+SQLite temporário com a auditoria no formato antigo (estados completos antes
+e depois em cada alteração), converte com `compactar_auditoria` e confere que
+o estado reconstruído de uma amostra de profissionais não mudou.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+from src.models.database import db, Auditoria
+from src.utils.diferencas_auditoria import compactar_auditoria, reconstruir_estado
+
+AMOSTRA = 50
+
+
+def criar_app(url, compressao):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['AUDITORIA_COMPRESSAO_BYTES'] = compressao
+    db.init_app(app)
+    return app
+
+
+def estado_inicial(i):
+    return {
+        'id': i, 'equipamento_id': random.randint(1, 200), 'nome_completo': f'Profissional {i} da Silva',
+        'data_nascimento': date(1980, 1, 1).isoformat(), 'cpf': f'{i:011d}', 'rg': f'RG{i}',
+        'data_expedicao_rg': date(2000, 1, 1).isoformat(), 'escolaridade': 'Superior completo',
+        'profissao': 'Assistente Social', 'cargo': 'Técnico de referência', 'vinculo_institucional': 'Efetivo',
+        'telefone': '(11) 99999-0000', 'email': f'profissional{i}@exemplo.com',
+        'data_inicio_trabalho': date(2020, 1, 1).isoformat(),
+        'endereco_residencial': f'Rua das Acácias, {i}, Apto 12, Bairro Jardim das Flores, CEP 01234-567',
+        'cidade_id': random.randint(1, 40), 'data_cadastro': datetime(2024, 1, 1).isoformat(), 'ativo': True,
+        'motivo_inativacao': None, 'data_inativacao': None, 'versao': 1
+    }
+
+
+def alterar(estado, passo):
+    novo = dict(estado, versao=estado['versao'] + 1)
+    sorteio = random.random()
+    if sorteio < 0.5:
+        novo['telefone'] = f'(11) 9{random.randint(1000, 9999)}-{random.randint(1000, 9999)}'
+    elif sorteio < 0.7:
+        novo['endereco_residencial'] = f'Avenida Central, {random.randint(1, 999)}, Bairro Novo'
+    elif sorteio < 0.85:
+        novo['cargo'] = random.choice(['Coordenador', 'Técnico de referência', 'Orientador social'])
+    elif estado['ativo']:
+        novo.update(ativo=False, motivo_inativacao='Licença', data_inativacao=datetime(2024, 6, 1).isoformat())
+    else:
+        novo.update(ativo=True, motivo_inativacao=None, data_inativacao=None)
+    return novo
+
+
+def popular(total_profissionais, alteracoes):
+    linhas = []
+    inicio = datetime(2024, 1, 1)
+    for i in range(1, total_profissionais + 1):
+        estado = estado_inicial(i)
+        linhas.append({'usuario_id': 1, 'acao': 'CREATE', 'tabela': 'profissionais', 'registro_id': i,
+                       'dados_antigos': None, 'dados_novos': estado, 'snapshot': None, 'data_hora': inicio})
+        for passo in range(1, alteracoes + 1):
+            novo = alterar(estado, passo)
+            linhas.append({'usuario_id': 1, 'acao': 'UPDATE', 'tabela': 'profissionais', 'registro_id': i,
+                           'dados_antigos': estado, 'dados_novos': novo, 'snapshot': None,
+                           'data_hora': inicio + timedelta(hours=passo)})
+            estado = novo
+        if len(linhas) >= 5000:
+            db.session.execute(Auditoria.__table__.insert(), linhas)
+            linhas = []
+    if linhas:
+        db.session.execute(Auditoria.__table__.insert(), linhas)
+    db.session.commit()
+
+
+def tamanho_arquivo(caminho):
+    db.session.execute(text('VACUUM'))
+    return os.path.getsize(caminho)
+
+
+def medir(total_profissionais, alteracoes, compressao):
+    caminho = os.path.join(tempfile.mkdtemp(), 'auditoria.db')
+    app = criar_app(f'sqlite:///{caminho}', compressao)
+
+    with app.app_context():
+        db.create_all()
+        # O formato antigo é gravado sem compressão, como era antes
+        app.config['AUDITORIA_COMPRESSAO_BYTES'] = 0
+        popular(total_profissionais, alteracoes)
+        app.config['AUDITORIA_COMPRESSAO_BYTES'] = compressao
+
+        amostra = random.sample(range(1, total_profissionais + 1), min(AMOSTRA, total_profissionais))
+        esperados = [reconstruir_estado('profissionais', registro_id) for registro_id in amostra]
+        arquivo_antes = tamanho_arquivo(caminho)
+
+        resultado = compactar_auditoria()
+        arquivo_depois = tamanho_arquivo(caminho)
+
+        assert [reconstruir_estado('profissionais', registro_id) for registro_id in amostra] == esperados
+        return resultado['bytes_antes'], resultado['bytes_depois'], arquivo_antes, arquivo_depois
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profissionais', type=int, default=2000)
+    parser.add_argument('--alteracoes', type=int, default=10)
+    parser.add_argument('--compressao', default='0,512')
+    args = parser.parse_args()
+
+    registros = args.profissionais * (args.alteracoes + 1)
+    print(f'{args.profissionais} profissionais, {args.alteracoes} alterações cada ({registros} registros de auditoria)\n')
+    print(f"{'compressão':>11}{'dados antes':>14}{'dados depois':>14}{'redução':>9}"
+          f"{'arquivo antes':>15}{'arquivo depois':>16}{'redução':>9}")
+    for compressao in (int(valor) for valor in args.compressao.split(',')):
+        random.seed(42)
+        dados_antes, dados_depois, arquivo_antes, arquivo_depois = medir(
+            args.profissionais, args.alteracoes, compressao
+        )
+        print(f'{compressao or "-":>11}{dados_antes:>14,}{dados_depois:>14,}{1 - dados_depois / dados_antes:>9.0%}'
+              f'{arquivo_antes:>15,}{arquivo_depois:>16,}{1 - arquivo_depois / arquivo_antes:>9.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Mede o efeito dos índices compostos (migração 0001) em um banco populado.
+
+Uso:
+    python benchmarks/indices.py [--profissionais 50000] [--auditoria 200000] [--url sqlite:///...]
+
+Sem --url, usa um arquivo SQLite temporário. O banco informado é recriado.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import select, text
+from src.models.database import db, Cidade, Equipamento, Usuario, Profissional, Auditoria
+
+REPETICOES = 20
+
+
+def criar_app(url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    db.init_app(app)
+    return app
+
+
+def popular(total_profissionais, total_auditoria):
+    db.session.execute(Cidade.__table__.insert(), [
+        {'nome': f'Cidade {i}', 'status': 'ativo', 'data_cadastro': datetime.utcnow()} for i in range(1, 41)
+    ])
+    db.session.execute(Equipamento.__table__.insert(), [
+        {'nome': f'Equipamento {i}', 'status': 'ativo', 'data_cadastro': datetime.utcnow()} for i in range(1, 201)
+    ])
+    db.session.execute(Usuario.__table__.insert(), [
+        {'nome_completo': f'Usuário {i}', 'email': f'u{i}@exemplo.com', 'senha_hash': 'x',
+         'nivel_acesso': 3, 'cidade_id': i % 40 + 1, 'data_cadastro': datetime.utcnow()}
+        for i in range(1, 101)
+    ])
+
+    linhas = []
+    for i in range(total_profissionais):
+        linhas.append({
+            'equipamento_id': random.randint(1, 200), 'nome_completo': f'Profissional {random.random():.8f}',
+            'data_nascimento': date(1980, 1, 1), 'cpf': f'{i:011d}', 'rg': f'RG{i}',
+            'data_expedicao_rg': date(2000, 1, 1), 'escolaridade': 'Superior', 'profissao': 'Psicólogo',
+            'cargo': 'Técnico', 'vinculo_institucional': 'Efetivo', 'telefone': '0', 'email': f'p{i}@exemplo.com',
+            'data_inicio_trabalho': date(2020, 1, 1), 'endereco_residencial': 'Rua A, 1',
+            'cidade_id': random.randint(1, 40), 'data_cadastro': datetime.utcnow(), 'ativo': random.random() < 0.85
+        })
+        if len(linhas) == 5000:
+            db.session.execute(Profissional.__table__.insert(), linhas)
+            linhas = []
+    if linhas:
+        db.session.execute(Profissional.__table__.insert(), linhas)
+
+    inicio = datetime(2023, 1, 1)
+    linhas = []
+    for i in range(total_auditoria):
+        linhas.append({
+            'usuario_id': random.randint(1, 100), 'acao': random.choice(['CREATE', 'UPDATE', 'DELETE', 'EXPORT']),
+            'tabela': random.choice(['profissionais', 'cidades', 'equipamentos', 'usuarios']),
+            'registro_id': random.randint(1, total_profissionais),
+            'data_hora': inicio + timedelta(minutes=i), 'ip_origem': '127.0.0.1'
+        })
+        if len(linhas) == 5000:
+            db.session.execute(Auditoria.__table__.insert(), linhas)
+            linhas = []
+    if linhas:
+        db.session.execute(Auditoria.__table__.insert(), linhas)
+
+    db.session.commit()
+
+
+def consultas():
+    P, A = Profissional, Auditoria
+    return [
+        ('profissionais cidade+ativo+equipamento',
+         select(P.id, P.nome_completo).where(P.cidade_id == 7, P.ativo == True, P.equipamento_id == 42)),
+        ('profissionais cidade+ativo por nome (50)',
+         select(P.id, P.nome_completo).where(P.cidade_id == 7, P.ativo == True)
+         .order_by(P.nome_completo, P.id).limit(50)),
+        ('profissionais equipamento+ativo',
+         select(P.id, P.nome_completo).where(P.equipamento_id == 42, P.ativo == True)),
+        ('auditoria recentes (1000)',
+         select(A.id).order_by(A.data_hora.desc()).limit(1000)),
+        ('auditoria tabela recentes (1000)',
+         select(A.id).where(A.tabela == 'profissionais').order_by(A.data_hora.desc()).limit(1000)),
+        ('auditoria usuário recentes (1000)',
+         select(A.id).where(A.usuario_id == 13).order_by(A.data_hora.desc()).limit(1000)),
+    ]
+
+
+def medir():
+    resultados = {}
+    for nome, consulta in consultas():
+        db.session.execute(consulta).all()  # aquecimento
+        inicio = time.perf_counter()
+        for _ in range(REPETICOES):
+            db.session.execute(consulta).all()
+        resultados[nome] = (time.perf_counter() - inicio) / REPETICOES * 1000
+    return resultados
+
+
+def indices_compostos():
+    for tabela in (Profissional.__table__, Auditoria.__table__):
+        for indice in tabela.indexes:
+            if len(indice.columns) > 1:
+                yield indice
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profissionais', type=int, default=50000)
+    parser.add_argument('--auditoria', type=int, default=200000)
+    parser.add_argument('--url')
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    app = criar_app(url)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for indice in indices_compostos():
+            indice.drop(db.engine)
+
+        print(f'Populando {args.profissionais} profissionais e {args.auditoria} registros de auditoria...')
+        popular(args.profissionais, args.auditoria)
+        db.session.execute(text('ANALYZE' if db.engine.dialect.name == 'sqlite' else 'ANALYZE TABLE profissionais, auditoria'))
+
+        antes = medir()
+
+        for indice in indices_compostos():
+            indice.create(db.engine)
+        db.session.execute(text('ANALYZE' if db.engine.dialect.name == 'sqlite' else 'ANALYZE TABLE profissionais, auditoria'))
+
+        depois = medir()
+
+    print(f"\n{'consulta':<45}{'antes (ms)':>12}{'depois (ms)':>13}{'ganho':>9}")
+    for nome in antes:
+        print(f'{nome:<45}{antes[nome]:>12.2f}{depois[nome]:>13.2f}{antes[nome] / depois[nome]:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Mede a vazão de POST /api/auth/login para cada custo do bcrypt.
+
+Uso:
+    python benchmarks/login.py [--custos 10,11,12,13] [--workers 4] [--clientes 16] [--logins 64]
+
+Para cada custo, `--clientes` threads disparam `--logins` logins no total
+contra um app com o pool de senhas de `--workers` threads. Com mais clientes
+do que vagas no pool (workers * (FILA_POR_WORKER + 1)), parte dos logins é
+recusada com 503; a vazão conta só os aceitos, e os recusados aparecem ao
+lado. Também compara o tempo de uma senha errada com o de um email
+inexistente.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from src.models.database import db, Usuario
+from src.routes.auth import auth_bp
+from src.utils.senhas import pool_senhas
+
+TOTAL_USUARIOS = 50
+
+
+def criar_app(url, custo, workers):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['JWT_SECRET_KEY'] = 'benchmark'
+    app.config['BCRYPT_ROUNDS'] = custo
+    app.config['SENHAS_WORKERS'] = workers
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    return app
+
+
+def popular(custo):
+    senha_hash = bcrypt.hashpw(b'senha123', bcrypt.gensalt(custo)).decode('utf-8')
+    db.session.execute(Usuario.__table__.insert(), [
+        {'nome_completo': f'Usuário {i}', 'email': f'u{i}@exemplo.com', 'senha_hash': senha_hash,
+         'nivel_acesso': 2, 'data_cadastro': datetime.utcnow()}
+        for i in range(TOTAL_USUARIOS)
+    ])
+    db.session.commit()
+
+
+def logar(app, email, senha='senha123'):
+    with app.test_client() as cliente:
+        inicio = time.perf_counter()
+        resposta = cliente.post('/api/auth/login', json={'email': email, 'senha': senha})
+        return resposta.status_code, time.perf_counter() - inicio
+
+
+def medir(custo, workers, clientes, logins):
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    app = criar_app(url, custo, workers)
+
+    with app.app_context():
+        db.create_all()
+        popular(custo)
+
+    # Aquecimento (inicia o pool, que gera o hash fictício)
+    logar(app, 'inexistente@exemplo.com')
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        resultados = list(executor.map(
+            lambda i: logar(app, f'u{i % TOTAL_USUARIOS}@exemplo.com'), range(logins)
+        ))
+    duracao = time.perf_counter() - inicio
+    assert all(status in (200, 503) for status, _ in resultados), resultados
+    aceitos = sum(1 for status, _ in resultados if status == 200)
+
+    errada = min(logar(app, 'u0@exemplo.com', 'errada')[1] for _ in range(5))
+    inexistente = min(logar(app, 'inexistente@exemplo.com')[1] for _ in range(5))
+
+    pool_senhas.encerrar()
+    return aceitos / duracao, logins - aceitos, errada * 1000, inexistente * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--custos', default='10,11,12,13')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=64)
+    args = parser.parse_args()
+
+    print(f'{args.workers} workers de bcrypt, {args.clientes} clientes simultâneos, {args.logins} logins por custo\n')
+    print(f"{'custo':>5}{'logins/s':>11}{'por worker':>12}{'recusados (503)':>17}"
+          f"{'senha errada (ms)':>19}{'email inexistente (ms)':>24}")
+    for custo in (int(valor) for valor in args.custos.split(',')):
+        vazao, recusados, errada, inexistente = medir(custo, args.workers, args.clientes, args.logins)
+        print(f'{custo:>5}{vazao:>11.1f}{vazao / args.workers:>12.1f}{recusados:>17}'
+              f'{errada:>19.1f}{inexistente:>24.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Mede o pico de memória (RSS) e o tempo do relatório Excel de profissionais.
+
+Uso:
+    python benchmarks/relatorio_excel.py [--linhas 1000,10000,100000] [--modos memoria,streaming]
+
+Modos:
+    memoria    geração anterior: Workbook comum, ws.cell() por valor, segunda
+               passada em ws.columns para as larguras e gravação em BytesIO
+    streaming  `gerar_excel` (modo write-only, larguras calculadas na leitura,
+               saída em arquivo temporário)
+
+Cada medição roda em um processo separado, para que o pico de RSS de uma não
+contamine a outra. O banco SQLite de cada tamanho é criado uma vez.
+"""
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill
+from src.models.database import db, Cidade, Equipamento, Profissional
+from src.utils.relatorios import CABECALHOS_EXCEL, arquivo_temporario, consultar_profissionais, gerar_excel
+
+TOTAL_CIDADES = 40
+FILTROS = {'status': 'todos', 'cidade_id': None, 'equipamento_id': None, 'cidade_escopo': None}
+
+
+def criar_app(url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    db.init_app(app)
+    return app
+
+
+def popular(total):
+    agora = datetime.utcnow()
+    db.session.execute(Cidade.__table__.insert(), [
+        {'id': i, 'nome': f'Cidade {i}', 'status': 'ativo', 'data_cadastro': agora}
+        for i in range(1, TOTAL_CIDADES + 1)
+    ])
+    db.session.execute(Equipamento.__table__.insert(), [
+        {'id': i, 'nome': f'CRAS Centro {i}', 'cidade_id': i, 'status': 'ativo', 'data_cadastro': agora}
+        for i in range(1, TOTAL_CIDADES + 1)
+    ])
+    for inicio in range(0, total, 5000):
+        db.session.execute(Profissional.__table__.insert(), [
+            {'equipamento_id': i % TOTAL_CIDADES + 1, 'cidade_id': i % TOTAL_CIDADES + 1,
+             'nome_completo': f'Profissional {i} da Silva', 'data_nascimento': date(1980, 1, 1),
+             'cpf': f'{i:011d}', 'rg': f'RG{i}', 'data_expedicao_rg': date(2000, 1, 1),
+             'escolaridade': 'Superior completo', 'profissao': 'Assistente Social',
+             'cargo': 'Técnico de referência', 'vinculo_institucional': 'Efetivo',
+             'telefone': '(11) 99999-0000', 'email': f'profissional{i}@exemplo.com',
+             'data_inicio_trabalho': date(2020, 1, 1),
+             'endereco_residencial': f'Rua das Acácias, {i}, Apto 12, Bairro Jardim das Flores',
+             'data_cadastro': agora, 'ativo': i % 7 != 0, 'versao': 1}
+            for i in range(inicio, min(inicio + 5000, total))
+        ])
+    db.session.commit()
+
+
+def excel_em_memoria(filtros):
+    # Geração anterior ao modo write-only, mantida aqui só para comparação
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Profissionais"
+
+    for col, header in enumerate(CABECALHOS_EXCEL, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+
+    for row, prof in enumerate(consultar_profissionais(filtros), 2):
+        data = [
+            prof.nome_completo, prof.cpf, prof.rg, prof.data_nascimento.strftime('%d/%m/%Y'),
+            prof.escolaridade, prof.profissao, prof.cargo, prof.vinculo_institucional, prof.telefone,
+            prof.email, prof.data_inicio_trabalho.strftime('%d/%m/%Y'), prof.endereco_residencial,
+            prof.cidade_nome or 'N/A', prof.equipamento_nome or 'N/A', 'Ativo' if prof.ativo else 'Inativo'
+        ]
+        for col, value in enumerate(data, 1):
+            ws.cell(row=row, column=col, value=value)
+
+    for column in ws.columns:
+        max_length = max(len(str(cell.value)) for cell in column)
+        ws.column_dimensions[column[0].column_letter].width = min(max_length + 2, 50)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getbuffer().nbytes
+
+
+def excel_streaming(filtros):
+    with arquivo_temporario() as arquivo:
+        gerar_excel(filtros, arquivo)
+        return arquivo.tell()
+
+
+def medir_processo(modo, caminho):
+    """Executado no processo filho: gera o relatório e imprime tempo, pico de RSS e tamanho."""
+    app = criar_app(f'sqlite:///{caminho}')
+    with app.app_context():
+        base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        inicio = time.perf_counter()
+        tamanho = (excel_em_memoria if modo == 'memoria' else excel_streaming)(FILTROS)
+        duracao = time.perf_counter() - inicio
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux
+    print(duracao, pico * 1024, (pico - base) * 1024, tamanho)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', default='1000,10000,100000')
+    parser.add_argument('--modos', default='memoria,streaming')
+    parser.add_argument('--medir', nargs=2, metavar=('MODO', 'BANCO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir_processo(*args.medir)
+        return
+
+    print(f"{'linhas':>8}{'modo':>11}{'tempo (s)':>11}{'pico RSS (MB)':>15}{'acréscimo (MB)':>16}{'arquivo (MB)':>14}")
+    for total in (int(valor) for valor in args.linhas.split(',')):
+        caminho = os.path.join(tempfile.mkdtemp(), 'relatorio.db')
+        app = criar_app(f'sqlite:///{caminho}')
+        with app.app_context():
+            db.create_all()
+            popular(total)
+
+        for modo in args.modos.split(','):
+            saida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--medir', modo, caminho],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            duracao, pico, acrescimo, tamanho = float(saida[0]), int(saida[1]), int(saida[2]), int(saida[3])
+            print(f'{total:>8,}{modo:>11}{duracao:>11.2f}{pico / 2**20:>15.1f}{acrescimo / 2**20:>16.1f}'
+                  f'{tamanho / 2**20:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
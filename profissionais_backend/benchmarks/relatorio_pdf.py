@@ -0,0 +1,125 @@
+"""
+Mede o pico de memória (RSS) e o tempo do relatório PDF de profissionais.
+
+Uso:
+    python benchmarks/relatorio_pdf.py [--linhas 1000,10000,50000] [--modos tabela_unica,blocos]
+
+Modos:
+    tabela_unica  geração anterior: uma única Table com todas as linhas,
+                  ROWBACKGROUNDS e GRID sobre o intervalo inteiro
+    blocos        `gerar_pdf` (tabelas de LINHAS_POR_TABELA_PDF linhas,
+                  montadas durante a composição das páginas)
+    agrupado      `gerar_pdf` com agrupamento por cidade e subtotais
+
+Cada medição roda em um processo separado, para que o pico de RSS de uma não
+contamine a outra. O banco SQLite de cada tamanho é criado uma vez.
+"""
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+from relatorio_excel import FILTROS, criar_app, popular
+from src.models.database import db
+from src.utils.relatorios import consultar_profissionais, gerar_pdf
+
+
+def pdf_tabela_unica(filtros):
+    # Geração anterior aos blocos, mantida aqui só para comparação
+    profissionais = consultar_profissionais(filtros).all()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+
+    data = [['Nome', 'CPF', 'Profissão', 'Cargo', 'Equipamento', 'Status']]
+    for prof in profissionais:
+        data.append([
+            prof.nome_completo, prof.cpf, prof.profissao, prof.cargo,
+            prof.equipamento_nome or 'N/A', 'Ativo' if prof.ativo else 'Inativo'
+        ])
+
+    table = Table(data, colWidths=[2*inch, 1.2*inch, 1.5*inch, 1.5*inch, 1.5*inch, 0.8*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ]))
+
+    doc.build([table])
+    return buffer.getbuffer().nbytes
+
+
+def pdf_blocos(filtros):
+    with tempfile.TemporaryFile() as arquivo:
+        gerar_pdf(filtros, arquivo)
+        return arquivo.tell()
+
+
+MODOS = {
+    'tabela_unica': pdf_tabela_unica,
+    'blocos': pdf_blocos,
+    'agrupado': lambda filtros: pdf_blocos(dict(filtros, agrupar='cidade'))
+}
+
+
+def medir_processo(modo, caminho):
+    """Executado no processo filho: gera o relatório e imprime tempo, pico de RSS e tamanho."""
+    app = criar_app(f'sqlite:///{caminho}')
+    with app.app_context():
+        base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        inicio = time.perf_counter()
+        tamanho = MODOS[modo](dict(FILTROS, agrupar=None))
+        duracao = time.perf_counter() - inicio
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux
+    print(duracao, pico * 1024, (pico - base) * 1024, tamanho)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', default='1000,10000,50000')
+    parser.add_argument('--modos', default='tabela_unica,blocos,agrupado')
+    parser.add_argument('--medir', nargs=2, metavar=('MODO', 'BANCO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir_processo(*args.medir)
+        return
+
+    print(f"{'linhas':>8}{'modo':>14}{'tempo (s)':>11}{'pico RSS (MB)':>15}{'acréscimo (MB)':>16}"
+          f"{'arquivo (MB)':>14}{'µs/linha':>10}")
+    for total in (int(valor) for valor in args.linhas.split(',')):
+        caminho = os.path.join(tempfile.mkdtemp(), 'relatorio.db')
+        app = criar_app(f'sqlite:///{caminho}')
+        with app.app_context():
+            db.create_all()
+            popular(total)
+
+        for modo in args.modos.split(','):
+            saida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--medir', modo, caminho],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            duracao, pico, acrescimo, tamanho = float(saida[0]), int(saida[1]), int(saida[2]), int(saida[3])
+            print(f'{total:>8,}{modo:>14}{duracao:>11.2f}{pico / 2**20:>15.1f}{acrescimo / 2**20:>16.1f}'
+                  f'{tamanho / 2**20:>14.1f}{duracao / total * 1e6:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import os
 import sys
+from datetime import timedelta
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
@@ -15,17 +16,65 @@ from src.routes.profissionais import profissionais_bp
 from src.routes.usuarios import usuarios_bp
 from src.routes.auditoria import auditoria_bp
 from src.routes.relatorios import relatorios_bp
+from src.utils.autorizacao import token_revogado
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-string'
 
 # Configuração CORS
-CORS(app, origins="*")
+CORS(app, origins="*", expose_headers=['ETag', 'X-Next-Cursor', 'X-Total-Count', 'X-Total-Count-Approximate'])
 
 # Configuração JWT
+# Tokens de acesso curtos; o refresh token (rotativo) renova a sessão sem novo login
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.environ.get('ACCESS_TOKEN_MINUTOS', 15)))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.environ.get('REFRESH_TOKEN_DIAS', 7)))
+# Segundos até que uma mudança de nível/cidade feita em outro processo revogue os tokens antigos
+app.config['AUTORIZACAO_CACHE_TTL'] = int(os.environ.get('AUTORIZACAO_CACHE_TTL', 30))
 jwt = JWTManager(app)
 
+# Custo do bcrypt e tamanho do pool de verificação de senhas.
+# Hashes com outro custo são regravados no próximo login bem-sucedido.
+app.config['BCRYPT_ROUNDS'] = int(os.environ.get('BCRYPT_ROUNDS', 12))
+app.config['SENHAS_WORKERS'] = int(os.environ.get('SENHAS_WORKERS', min(4, os.cpu_count() or 1)))
+jwt.token_in_blocklist_loader(token_revogado)
+
+# Auditoria: 'transacao' grava junto com a alteração; 'assincrono' usa uma fila
+# em memória gravada em lotes por uma thread (esvaziada no encerramento)
+app.config['AUDITORIA_MODO'] = os.environ.get('AUDITORIA_MODO', 'transacao')
+app.config['AUDITORIA_FILA_MAXIMA'] = int(os.environ.get('AUDITORIA_FILA_MAXIMA', 10000))
+app.config['AUDITORIA_LOTE'] = int(os.environ.get('AUDITORIA_LOTE', 500))
+app.config['AUDITORIA_INTERVALO_MS'] = int(os.environ.get('AUDITORIA_INTERVALO_MS', 200))
+
+# Retenção: `flask --app src.main auditoria arquivar` move registros mais
+# antigos que isto para arquivos mensais .jsonl.gz
+app.config['AUDITORIA_RETENCAO_DIAS'] = int(os.environ.get('AUDITORIA_RETENCAO_DIAS', 365))
+app.config['AUDITORIA_ARQUIVO_DIR'] = os.environ.get('AUDITORIA_ARQUIVO_DIR')
+
+# Dados da auditoria: só os campos alterados, com o estado completo a cada N
+# alterações do registro; JSON acima de AUDITORIA_COMPRESSAO_BYTES é gravado
+# compactado (0 desativa)
+app.config['AUDITORIA_INTERVALO_SNAPSHOT'] = int(os.environ.get('AUDITORIA_INTERVALO_SNAPSHOT', 20))
+app.config['AUDITORIA_COMPRESSAO_BYTES'] = int(os.environ.get('AUDITORIA_COMPRESSAO_BYTES', 0))
+
+# Relatórios: arquivos gerados ficam em memória até este tamanho e depois em
+# um arquivo temporário em disco
+app.config['RELATORIO_SPOOL_BYTES'] = int(os.environ.get('RELATORIO_SPOOL_BYTES', 8 * 1024 * 1024))
+
+# Jobs de relatório (POST /api/relatorios/jobs): processos que geram os
+# arquivos, jobs em andamento por usuário e horas até o arquivo expirar
+# (`flask --app src.main relatorios limpar-jobs` remove os expirados)
+app.config['RELATORIO_WORKERS'] = int(os.environ.get('RELATORIO_WORKERS', min(2, os.cpu_count() or 1)))
+app.config['RELATORIO_JOBS_POR_USUARIO'] = int(os.environ.get('RELATORIO_JOBS_POR_USUARIO', 2))
+app.config['RELATORIO_RETENCAO_HORAS'] = int(os.environ.get('RELATORIO_RETENCAO_HORAS', 24))
+app.config['RELATORIO_DIR'] = os.environ.get('RELATORIO_DIR')
+
+# Cache dos arquivos de relatório por filtros, escopo e versão dos dados:
+# espaço máximo (0 desativa) e horas sem uso até a remoção
+app.config['RELATORIO_CACHE_BYTES'] = int(os.environ.get('RELATORIO_CACHE_BYTES', 512 * 1024 * 1024))
+app.config['RELATORIO_CACHE_HORAS'] = int(os.environ.get('RELATORIO_CACHE_HORAS', 24))
+app.config['RELATORIO_CACHE_DIR'] = os.environ.get('RELATORIO_CACHE_DIR')
+
 # Registrar blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(cidades_bp, url_prefix='/api/cidades')
@@ -39,7 +88,7 @@ app.register_blueprint(relatorios_bp, url_prefix='/api/relatorios')
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(__file__), 'migrations'))
 
 with app.app_context():
     db.create_all()
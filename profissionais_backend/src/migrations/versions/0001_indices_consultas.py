@@ -0,0 +1,44 @@
+"""Índices compostos para as consultas de profissionais e auditoria
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDICES = [
+    ('profissionais', 'ix_profissionais_cidade_ativo_equipamento', ['cidade_id', 'ativo', 'equipamento_id']),
+    ('profissionais', 'ix_profissionais_cidade_ativo_nome', ['cidade_id', 'ativo', 'nome_completo']),
+    ('profissionais', 'ix_profissionais_equipamento_ativo', ['equipamento_id', 'ativo']),
+    ('auditoria', 'ix_auditoria_data_hora', ['data_hora', 'id']),
+    ('auditoria', 'ix_auditoria_tabela_data_hora', ['tabela', 'data_hora']),
+    ('auditoria', 'ix_auditoria_acao_data_hora', ['acao', 'data_hora']),
+    ('auditoria', 'ix_auditoria_usuario_data_hora', ['usuario_id', 'data_hora']),
+]
+
+
+def _indices_existentes(tabela):
+    # Bancos novos já recebem os índices pelo db.create_all() do main.py
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def upgrade():
+    for tabela, nome, colunas in INDICES:
+        if nome not in _indices_existentes(tabela):
+            op.create_index(nome, tabela, colunas)
+
+
+def downgrade():
+    for tabela, nome, colunas in reversed(INDICES):
+        if nome in _indices_existentes(tabela):
+            op.drop_index(nome, table_name=tabela)
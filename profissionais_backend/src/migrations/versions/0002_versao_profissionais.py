@@ -0,0 +1,32 @@
+"""Coluna de versão em profissionais (concorrência otimista)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _colunas_existentes(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def upgrade():
+    if 'versao' not in _colunas_existentes('profissionais'):
+        with op.batch_alter_table('profissionais') as batch_op:
+            batch_op.add_column(sa.Column('versao', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    if 'versao' in _colunas_existentes('profissionais'):
+        with op.batch_alter_table('profissionais') as batch_op:
+            batch_op.drop_column('versao')
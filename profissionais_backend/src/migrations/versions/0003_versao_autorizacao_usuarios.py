@@ -0,0 +1,32 @@
+"""Versão de autorização dos usuários (revogação de tokens)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def _colunas_existentes(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def upgrade():
+    if 'versao_autorizacao' not in _colunas_existentes('usuarios'):
+        with op.batch_alter_table('usuarios') as batch_op:
+            batch_op.add_column(sa.Column('versao_autorizacao', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    if 'versao_autorizacao' in _colunas_existentes('usuarios'):
+        with op.batch_alter_table('usuarios') as batch_op:
+            batch_op.drop_column('versao_autorizacao')
@@ -0,0 +1,45 @@
+"""Auditoria codificada por diferença (coluna snapshot e índice por registro)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+INDICE = 'ix_auditoria_registro_data_hora'
+
+
+def _colunas_existentes(tabela):
+    return {coluna['name'] for coluna in sa.inspect(op.get_bind()).get_columns(tabela)}
+
+
+def _indices_existentes(tabela):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def upgrade():
+    # Registros existentes ficam com snapshot NULL até `flask auditoria compactar`
+    if 'snapshot' not in _colunas_existentes('auditoria'):
+        with op.batch_alter_table('auditoria') as batch_op:
+            batch_op.add_column(sa.Column('snapshot', sa.Boolean(), nullable=True))
+
+    if INDICE not in _indices_existentes('auditoria'):
+        op.create_index(INDICE, 'auditoria', ['tabela', 'registro_id', 'data_hora'])
+
+
+def downgrade():
+    if INDICE in _indices_existentes('auditoria'):
+        op.drop_index(INDICE, table_name='auditoria')
+
+    if 'snapshot' in _colunas_existentes('auditoria'):
+        with op.batch_alter_table('auditoria') as batch_op:
+            batch_op.drop_column('snapshot')
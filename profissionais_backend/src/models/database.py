@@ -1,8 +1,42 @@
+import base64
+import json
+import zlib
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import date, datetime
 
 db = SQLAlchemy()
 
+def _serializar(valor):
+    # Datas e horários seguem o mesmo formato ISO usado em to_dict()
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+class JSONCompactavel(db.TypeDecorator):
+    """
+    Coluna JSON que grava compactados (zlib + base64, em {"_zlib": ...}) os
+    valores cujo JSON passa de AUDITORIA_COMPRESSAO_BYTES (0 desativa).
+    A leitura descompacta de forma transparente.
+    """
+    impl = db.JSON
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        limite = current_app.config.get('AUDITORIA_COMPRESSAO_BYTES', 0) if has_app_context() else 0
+        if value is None or not limite:
+            return value
+        
+        conteudo = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if len(conteudo) <= limite:
+            return value
+        return {'_zlib': base64.b64encode(zlib.compress(conteudo, 9)).decode('ascii')}
+    
+    def process_result_value(self, value, dialect):
+        if isinstance(value, dict) and len(value) == 1 and '_zlib' in value:
+            return json.loads(zlib.decompress(base64.b64decode(value['_zlib'])).decode('utf-8'))
+        return value
+
 class Cidade(db.Model):
     __tablename__ = 'cidades'
     
@@ -54,6 +88,7 @@ class Usuario(db.Model):
     nivel_acesso = db.Column(db.Integer, nullable=False)  # 1=Visualização, 2=Editor, 3=Admin Cidade, 4=Admin Global
     cidade_id = db.Column(db.Integer, db.ForeignKey('cidades.id'), nullable=True)
     data_cadastro = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    versao_autorizacao = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Incrementada para revogar tokens
     
     # Relacionamentos
     auditorias = db.relationship('Auditoria', backref='usuario', lazy=True)
@@ -91,8 +126,25 @@ class Profissional(db.Model):
     ativo = db.Column(db.Boolean, nullable=False, default=True)
     motivo_inativacao = db.Column(db.Text)
     data_inativacao = db.Column(db.DateTime)
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
-    def to_dict(self):
+    # Cada UPDATE via ORM confere e incrementa a versão (concorrência otimista)
+    __mapper_args__ = {'version_id_col': versao}
+    
+    # Índices dos caminhos de acesso reais: listagem por cidade/status
+    # (opcionalmente por equipamento ou ordenada por nome) e por equipamento
+    __table_args__ = (
+        db.Index('ix_profissionais_cidade_ativo_equipamento', 'cidade_id', 'ativo', 'equipamento_id'),
+        db.Index('ix_profissionais_cidade_ativo_nome', 'cidade_id', 'ativo', 'nome_completo'),
+        db.Index('ix_profissionais_equipamento_ativo', 'equipamento_id', 'ativo'),
+    )
+    
+    def to_dict(self, campos=None):
+        # Serialização parcial: lê apenas os atributos pedidos, o que permite
+        # usar a instância carregada com load_only sem disparar lazy loads
+        if campos is not None:
+            return {campo: _serializar(getattr(self, campo)) for campo in campos}
+        
         return {
             'id': self.id,
             'equipamento_id': self.equipamento_id,
@@ -113,9 +165,111 @@ class Profissional(db.Model):
             'data_cadastro': self.data_cadastro.isoformat() if self.data_cadastro else None,
             'ativo': self.ativo,
             'motivo_inativacao': self.motivo_inativacao,
-            'data_inativacao': self.data_inativacao.isoformat() if self.data_inativacao else None
+            'data_inativacao': self.data_inativacao.isoformat() if self.data_inativacao else None,
+            'versao': self.versao
         }
 
+class ProfissionalBusca(db.Model):
+    __tablename__ = 'profissionais_busca'
+    
+    # Índice de busca: um token normalizado (minúsculo, sem acentos) por linha
+    id = db.Column(db.Integer, primary_key=True)
+    profissional_id = db.Column(db.Integer, db.ForeignKey('profissionais.id'), nullable=False, index=True)
+    campo = db.Column(db.String(20), nullable=False)
+    token = db.Column(db.String(255), nullable=False)
+    peso = db.Column(db.Integer, nullable=False, default=1)
+    
+    __table_args__ = (
+        db.Index('ix_profissionais_busca_token', 'token', 'campo', 'profissional_id'),
+    )
+
+class VersaoDados(db.Model):
+    __tablename__ = 'versoes_dados'
+    
+    # Contador incrementado a cada escrita no escopo (tabela ou tabela:cidade)
+    escopo = db.Column(db.String(100), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+class ProfissionalContagem(db.Model):
+    __tablename__ = 'profissionais_contagem'
+    
+    # Quantidade de profissionais por grupo, mantida a cada escrita em
+    # profissionais; as estatísticas leem daqui em vez de agrupar a tabela
+    cidade_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    equipamento_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    profissao = db.Column(db.String(100), primary_key=True)
+    ativo = db.Column(db.Boolean, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class TokenRevogado(db.Model):
+    __tablename__ = 'tokens_revogados'
+    
+    # jti de tokens revogados antes de expirar (rotação do refresh token, logout)
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    tipo = db.Column(db.String(10), nullable=False)
+    motivo = db.Column(db.String(20), nullable=False)  # rotacao, logout
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+    data_revogacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class RelatorioJob(db.Model):
+    __tablename__ = 'relatorio_jobs'
+    
+    # Relatório gerado em segundo plano; a tabela também é a fila dos jobs
+    id = db.Column(db.String(36), primary_key=True)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    formato = db.Column(db.String(10), nullable=False)  # pdf, excel
+    filtros = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, executando, concluido, erro, cancelado
+    linhas_processadas = db.Column(db.Integer, nullable=False, default=0)
+    total_linhas = db.Column(db.Integer)
+    arquivo = db.Column(db.String(255))
+    erro = db.Column(db.Text)
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    data_inicio = db.Column(db.DateTime)
+    data_conclusao = db.Column(db.DateTime)
+    expira_em = db.Column(db.DateTime, index=True)
+    
+    # Jobs em andamento de um usuário (limite de concorrência) e a listagem
+    __table_args__ = (
+        db.Index('ix_relatorio_jobs_usuario_status', 'usuario_id', 'status'),
+    )
+    
+    def to_dict(self):
+        progresso = 0
+        if self.status == 'concluido':
+            progresso = 100
+        elif self.total_linhas:
+            progresso = min(99, self.linhas_processadas * 100 // self.total_linhas)
+        
+        return {
+            'id': self.id,
+            'usuario_id': self.usuario_id,
+            'formato': self.formato,
+            'filtros': self.filtros,
+            'status': self.status,
+            'progresso': progresso,
+            'linhas_processadas': self.linhas_processadas,
+            'total_linhas': self.total_linhas,
+            'erro': self.erro,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
+            'data_inicio': self.data_inicio.isoformat() if self.data_inicio else None,
+            'data_conclusao': self.data_conclusao.isoformat() if self.data_conclusao else None,
+            'expira_em': self.expira_em.isoformat() if self.expira_em else None
+        }
+
+class AuditoriaResumoDiario(db.Model):
+    __tablename__ = 'auditoria_resumo_diario'
+    
+    # Contagem diária de registros de auditoria, mantida a cada gravação;
+    # as estatísticas leem daqui em vez de agrupar a tabela auditoria
+    dia = db.Column(db.Date, primary_key=True)
+    acao = db.Column(db.String(50), primary_key=True)
+    tabela = db.Column(db.String(100), primary_key=True)
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
 class Auditoria(db.Model):
     __tablename__ = 'auditoria'
     
@@ -124,11 +278,25 @@ class Auditoria(db.Model):
     acao = db.Column(db.String(255), nullable=False)
     tabela = db.Column(db.String(255), nullable=False)
     registro_id = db.Column(db.Integer, nullable=False)
-    dados_antigos = db.Column(db.JSON)
-    dados_novos = db.Column(db.JSON)
+    # Apenas os campos alterados; em snapshots, dados_novos traz o estado completo
+    dados_antigos = db.Column(JSONCompactavel)
+    dados_novos = db.Column(JSONCompactavel)
+    # True: dados_novos é o estado completo; False: só a diferença;
+    # None: registro anterior à codificação por diferença (ver `auditoria compactar`)
+    snapshot = db.Column(db.Boolean)
     data_hora = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     ip_origem = db.Column(db.String(45))
     
+    # A tela de auditoria filtra por tabela, ação ou usuário e ordena por data;
+    # o histórico de um registro é lido por (tabela, registro_id)
+    __table_args__ = (
+        db.Index('ix_auditoria_data_hora', 'data_hora', 'id'),
+        db.Index('ix_auditoria_registro_data_hora', 'tabela', 'registro_id', 'data_hora'),
+        db.Index('ix_auditoria_tabela_data_hora', 'tabela', 'data_hora'),
+        db.Index('ix_auditoria_acao_data_hora', 'acao', 'data_hora'),
+        db.Index('ix_auditoria_usuario_data_hora', 'usuario_id', 'data_hora'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -138,6 +306,7 @@ class Auditoria(db.Model):
             'registro_id': self.registro_id,
             'dados_antigos': self.dados_antigos,
             'dados_novos': self.dados_novos,
+            'snapshot': self.snapshot,
             'data_hora': self.data_hora.isoformat() if self.data_hora else None,
             'ip_origem': self.ip_origem
         }
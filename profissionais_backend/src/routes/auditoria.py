@@ -1,91 +1,160 @@
+import click
+from collections import Counter
+from itertools import islice
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select
 from src.models.database import db, Auditoria, Usuario
+from src.utils.autorizacao import requer_nivel, usuario_atual
+from src.utils.auditoria import estatisticas_pipeline
+from src.utils.arquivo_auditoria import (
+    arquivar_auditoria, mesclar_com_arquivo, LOTE_PADRAO
+)
+from src.utils.consulta_auditoria import (
+    ler_data, usuarios_visiveis, ler_filtros_auditoria, condicoes_auditoria, consultar_arquivados
+)
+from src.utils.diferencas_auditoria import compactar_auditoria, expandir_registro, tamanho_auditoria, \
+    LOTE_PADRAO as LOTE_COMPACTACAO
+from src.utils.resumo_auditoria import consultar_resumo, reconstruir_resumo
+from src.utils.streaming import quer_streaming, resposta_ndjson, resposta_ndjson_registros
+from src.utils.paginacao import (
+    ler_limite, codificar_cursor, decodificar_cursor, aplicar_cursor, aplicar_ordenacao, cabecalhos_paginacao
+)
 
 auditoria_bp = Blueprint('auditoria', __name__)
 
-def verificar_permissao_admin():
-    current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(current_user_id)
-    return usuario and usuario.nivel_acesso >= 3  # Admin Cidade ou Admin Global
+# Registros por página quando `limit` não é informado
+LIMITE_PADRAO = 100
 
 @auditoria_bp.route('/', methods=['GET'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def listar_auditoria():
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
+        # Parâmetros de filtro (usuários restritos ao escopo de quem consulta)
+        filtros = ler_filtros_auditoria(request.args, usuario_atual())
+        limite = ler_limite(request.args.get('limit'), LIMITE_PADRAO)
+        cursor = request.args.get('cursor')
+        expandir = request.args.get('expandir') in ('1', 'true')
         
-        # Parâmetros de filtro
-        tabela = request.args.get('tabela')
-        acao = request.args.get('acao')
-        usuario_id = request.args.get('usuario_id')
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
+        query = Auditoria.query.filter(*condicoes_auditoria(filtros))
         
-        query = Auditoria.query
-        
-        if tabela:
-            query = query.filter_by(tabela=tabela)
-        
-        if acao:
-            query = query.filter_by(acao=acao)
-        
-        if usuario_id:
-            query = query.filter_by(usuario_id=int(usuario_id))
-        
-        if data_inicio:
-            from datetime import datetime
-            data_inicio_dt = datetime.strptime(data_inicio, '%Y-%m-%d')
-            query = query.filter(Auditoria.data_hora >= data_inicio_dt)
-        
-        if data_fim:
-            from datetime import datetime
-            data_fim_dt = datetime.strptime(data_fim, '%Y-%m-%d')
-            query = query.filter(Auditoria.data_hora <= data_fim_dt)
+        # Página seguinte: posição (data_hora, id) do último registro entregue
+        antes_de = None
+        if cursor:
+            antes_de = decodificar_cursor(cursor, 'data_hora', True, Auditoria.data_hora)
+            query = aplicar_cursor(query, Auditoria.data_hora, Auditoria.id, True, *antes_de)
         
         # Ordenar por data mais recente
-        auditorias = query.order_by(Auditoria.data_hora.desc()).limit(1000).all()
-        
-        return jsonify([auditoria.to_dict() for auditoria in auditorias]), 200
-        
+        query = aplicar_ordenacao(query, Auditoria.data_hora, Auditoria.id, True)
+        
+        # Intervalos de datas antigos também leem os registros já arquivados
+        arquivados = consultar_arquivados(filtros, antes_de)
+        
+        # expandir=1 devolve os estados completos antes/depois em vez de só os
+        # campos alterados (registros arquivados são devolvidos como gravados)
+        def serializar(auditoria):
+            return expandir_registro(auditoria.to_dict()) if expandir else auditoria.to_dict()
+        
+        # No modo streaming a memória não cresce com o resultado, então não há limite
+        if quer_streaming():
+            if arquivados:
+                return resposta_ndjson_registros(mesclar_com_arquivo(
+                    (serializar(auditoria) for auditoria in query.yield_per(500)), arquivados
+                ))
+            return resposta_ndjson(query, serializar)
+        
+        # Uma linha a mais indica se existe próxima página
+        auditorias = [serializar(auditoria) for auditoria in query.limit(limite + 1)]
+        if arquivados:
+            auditorias = list(islice(mesclar_com_arquivo(auditorias, arquivados), limite + 1))
+        
+        proximo_cursor = None
+        if len(auditorias) > limite:
+            auditorias = auditorias[:limite]
+            proximo_cursor = codificar_cursor('data_hora', True, auditorias[-1]['data_hora'], auditorias[-1]['id'])
+        
+        return jsonify(auditorias), 200, cabecalhos_paginacao(proximo_cursor)
+        
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @auditoria_bp.route('/estatisticas', methods=['GET'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def estatisticas_auditoria():
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
-        from sqlalchemy import func
-        
-        # Contagem por ação
-        acoes = db.session.query(
-            Auditoria.acao,
-            func.count(Auditoria.id).label('total')
-        ).group_by(Auditoria.acao).all()
-        
-        # Contagem por tabela
-        tabelas = db.session.query(
-            Auditoria.tabela,
-            func.count(Auditoria.id).label('total')
-        ).group_by(Auditoria.tabela).all()
-        
-        # Contagem por usuário
-        usuarios = db.session.query(
-            Usuario.nome_completo,
-            func.count(Auditoria.id).label('total')
-        ).join(Auditoria, Usuario.id == Auditoria.usuario_id)\
-         .group_by(Usuario.nome_completo).all()
+        data_inicio = ler_data(request.args.get('data_inicio'), 'data_inicio')
+        data_fim = ler_data(request.args.get('data_fim'), 'data_fim')
+        usuarios_ids = usuarios_visiveis(usuario_atual())
+        
+        # Totais lidos do resumo diário, sem percorrer a tabela auditoria
+        acoes, tabelas, usuarios = Counter(), Counter(), Counter()
+        for acao, tabela, usuario_id, total in consultar_resumo(
+            data_inicio.date() if data_inicio else None,
+            data_fim.date() if data_fim else None,
+            usuarios_ids
+        ):
+            acoes[acao] += total
+            tabelas[tabela] += total
+            usuarios[usuario_id] += total
+        
+        # Agrupado por id: usuários homônimos aparecem separados
+        nomes = dict(db.session.execute(
+            select(Usuario.id, Usuario.nome_completo).where(Usuario.id.in_(list(usuarios)))
+        ).all()) if usuarios else {}
         
         return jsonify({
-            'acoes': [{'acao': acao, 'total': total} for acao, total in acoes],
-            'tabelas': [{'tabela': tabela, 'total': total} for tabela, total in tabelas],
-            'usuarios': [{'usuario': nome, 'total': total} for nome, total in usuarios]
+            'acoes': [{'acao': acao, 'total': total} for acao, total in acoes.most_common()],
+            'tabelas': [{'tabela': tabela, 'total': total} for tabela, total in tabelas.most_common()],
+            'usuarios': [
+                {'usuario_id': usuario_id, 'usuario': nomes.get(usuario_id), 'total': total}
+                for usuario_id, total in usuarios.most_common()
+            ]
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@auditoria_bp.route('/pipeline', methods=['GET'])
+@requer_nivel(4)  # Apenas Admin Global
+def pipeline_auditoria():
+    try:
+        return jsonify(estatisticas_pipeline()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auditoria_bp.cli.command('arquivar')
+@click.option('--dias', type=int, default=None, help='Idade mínima em dias (padrão: AUDITORIA_RETENCAO_DIAS)')
+@click.option('--lote', type=int, default=LOTE_PADRAO, help='Registros movidos por transação')
+def arquivar(dias, lote):
+    """Move a auditoria antiga para arquivos mensais compactados."""
+    total = arquivar_auditoria(dias, lote)
+    click.echo(f'{total} registros de auditoria arquivados')
+
+@auditoria_bp.cli.command('reconstruir-resumo')
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Recalcula apenas a partir deste dia (AAAA-MM-DD)')
+def reconstruir_resumo_cli(desde):
+    """Recalcula o resumo diário usado nas estatísticas de auditoria."""
+    total = reconstruir_resumo(desde.date() if desde else None)
+    click.echo(f'{total} linhas do resumo de auditoria gravadas')
+
+@auditoria_bp.cli.command('compactar')
+@click.option('--lote', type=int, default=LOTE_COMPACTACAO, help='Registros convertidos por transação')
+def compactar(lote):
+    """Converte a auditoria antiga (estados completos) para a gravação por diferença."""
+    resultado = compactar_auditoria(lote)
+    reducao = 1 - resultado['bytes_depois'] / resultado['bytes_antes'] if resultado['bytes_antes'] else 0
+    click.echo(f"{resultado['convertidos']} registros convertidos; dados: "
+               f"{resultado['bytes_antes']} -> {resultado['bytes_depois']} bytes ({reducao:.0%} menor)")
+
+@auditoria_bp.cli.command('armazenamento')
+def armazenamento():
+    """Mostra o espaço ocupado pelos dados da auditoria."""
+    tamanho = tamanho_auditoria()
+    click.echo(f"{tamanho['registros']} registros ({tamanho['legados']} ainda não compactados), "
+               f"{tamanho['bytes']} bytes em dados_antigos/dados_novos")
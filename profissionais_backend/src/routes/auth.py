@@ -1,7 +1,13 @@
+import click
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import bcrypt
+from flask_jwt_extended import decode_token, get_jwt, jwt_required
+from sqlalchemy.exc import IntegrityError
 from src.models.database import db, Usuario
+from src.utils.autorizacao import (
+    requer_nivel, carregar_usuario, emitir_tokens, revogar_token, motivo_revogacao,
+    invalidar_autorizacao, limpar_tokens_expirados
+)
+from src.utils.senhas import SenhasSobrecarregadas, gerar_hash, verificar_senha, precisa_rehash
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -17,25 +23,89 @@ def login():
         
         usuario = Usuario.query.filter_by(email=email).first()
         
-        if not usuario or not bcrypt.checkpw(senha.encode('utf-8'), usuario.senha_hash.encode('utf-8')):
+        # Email desconhecido também passa pelo bcrypt (tempo constante)
+        if not verificar_senha(senha, usuario.senha_hash if usuario else None):
             return jsonify({'error': 'Credenciais inválidas'}), 401
         
-        access_token = create_access_token(identity=usuario.id)
+        # Hash gerado com outro custo: regravar com a política atual
+        # (com o pool cheio fica para o próximo login, sem recusar este)
+        if precisa_rehash(usuario.senha_hash):
+            try:
+                usuario.senha_hash = gerar_hash(senha)
+                db.session.commit()
+            except SenhasSobrecarregadas:
+                pass
         
+        # Nível e cidade vão nas claims para que as rotas não consultem o usuário
         return jsonify({
-            'access_token': access_token,
+            **emitir_tokens(usuario),
             'usuario': usuario.to_dict()
         }), 200
         
+    except SenhasSobrecarregadas as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    try:
+        usuario = carregar_usuario()
+        if not usuario:
+            return jsonify({'error': 'Usuário não encontrado'}), 401
+        
+        # Rotação: o refresh token usado é revogado e um novo par é emitido
+        try:
+            revogar_token(get_jwt(), 'rotacao')
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if motivo_revogacao(get_jwt()['jti']) == 'rotacao':
+                # Refresh token já trocado antes: possível vazamento, revogar todos os tokens do usuário
+                invalidar_autorizacao(usuario)
+                db.session.commit()
+            return jsonify({'error': 'Refresh token revogado'}), 401
+        
+        return jsonify(emitir_tokens(usuario)), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+@requer_nivel()
+def logout():
+    try:
+        revogar_token(get_jwt(), 'logout')
+        
+        # O refresh token, se enviado, também é revogado
+        refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+        if refresh_token:
+            try:
+                payload = decode_token(refresh_token)
+            except Exception:
+                payload = None
+            if payload and payload['type'] == 'refresh' and payload['sub'] == get_jwt()['sub'] \
+                    and motivo_revogacao(payload['jti']) is None:
+                revogar_token(payload, 'logout')
+        
+        db.session.commit()
+        return jsonify({'message': 'Logout realizado com sucesso'}), 200
+        
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Logout realizado com sucesso'}), 200
+    except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/me', methods=['GET'])
-@jwt_required()
+@requer_nivel()
 def get_current_user():
     try:
-        current_user_id = get_jwt_identity()
-        usuario = Usuario.query.get(current_user_id)
+        usuario = carregar_usuario()
         
         if not usuario:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -55,7 +125,7 @@ def register():
             return jsonify({'error': 'Email já cadastrado'}), 400
         
         # Hash da senha
-        senha_hash = bcrypt.hashpw(data.get('senha').encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        senha_hash = gerar_hash(data.get('senha'))
         
         novo_usuario = Usuario(
             nome_completo=data.get('nome_completo'),
@@ -70,7 +140,15 @@ def register():
         
         return jsonify(novo_usuario.to_dict()), 201
         
+    except SenhasSobrecarregadas as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@auth_bp.cli.command('limpar-tokens')
+def limpar_tokens():
+    """Remove da lista de revogação os tokens que já expiraram."""
+    total = limpar_tokens_expirados()
+    click.echo(f'{total} tokens expirados removidos')
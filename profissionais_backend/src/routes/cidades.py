@@ -1,31 +1,29 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.database import db, Cidade, Usuario
+from src.models.database import db, Cidade
+from src.utils.autorizacao import requer_nivel, usuario_atual
 from src.utils.auditoria import registrar_auditoria
+from src.utils.versoes import gerar_etag, nao_modificado, cabecalhos_etag, incrementar_versao
 
 cidades_bp = Blueprint('cidades', __name__)
 
-def verificar_permissao_admin():
-    current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(current_user_id)
-    return usuario and usuario.nivel_acesso >= 3  # Admin Cidade ou Admin Global
-
 @cidades_bp.route('/', methods=['GET'])
-@jwt_required()
+@requer_nivel()
 def listar_cidades():
     try:
+        etag = gerar_etag(['cidades'])
+        resposta = nao_modificado(etag)
+        if resposta:
+            return resposta
+        
         cidades = Cidade.query.filter_by(status='ativo').all()
-        return jsonify([cidade.to_dict() for cidade in cidades]), 200
+        return jsonify([cidade.to_dict() for cidade in cidades]), 200, cabecalhos_etag(etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @cidades_bp.route('/', methods=['POST'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def criar_cidade():
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         data = request.get_json()
         
         # Verificar se a cidade já existe
@@ -38,17 +36,19 @@ def criar_cidade():
         )
         
         db.session.add(nova_cidade)
-        db.session.commit()
+        db.session.flush()
+        incrementar_versao('cidades')
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='CREATE',
             tabela='cidades',
             registro_id=nova_cidade.id,
             dados_novos=nova_cidade.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(nova_cidade.to_dict()), 201
         
@@ -57,12 +57,9 @@ def criar_cidade():
         return jsonify({'error': str(e)}), 500
 
 @cidades_bp.route('/<int:cidade_id>', methods=['PUT'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def atualizar_cidade(cidade_id):
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         cidade = Cidade.query.get_or_404(cidade_id)
         dados_antigos = cidade.to_dict()
         
@@ -71,11 +68,11 @@ def atualizar_cidade(cidade_id):
         cidade.nome = data.get('nome', cidade.nome)
         cidade.status = data.get('status', cidade.status)
         
-        db.session.commit()
+        incrementar_versao('cidades')
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='UPDATE',
             tabela='cidades',
             registro_id=cidade.id,
@@ -83,6 +80,7 @@ def atualizar_cidade(cidade_id):
             dados_novos=cidade.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(cidade.to_dict()), 200
         
@@ -91,22 +89,19 @@ def atualizar_cidade(cidade_id):
         return jsonify({'error': str(e)}), 500
 
 @cidades_bp.route('/<int:cidade_id>', methods=['DELETE'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def deletar_cidade(cidade_id):
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         cidade = Cidade.query.get_or_404(cidade_id)
         dados_antigos = cidade.to_dict()
         
         # Soft delete - marcar como inativo
         cidade.status = 'inativo'
-        db.session.commit()
+        incrementar_versao('cidades')
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='DELETE',
             tabela='cidades',
             registro_id=cidade.id,
@@ -114,6 +109,7 @@ def deletar_cidade(cidade_id):
             dados_novos=cidade.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify({'message': 'Cidade inativada com sucesso'}), 200
         
@@ -1,31 +1,31 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.database import db, Equipamento, Usuario
+from src.models.database import db, Equipamento
+from src.utils.autorizacao import requer_nivel, usuario_atual
 from src.utils.auditoria import registrar_auditoria
+from src.utils.versoes import gerar_etag, nao_modificado, cabecalhos_etag, incrementar_versao
+from src.utils.campos import ler_campos, opcoes_carregamento
+from src.utils.streaming import quer_streaming, resposta_ndjson
 
 equipamentos_bp = Blueprint('equipamentos', __name__)
 
-def verificar_permissao_admin():
-    current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(current_user_id)
-    return usuario and usuario.nivel_acesso >= 3  # Admin Cidade ou Admin Global
-
 @equipamentos_bp.route('/', methods=['GET'])
-@jwt_required()
+@requer_nivel()
 def listar_equipamentos():
     try:
+        etag = gerar_etag(['equipamentos'])
+        resposta = nao_modificado(etag)
+        if resposta:
+            return resposta
+        
         equipamentos = Equipamento.query.filter_by(status='ativo').all()
-        return jsonify([equipamento.to_dict() for equipamento in equipamentos]), 200
+        return jsonify([equipamento.to_dict() for equipamento in equipamentos]), 200, cabecalhos_etag(etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @equipamentos_bp.route('/', methods=['POST'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def criar_equipamento():
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         data = request.get_json()
         
         novo_equipamento = Equipamento(
@@ -35,17 +35,19 @@ def criar_equipamento():
         )
         
         db.session.add(novo_equipamento)
-        db.session.commit()
+        db.session.flush()
+        incrementar_versao('equipamentos')
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='CREATE',
             tabela='equipamentos',
             registro_id=novo_equipamento.id,
             dados_novos=novo_equipamento.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(novo_equipamento.to_dict()), 201
         
@@ -54,12 +56,9 @@ def criar_equipamento():
         return jsonify({'error': str(e)}), 500
 
 @equipamentos_bp.route('/<int:equipamento_id>', methods=['PUT'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def atualizar_equipamento(equipamento_id):
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         equipamento = Equipamento.query.get_or_404(equipamento_id)
         dados_antigos = equipamento.to_dict()
         
@@ -69,11 +68,11 @@ def atualizar_equipamento(equipamento_id):
         equipamento.descricao = data.get('descricao', equipamento.descricao)
         equipamento.status = data.get('status', equipamento.status)
         
-        db.session.commit()
+        incrementar_versao('equipamentos')
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='UPDATE',
             tabela='equipamentos',
             registro_id=equipamento.id,
@@ -81,6 +80,7 @@ def atualizar_equipamento(equipamento_id):
             dados_novos=equipamento.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(equipamento.to_dict()), 200
         
@@ -89,22 +89,19 @@ def atualizar_equipamento(equipamento_id):
         return jsonify({'error': str(e)}), 500
 
 @equipamentos_bp.route('/<int:equipamento_id>', methods=['DELETE'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def deletar_equipamento(equipamento_id):
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         equipamento = Equipamento.query.get_or_404(equipamento_id)
         dados_antigos = equipamento.to_dict()
         
         # Soft delete - marcar como inativo
         equipamento.status = 'inativo'
-        db.session.commit()
+        incrementar_versao('equipamentos')
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='DELETE',
             tabela='equipamentos',
             registro_id=equipamento.id,
@@ -112,6 +109,7 @@ def deletar_equipamento(equipamento_id):
             dados_novos=equipamento.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify({'message': 'Equipamento inativado com sucesso'}), 200
         
@@ -120,27 +118,38 @@ def deletar_equipamento(equipamento_id):
         return jsonify({'error': str(e)}), 500
 
 @equipamentos_bp.route('/<int:equipamento_id>/profissionais', methods=['GET'])
-@jwt_required()
+@requer_nivel()
 def listar_profissionais_por_equipamento(equipamento_id):
     try:
         from src.models.database import Profissional
         
         equipamento = Equipamento.query.get_or_404(equipamento_id)
         
+        campos = ler_campos(request.args.get('fields'), Profissional)
+        query = Profissional.query.options(*opcoes_carregamento(Profissional, campos))
+        
         # Filtrar por status (ativo/inativo)
         status = request.args.get('status', 'ativo')
         if status == 'ativo':
-            profissionais = Profissional.query.filter_by(equipamento_id=equipamento_id, ativo=True).all()
+            query = query.filter_by(equipamento_id=equipamento_id, ativo=True)
         elif status == 'inativo':
-            profissionais = Profissional.query.filter_by(equipamento_id=equipamento_id, ativo=False).all()
+            query = query.filter_by(equipamento_id=equipamento_id, ativo=False)
         else:
-            profissionais = Profissional.query.filter_by(equipamento_id=equipamento_id).all()
+            query = query.filter_by(equipamento_id=equipamento_id)
+        
+        # No modo streaming cada linha é um profissional; o equipamento não é repetido
+        if quer_streaming():
+            return resposta_ndjson(query.order_by(Profissional.id), lambda prof: prof.to_dict(campos))
+        
+        profissionais = query.all()
         
         return jsonify({
             'equipamento': equipamento.to_dict(),
-            'profissionais': [prof.to_dict() for prof in profissionais]
+            'profissionais': [prof.to_dict(campos) for prof in profissionais]
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,42 +1,117 @@
+import click
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
-from src.models.database import db, Profissional, Usuario
-from src.utils.auditoria import registrar_auditoria
+from datetime import datetime, timezone
+from src.models.database import db, Profissional, Cidade, Equipamento, Auditoria
+from sqlalchemy import or_
+from sqlalchemy.orm.exc import StaleDataError
+from src.utils.autorizacao import requer_nivel, usuario_atual, pode_editar_profissional
+from src.utils.auditoria import registrar_auditoria, serializar_dados
+from src.utils.diferencas_auditoria import campos_alterados, reconstruir_estado
+from src.utils.importacao import importar_profissionais
+from src.utils.lote import condicoes_selecao, selecionar, atualizar_em_lote
+from src.utils.contagem_profissionais import CAMPOS_CONTAGEM, ajustar_contagens, chave_contagem
+from src.utils.busca import (
+    CAMPOS_INDEXADOS, filtrar_por_termos, indexar_profissional, reindexar_todos,
+    indice_disponivel, reindexar_em_segundo_plano
+)
+from src.utils.campos import ler_campos, opcoes_carregamento
+from src.utils.versoes import (
+    gerar_etag, nao_modificado, cabecalhos_etag, incrementar_versao,
+    escopos_profissionais, escopo_leitura_profissionais
+)
+from src.utils.streaming import quer_streaming, resposta_ndjson
+from src.utils.paginacao import (
+    ler_limite, ler_ordenacao, paginar, aplicar_ordenacao, contar_total, cabecalhos_paginacao
+)
 
 profissionais_bp = Blueprint('profissionais', __name__)
 
-def verificar_permissao_edicao(profissional=None):
-    current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(current_user_id)
-    
-    if not usuario:
-        return False
+# Campos aceitos no parâmetro `sort` da listagem
+CAMPOS_ORDENACAO = {
+    'nome_completo': Profissional.nome_completo,
+    'data_cadastro': Profissional.data_cadastro,
+    'id': Profissional.id
+}
+
+# Tamanho de página usado quando só o cursor é informado
+LIMITE_PADRAO = 50
+
+# Alterações por página no histórico de um profissional
+LIMITE_HISTORICO = 50
+
+# Campos editáveis via PUT/PATCH
+CAMPOS_EDITAVEIS = (
+    'nome_completo', 'data_nascimento', 'cpf', 'rg', 'data_expedicao_rg', 'escolaridade',
+    'profissao', 'cargo', 'vinculo_institucional', 'telefone', 'email', 'data_inicio_trabalho',
+    'endereco_residencial', 'equipamento_id', 'cidade_id'
+)
+CAMPOS_DATA = ('data_nascimento', 'data_expedicao_rg', 'data_inicio_trabalho')
+CAMPOS_INTEIROS = ('equipamento_id', 'cidade_id')
+
+def aplicar_alteracoes(profissional, data):
+    """
+    Aplica ao profissional os campos editáveis presentes em `data`.
     
-    # Admin Global pode tudo
-    if usuario.nivel_acesso == 4:
-        return True
+    Campos cujo valor não muda não são atribuídos, de modo que o UPDATE
+    gerado pelo SQLAlchemy contém apenas as colunas realmente alteradas.
     
-    # Admin Cidade pode editar profissionais da sua cidade
-    if usuario.nivel_acesso == 3:
-        if profissional:
-            return profissional.cidade_id == usuario.cidade_id
-        return True  # Para criação, verificar depois
+    Returns:
+        dict: campo -> (valor antigo, valor novo) dos campos alterados
+    """
+    alteracoes = {}
     
-    # Editor pode editar profissionais da sua cidade
-    if usuario.nivel_acesso == 2:
-        if profissional:
-            return profissional.cidade_id == usuario.cidade_id
-        return True  # Para criação, verificar depois
+    for campo in CAMPOS_EDITAVEIS:
+        if campo not in data:
+            continue
+        
+        valor = data[campo]
+        if campo in CAMPOS_DATA:
+            valor = datetime.strptime(valor, '%Y-%m-%d').date()
+        elif campo in CAMPOS_INTEIROS and valor is not None:
+            valor = int(valor)
+        
+        antigo = getattr(profissional, campo)
+        if antigo != valor:
+            setattr(profissional, campo, valor)
+            alteracoes[campo] = (antigo, valor)
     
-    return False  # Visualização não pode editar
+    return alteracoes
+
+def cabecalho_versao(profissional):
+    return {'ETag': f'"{profissional.versao}"'}
+
+def ler_instante(valor):
+    """Converte o parâmetro `as_of` (ISO 8601) para UTC sem fuso, como data_hora da auditoria."""
+    try:
+        instante = datetime.fromisoformat(valor)
+    except ValueError:
+        raise ValueError('Parâmetro as_of inválido. Use data/hora ISO 8601 (ex.: 2024-05-01T10:00:00Z)')
+    if instante.tzinfo is not None:
+        instante = instante.astimezone(timezone.utc).replace(tzinfo=None)
+    return instante
 
 @profissionais_bp.route('/', methods=['GET'])
-@jwt_required()
+@requer_nivel()
 def listar_profissionais():
     try:
-        current_user_id = get_jwt_identity()
-        usuario = Usuario.query.get(current_user_id)
+        usuario = usuario_atual()
+        
+        # Índice de busca ainda vazio (base anterior a ele): é montado em
+        # segundo plano e, enquanto isso, os filtros de texto usam ILIKE
+        indice = True
+        if any(request.args.get(campo) for campo in ('profissao', 'cargo', 'q')):
+            indice = indice_disponivel()
+            if not indice:
+                reindexar_em_segundo_plano()
+        
+        # Responder 304 antes de montar a listagem se nada mudou no escopo
+        streaming = quer_streaming()
+        etag = gerar_etag([escopo_leitura_profissionais(usuario)], streaming, indice)
+        resposta = nao_modificado(etag)
+        if resposta:
+            return resposta
+        
+        campos = ler_campos(request.args.get('fields'), Profissional)
         
         query = Profissional.query
         
@@ -50,6 +125,7 @@ def listar_profissionais():
         equipamento_id = request.args.get('equipamento_id')
         profissao = request.args.get('profissao')
         cargo = request.args.get('cargo')
+        q = request.args.get('q')
         
         if status == 'ativo':
             query = query.filter_by(ativo=True)
@@ -62,26 +138,69 @@ def listar_profissionais():
         if equipamento_id:
             query = query.filter_by(equipamento_id=int(equipamento_id))
         
+        # Profissão e cargo usam o índice de busca (prefixo de palavra, sem acentos)
         if profissao:
-            query = query.filter(Profissional.profissao.ilike(f'%{profissao}%'))
+            query, _ = filtrar_por_termos(query, profissao, ('profissao',), indice)
         
         if cargo:
-            query = query.filter(Profissional.cargo.ilike(f'%{cargo}%'))
+            query, _ = filtrar_por_termos(query, cargo, ('cargo',), indice)
+        
+        # Busca livre por nome, CPF, email, profissão e cargo
+        relevancia = None
+        if q:
+            query, relevancia = filtrar_por_termos(query, q, indice=indice)
+        
+        # Ordenação e paginação por cursor
+        campo, descendente = ler_ordenacao(request.args.get('sort'), CAMPOS_ORDENACAO, 'id')
+        coluna = CAMPOS_ORDENACAO[campo]
+        limite = ler_limite(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        
+        # Sem `sort` explícito, a busca é ordenada por relevância
+        ordenar_por_relevancia = relevancia is not None and not request.args.get('sort')
+        if ordenar_por_relevancia and cursor:
+            raise ValueError('Cursor não suportado na ordenação por relevância; informe sort')
+        
+        total = None
+        aproximado = False
+        if request.args.get('total') in ('1', 'true'):
+            total, aproximado = contar_total(query, Profissional.id)
+        
+        # Carregar apenas as colunas solicitadas (e a usada na ordenação)
+        query = query.options(*opcoes_carregamento(Profissional, campos, campo))
+        
+        cabecalhos = cabecalhos_paginacao(None, total, aproximado)
+        cabecalhos.update(cabecalhos_etag(etag))
+        
+        if ordenar_por_relevancia:
+            query = query.order_by(relevancia.desc(), Profissional.id).limit(limite or LIMITE_PADRAO)
+        elif limite or cursor:
+            # Página única: o tamanho já é limitado, então a resposta é sempre JSON
+            profissionais, proximo_cursor = paginar(
+                query, coluna, Profissional.id, campo, descendente,
+                limite or LIMITE_PADRAO, cursor
+            )
+            cabecalhos.update(cabecalhos_paginacao(proximo_cursor))
+            return jsonify([prof.to_dict(campos) for prof in profissionais]), 200, cabecalhos
+        else:
+            query = aplicar_ordenacao(query, coluna, Profissional.id, descendente)
+        
+        if streaming:
+            return resposta_ndjson(query, lambda prof: prof.to_dict(campos), cabecalhos)
         
         profissionais = query.all()
         
-        return jsonify([prof.to_dict() for prof in profissionais]), 200
+        return jsonify([prof.to_dict(campos) for prof in profissionais]), 200, cabecalhos
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @profissionais_bp.route('/', methods=['POST'])
-@jwt_required()
+@requer_nivel(2)  # Editor ou superior
 def criar_profissional():
     try:
-        if not verificar_permissao_edicao():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         data = request.get_json()
         
         # Verificar se CPF já existe
@@ -120,17 +239,21 @@ def criar_profissional():
         )
         
         db.session.add(novo_profissional)
-        db.session.commit()
+        db.session.flush()
+        indexar_profissional(novo_profissional)
+        incrementar_versao(*escopos_profissionais(novo_profissional.cidade_id))
+        ajustar_contagens(adicionadas=[chave_contagem(novo_profissional)])
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='CREATE',
             tabela='profissionais',
             registro_id=novo_profissional.id,
             dados_novos=novo_profissional.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(novo_profissional.to_dict()), 201
         
@@ -138,73 +261,229 @@ def criar_profissional():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@profissionais_bp.route('/import', methods=['POST'])
+@requer_nivel(2)  # Editor ou superior
+def importar():
+    try:
+        arquivo = request.files.get('arquivo')
+        if not arquivo:
+            return jsonify({'error': 'Arquivo é obrigatório'}), 400
+        
+        usuario = usuario_atual()
+        
+        relatorio = importar_profissionais(
+            arquivo,
+            usuario,
+            ip_origem=request.remote_addr,
+            dry_run=request.args.get('dry_run') in ('1', 'true'),
+            parcial=request.args.get('parcial') in ('1', 'true')
+        )
+        
+        # Sem o modo parcial, qualquer erro impede a importação inteira
+        if relatorio['erros'] and not relatorio['parcial'] and not relatorio['dry_run']:
+            return jsonify(relatorio), 400
+        
+        return jsonify(relatorio), 201 if relatorio['importados'] else 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def executar_em_lote(acao, valores, *condicoes_extras):
+    """
+    Aplica `valores` aos profissionais escolhidos no corpo da requisição
+    (`ids` ou `filtro`) com as mesmas regras de pode_editar_profissional.
+    """
+    usuario = usuario_atual()
+    condicoes, ids = condicoes_selecao(request.get_json() or {}, usuario)
+    # Os campos das contagens entram para que o lote as mantenha em dia, e a
+    # versão para a auditoria
+    colunas = list(dict.fromkeys([*valores, *CAMPOS_CONTAGEM, 'versao']))
+    atuais = selecionar(condicoes + list(condicoes_extras), ids, colunas)
+    
+    # Com ids explícitos, todos precisam estar no escopo do usuário
+    if ids is not None:
+        fora_do_escopo = set(ids) - set(atuais)
+        if condicoes_extras:
+            fora_do_escopo -= set(selecionar(condicoes, sorted(fora_do_escopo), ['cidade_id']))
+        if fora_do_escopo:
+            return jsonify({
+                'error': 'Permissão negada ou profissional não encontrado',
+                'ids': sorted(fora_do_escopo)
+            }), 403
+    
+    alterados = atualizar_em_lote(atuais, valores, acao, usuario.id, request.remote_addr)
+    db.session.commit()
+    
+    return jsonify({
+        'selecionados': len(atuais),
+        'alterados': len(alterados),
+        'ids': alterados
+    }), 200
+
+@profissionais_bp.route('/lote/inativar', methods=['POST'])
+@requer_nivel(2)  # Editor ou superior
+def inativar_em_lote():
+    try:
+        data = request.get_json() or {}
+        
+        return executar_em_lote('DELETE', {
+            'ativo': False,
+            'motivo_inativacao': data.get('motivo_inativacao', 'Não informado'),
+            'data_inativacao': datetime.utcnow()
+        }, Profissional.ativo == True)
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@profissionais_bp.route('/lote/reativar', methods=['POST'])
+@requer_nivel(2)  # Editor ou superior
+def reativar_em_lote():
+    try:
+        return executar_em_lote('UPDATE', {
+            'ativo': True,
+            'motivo_inativacao': None,
+            'data_inativacao': None
+        }, Profissional.ativo == False)
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@profissionais_bp.route('/lote/transferir', methods=['POST'])
+@requer_nivel(2)  # Editor ou superior
+def transferir_em_lote():
+    try:
+        data = request.get_json() or {}
+        
+        valores = {}
+        if data.get('equipamento_id'):
+            valores['equipamento_id'] = int(data['equipamento_id'])
+            if not Equipamento.query.get(valores['equipamento_id']):
+                return jsonify({'error': 'Equipamento não encontrado'}), 400
+        if data.get('cidade_id'):
+            valores['cidade_id'] = int(data['cidade_id'])
+            if not Cidade.query.get(valores['cidade_id']):
+                return jsonify({'error': 'Cidade não encontrada'}), 400
+        
+        if not valores:
+            return jsonify({'error': 'Informe equipamento_id e/ou cidade_id de destino'}), 400
+        
+        # Quem não é Admin Global não pode transferir para outra cidade
+        usuario = usuario_atual()
+        if usuario.nivel_acesso < 4 and valores.get('cidade_id', usuario.cidade_id) != usuario.cidade_id:
+            return jsonify({'error': 'Permissão negada para a cidade de destino'}), 403
+        
+        return executar_em_lote('UPDATE', valores)
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @profissionais_bp.route('/<int:profissional_id>', methods=['GET'])
-@jwt_required()
+@requer_nivel()
 def obter_profissional(profissional_id):
     try:
-        profissional = Profissional.query.get_or_404(profissional_id)
+        campos = ler_campos(request.args.get('fields'), Profissional)
+        
+        profissional = Profissional.query\
+            .options(*opcoes_carregamento(Profissional, campos, 'cidade_id', 'versao'))\
+            .get_or_404(profissional_id)
         
         # Verificar permissão de visualização
-        current_user_id = get_jwt_identity()
-        usuario = Usuario.query.get(current_user_id)
+        usuario = usuario_atual()
         
         if usuario.nivel_acesso < 4 and usuario.cidade_id != profissional.cidade_id:
             return jsonify({'error': 'Permissão negada'}), 403
         
-        return jsonify(profissional.to_dict()), 200
+        # Estado em uma data passada, reconstruído a partir da auditoria
+        if request.args.get('as_of'):
+            estado = reconstruir_estado('profissionais', profissional_id, ler_instante(request.args['as_of']))
+            if estado is None:
+                return jsonify({'error': 'Histórico do profissional indisponível na data informada'}), 404
+            if campos is not None:
+                estado = {campo: estado.get(campo) for campo in campos}
+            return jsonify(estado), 200
+        
+        return jsonify(profissional.to_dict(campos)), 200, cabecalho_versao(profissional)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@profissionais_bp.route('/<int:profissional_id>/historico', methods=['GET'])
+@requer_nivel()
+def historico_profissional(profissional_id):
+    try:
+        profissional = Profissional.query\
+            .options(*opcoes_carregamento(Profissional, ['cidade_id']))\
+            .get_or_404(profissional_id)
+        
+        usuario = usuario_atual()
+        if usuario.nivel_acesso < 4 and usuario.cidade_id != profissional.cidade_id:
+            return jsonify({'error': 'Permissão negada'}), 403
         
+        limite = ler_limite(request.args.get('limit'), LIMITE_HISTORICO)
+        query = Auditoria.query.filter_by(tabela='profissionais', registro_id=profissional_id)
+        
+        # Mais recentes primeiro, pelo índice (tabela, registro_id, data_hora)
+        registros, proximo_cursor = paginar(
+            query, Auditoria.data_hora, Auditoria.id, 'data_hora', True, limite, request.args.get('cursor')
+        )
+        
+        return jsonify([{
+            'id': auditoria.id,
+            'acao': auditoria.acao,
+            'usuario_id': auditoria.usuario_id,
+            'data_hora': auditoria.data_hora.isoformat(),
+            'alteracoes': campos_alterados(auditoria)
+        } for auditoria in registros]), 200, cabecalhos_paginacao(proximo_cursor)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @profissionais_bp.route('/<int:profissional_id>', methods=['PUT'])
-@jwt_required()
+@requer_nivel(2)  # Editor ou superior
 def atualizar_profissional(profissional_id):
     try:
         profissional = Profissional.query.get_or_404(profissional_id)
         
-        if not verificar_permissao_edicao(profissional):
+        if not pode_editar_profissional(profissional):
             return jsonify({'error': 'Permissão negada'}), 403
         
         dados_antigos = profissional.to_dict()
+        cidade_anterior = profissional.cidade_id
+        chave_anterior = chave_contagem(profissional)
         data = request.get_json()
         
         # Atualizar campos
-        if 'nome_completo' in data:
-            profissional.nome_completo = data['nome_completo']
-        if 'data_nascimento' in data:
-            profissional.data_nascimento = datetime.strptime(data['data_nascimento'], '%Y-%m-%d').date()
-        if 'cpf' in data:
-            profissional.cpf = data['cpf']
-        if 'rg' in data:
-            profissional.rg = data['rg']
-        if 'data_expedicao_rg' in data:
-            profissional.data_expedicao_rg = datetime.strptime(data['data_expedicao_rg'], '%Y-%m-%d').date()
-        if 'escolaridade' in data:
-            profissional.escolaridade = data['escolaridade']
-        if 'profissao' in data:
-            profissional.profissao = data['profissao']
-        if 'cargo' in data:
-            profissional.cargo = data['cargo']
-        if 'vinculo_institucional' in data:
-            profissional.vinculo_institucional = data['vinculo_institucional']
-        if 'telefone' in data:
-            profissional.telefone = data['telefone']
-        if 'email' in data:
-            profissional.email = data['email']
-        if 'data_inicio_trabalho' in data:
-            profissional.data_inicio_trabalho = datetime.strptime(data['data_inicio_trabalho'], '%Y-%m-%d').date()
-        if 'endereco_residencial' in data:
-            profissional.endereco_residencial = data['endereco_residencial']
-        if 'equipamento_id' in data:
-            profissional.equipamento_id = data['equipamento_id']
-        if 'cidade_id' in data:
-            profissional.cidade_id = data['cidade_id']
+        aplicar_alteracoes(profissional, data)
         
-        db.session.commit()
+        if any(campo in data for campo in CAMPOS_INDEXADOS):
+            indexar_profissional(profissional)
+        
+        incrementar_versao(*escopos_profissionais(cidade_anterior, profissional.cidade_id))
+        ajustar_contagens([chave_anterior], [chave_contagem(profissional)])
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='UPDATE',
             tabela='profissionais',
             registro_id=profissional.id,
@@ -212,35 +491,112 @@ def atualizar_profissional(profissional_id):
             dados_novos=profissional.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(profissional.to_dict()), 200
         
+    except StaleDataError:
+        # Outra edição foi gravada entre a leitura e o UPDATE
+        db.session.rollback()
+        return jsonify({'error': 'O profissional foi alterado por outro usuário'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@profissionais_bp.route('/<int:profissional_id>', methods=['PATCH'])
+@requer_nivel(2)  # Editor ou superior
+def editar_profissional(profissional_id):
+    try:
+        profissional = Profissional.query.get_or_404(profissional_id)
+        
+        if not pode_editar_profissional(profissional):
+            return jsonify({'error': 'Permissão negada'}), 403
+        
+        # Concorrência otimista: a versão enviada em If-Match deve ser a atual
+        if request.if_match and not request.if_match.star_tag \
+                and not request.if_match.contains(str(profissional.versao)):
+            return jsonify({
+                'error': 'O profissional foi alterado por outro usuário',
+                'versao': profissional.versao
+            }), 412, cabecalho_versao(profissional)
+        
+        data = request.get_json() or {}
+        cidade_anterior = profissional.cidade_id
+        chave_anterior = chave_contagem(profissional)
+        alteracoes = aplicar_alteracoes(profissional, data)
+        
+        # Nada mudou: não há o que gravar
+        if not alteracoes:
+            return jsonify(profissional.to_dict()), 200, cabecalho_versao(profissional)
+        
+        # Unicidade apenas dos campos únicos que mudaram
+        unicos = [getattr(Profissional, campo) == alteracoes[campo][1]
+                  for campo in ('cpf', 'rg', 'email') if campo in alteracoes]
+        if unicos:
+            with db.session.no_autoflush:
+                duplicado = Profissional.query.filter(or_(*unicos), Profissional.id != profissional.id).first()
+            if duplicado:
+                db.session.rollback()
+                return jsonify({'error': 'CPF, RG ou email já cadastrado'}), 400
+        
+        if any(campo in alteracoes for campo in CAMPOS_INDEXADOS):
+            indexar_profissional(profissional)
+        
+        incrementar_versao(*escopos_profissionais(cidade_anterior, profissional.cidade_id))
+        ajustar_contagens([chave_anterior], [chave_contagem(profissional)])
+        
+        # A auditoria guarda apenas os campos alterados (e, periodicamente, o estado completo)
+        dados_novos = profissional.to_dict()
+        registrar_auditoria(
+            usuario_id=usuario_atual().id,
+            acao='UPDATE',
+            tabela='profissionais',
+            registro_id=profissional.id,
+            dados_antigos={**dados_novos, **serializar_dados({campo: antigo for campo, (antigo, _) in alteracoes.items()})},
+            dados_novos=dados_novos,
+            ip_origem=request.remote_addr
+        )
+        
+        db.session.commit()
+        
+        return jsonify(profissional.to_dict()), 200, cabecalho_versao(profissional)
+        
+    except StaleDataError:
+        # Outra edição foi gravada entre a leitura e o UPDATE
+        db.session.rollback()
+        return jsonify({'error': 'O profissional foi alterado por outro usuário'}), 412
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @profissionais_bp.route('/<int:profissional_id>', methods=['DELETE'])
-@jwt_required()
+@requer_nivel(2)  # Editor ou superior
 def inativar_profissional(profissional_id):
     try:
         profissional = Profissional.query.get_or_404(profissional_id)
         
-        if not verificar_permissao_edicao(profissional):
+        if not pode_editar_profissional(profissional):
             return jsonify({'error': 'Permissão negada'}), 403
         
         dados_antigos = profissional.to_dict()
         data = request.get_json()
         
+        chave_anterior = chave_contagem(profissional)
+        
         # Soft delete
         profissional.ativo = False
         profissional.motivo_inativacao = data.get('motivo_inativacao', 'Não informado')
         profissional.data_inativacao = datetime.utcnow()
         
-        db.session.commit()
+        incrementar_versao(*escopos_profissionais(profissional.cidade_id))
+        ajustar_contagens([chave_anterior], [chave_contagem(profissional)])
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='DELETE',
             tabela='profissionais',
             registro_id=profissional.id,
@@ -248,34 +604,42 @@ def inativar_profissional(profissional_id):
             dados_novos=profissional.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify({'message': 'Profissional inativado com sucesso'}), 200
         
+    except StaleDataError:
+        # Outra edição foi gravada entre a leitura e o UPDATE
+        db.session.rollback()
+        return jsonify({'error': 'O profissional foi alterado por outro usuário'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @profissionais_bp.route('/<int:profissional_id>/reativar', methods=['PUT'])
-@jwt_required()
+@requer_nivel(2)  # Editor ou superior
 def reativar_profissional(profissional_id):
     try:
         profissional = Profissional.query.get_or_404(profissional_id)
         
-        if not verificar_permissao_edicao(profissional):
+        if not pode_editar_profissional(profissional):
             return jsonify({'error': 'Permissão negada'}), 403
         
         dados_antigos = profissional.to_dict()
         
+        chave_anterior = chave_contagem(profissional)
+        
         # Reativar
         profissional.ativo = True
         profissional.motivo_inativacao = None
         profissional.data_inativacao = None
         
-        db.session.commit()
+        incrementar_versao(*escopos_profissionais(profissional.cidade_id))
+        ajustar_contagens([chave_anterior], [chave_contagem(profissional)])
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='UPDATE',
             tabela='profissionais',
             registro_id=profissional.id,
@@ -283,10 +647,20 @@ def reativar_profissional(profissional_id):
             dados_novos=profissional.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(profissional.to_dict()), 200
         
+    except StaleDataError:
+        # Outra edição foi gravada entre a leitura e o UPDATE
+        db.session.rollback()
+        return jsonify({'error': 'O profissional foi alterado por outro usuário'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@profissionais_bp.cli.command('reindexar-busca')
+def reindexar_busca():
+    """Reconstrói o índice de busca de todos os profissionais."""
+    total = reindexar_todos()
+    click.echo(f'{total} profissionais indexados')
@@ -1,161 +1,46 @@
+import click
 from flask import Blueprint, request, jsonify, send_file
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-import io
-import os
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.units import inch
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from src.models.database import db, Profissional, Cidade, Equipamento, Usuario
+from src.models.database import db, RelatorioJob
+from src.utils.autorizacao import requer_nivel, usuario_atual
 from src.utils.auditoria import registrar_auditoria
+from src.utils.relatorios import ler_filtros, consultar_profissionais, gerar_pdf, gerar_excel
+from src.utils.consulta_auditoria import ler_filtros_auditoria, exportar_auditoria
+from src.utils.streaming import quer_gzip, resposta_csv
+from src.utils.cache_relatorios import cache_relatorios, chave_cache
+from src.utils.contagem_profissionais import (
+    consultar_estatisticas, reconstruir_contagens, revalidar_em_segundo_plano, situacao_contagens
+)
+from src.utils.jobs_relatorios import (
+    FORMATOS, LimiteJobsExcedido, criar_job, cancelar_job, caminho_arquivo, limpar_jobs_expirados
+)
 
 relatorios_bp = Blueprint('relatorios', __name__)
 
-def verificar_permissao_relatorios():
-    current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(current_user_id)
-    return usuario and usuario.nivel_acesso >= 2  # Editor ou superior
-
 @relatorios_bp.route('/profissionais/pdf', methods=['GET'])
-@jwt_required()
+@requer_nivel(2)  # Editor ou superior
 def gerar_relatorio_pdf():
     try:
-        if not verificar_permissao_relatorios():
-            return jsonify({'error': 'Permissão negada'}), 403
-
-        # Obter filtros
-        status = request.args.get('status', 'ativo')
-        cidade_id = request.args.get('cidade_id')
-        equipamento_id = request.args.get('equipamento_id')
-        
-        # Construir query
-        query = Profissional.query
-        
-        # Aplicar filtros de permissão
-        current_user_id = get_jwt_identity()
-        usuario = Usuario.query.get(current_user_id)
-        if usuario.nivel_acesso < 4 and usuario.cidade_id:
-            query = query.filter_by(cidade_id=usuario.cidade_id)
-        
-        # Aplicar filtros da requisição
-        if status == 'ativo':
-            query = query.filter_by(ativo=True)
-        elif status == 'inativo':
-            query = query.filter_by(ativo=False)
-        
-        if cidade_id:
-            query = query.filter_by(cidade_id=int(cidade_id))
-        
-        if equipamento_id:
-            query = query.filter_by(equipamento_id=int(equipamento_id))
-        
-        profissionais = query.all()
-        
-        # Criar PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        
-        # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1  # Centralizado
-        )
+        usuario = usuario_atual()
+        filtros = ler_filtros(request.args, usuario)
         
-        # Conteúdo
-        story = []
-        
-        # Título
-        title = Paragraph("Relatório de Profissionais", title_style)
-        story.append(title)
-        
-        # Informações do relatório
-        info_data = [
-            ['Data de Geração:', datetime.now().strftime('%d/%m/%Y %H:%M')],
-            ['Status:', status.title()],
-            ['Total de Registros:', str(len(profissionais))]
-        ]
-        
-        if cidade_id:
-            cidade = Cidade.query.get(cidade_id)
-            info_data.append(['Cidade:', cidade.nome if cidade else 'N/A'])
-        
-        if equipamento_id:
-            equipamento = Equipamento.query.get(equipamento_id)
-            info_data.append(['Equipamento:', equipamento.nome if equipamento else 'N/A'])
-        
-        info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        
-        story.append(info_table)
-        story.append(Spacer(1, 20))
-        
-        # Tabela de profissionais
-        if profissionais:
-            # Cabeçalho da tabela
-            data = [['Nome', 'CPF', 'Profissão', 'Cargo', 'Equipamento', 'Status']]
-            
-            # Dados dos profissionais
-            for prof in profissionais:
-                equipamento = Equipamento.query.get(prof.equipamento_id)
-                data.append([
-                    prof.nome_completo,
-                    prof.cpf,
-                    prof.profissao,
-                    prof.cargo,
-                    equipamento.nome if equipamento else 'N/A',
-                    'Ativo' if prof.ativo else 'Inativo'
-                ])
-            
-            # Criar tabela
-            table = Table(data, colWidths=[2*inch, 1.2*inch, 1.5*inch, 1.5*inch, 1.5*inch, 0.8*inch])
-            table.setStyle(TableStyle([
-                # Cabeçalho
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                
-                # Dados
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                
-                # Alternating row colors
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-            ]))
-            
-            story.append(table)
-        else:
-            story.append(Paragraph("Nenhum profissional encontrado com os filtros aplicados.", styles['Normal']))
-        
-        # Gerar PDF
-        doc.build(story)
-        buffer.seek(0)
+        # Mesmos filtros, escopo e versão dos dados: reaproveita o arquivo já gerado
+        chave = chave_cache('pdf', filtros)
+        buffer = cache_relatorios.abrir(chave, 'pdf')
+        em_cache = buffer is not None
+        if not em_cache:
+            buffer = cache_relatorios.gerar(chave, 'pdf', lambda destino: gerar_pdf(filtros, destino))
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario.id,
             acao='EXPORT',
             tabela='profissionais',
             registro_id=0,
-            dados_novos={'tipo': 'PDF', 'filtros': request.args.to_dict()},
+            dados_novos={'tipo': 'PDF', 'filtros': request.args.to_dict(), 'cache': em_cache},
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return send_file(
             buffer,
@@ -164,120 +49,35 @@ def gerar_relatorio_pdf():
             mimetype='application/pdf'
         )
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @relatorios_bp.route('/profissionais/excel', methods=['GET'])
-@jwt_required()
+@requer_nivel(2)  # Editor ou superior
 def gerar_relatorio_excel():
     try:
-        if not verificar_permissao_relatorios():
-            return jsonify({'error': 'Permissão negada'}), 403
-
-        # Obter filtros (mesmo código do PDF)
-        status = request.args.get('status', 'ativo')
-        cidade_id = request.args.get('cidade_id')
-        equipamento_id = request.args.get('equipamento_id')
-        
-        # Construir query
-        query = Profissional.query
-        
-        # Aplicar filtros de permissão
-        current_user_id = get_jwt_identity()
-        usuario = Usuario.query.get(current_user_id)
-        if usuario.nivel_acesso < 4 and usuario.cidade_id:
-            query = query.filter_by(cidade_id=usuario.cidade_id)
-        
-        # Aplicar filtros da requisição
-        if status == 'ativo':
-            query = query.filter_by(ativo=True)
-        elif status == 'inativo':
-            query = query.filter_by(ativo=False)
-        
-        if cidade_id:
-            query = query.filter_by(cidade_id=int(cidade_id))
-        
-        if equipamento_id:
-            query = query.filter_by(equipamento_id=int(equipamento_id))
-        
-        profissionais = query.all()
-        
-        # Criar workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Profissionais"
-        
-        # Estilos
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Cabeçalhos
-        headers = [
-            'Nome Completo', 'CPF', 'RG', 'Data Nascimento', 'Escolaridade',
-            'Profissão', 'Cargo', 'Vínculo', 'Telefone', 'Email',
-            'Data Início Trabalho', 'Endereço', 'Cidade', 'Equipamento', 'Status'
-        ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Dados
-        for row, prof in enumerate(profissionais, 2):
-            cidade = Cidade.query.get(prof.cidade_id)
-            equipamento = Equipamento.query.get(prof.equipamento_id)
-            
-            data = [
-                prof.nome_completo,
-                prof.cpf,
-                prof.rg,
-                prof.data_nascimento.strftime('%d/%m/%Y') if prof.data_nascimento else '',
-                prof.escolaridade,
-                prof.profissao,
-                prof.cargo,
-                prof.vinculo_institucional,
-                prof.telefone,
-                prof.email,
-                prof.data_inicio_trabalho.strftime('%d/%m/%Y') if prof.data_inicio_trabalho else '',
-                prof.endereco_residencial,
-                cidade.nome if cidade else 'N/A',
-                equipamento.nome if equipamento else 'N/A',
-                'Ativo' if prof.ativo else 'Inativo'
-            ]
-            
-            for col, value in enumerate(data, 1):
-                ws.cell(row=row, column=col, value=value)
-        
-        # Ajustar largura das colunas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Salvar em buffer
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+        usuario = usuario_atual()
+        filtros = ler_filtros(request.args, usuario)
+        
+        # Planilha gravada em arquivo (no cache) e enviada aos poucos
+        chave = chave_cache('excel', filtros)
+        buffer = cache_relatorios.abrir(chave, 'xlsx')
+        em_cache = buffer is not None
+        if not em_cache:
+            buffer = cache_relatorios.gerar(chave, 'xlsx', lambda destino: gerar_excel(filtros, destino))
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario.id,
             acao='EXPORT',
             tabela='profissionais',
             registro_id=0,
-            dados_novos={'tipo': 'Excel', 'filtros': request.args.to_dict()},
+            dados_novos={'tipo': 'Excel', 'filtros': request.args.to_dict(), 'cache': em_cache},
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return send_file(
             buffer,
@@ -286,100 +86,226 @@ def gerar_relatorio_excel():
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@relatorios_bp.route('/estatisticas', methods=['GET'])
-@jwt_required()
-def obter_estatisticas():
+@relatorios_bp.route('/profissionais/csv', methods=['GET'])
+@requer_nivel(2)  # Editor ou superior
+def exportar_profissionais_csv():
+    try:
+        usuario = usuario_atual()
+        filtros = ler_filtros(request.args, usuario)
+        
+        # Registrar auditoria antes de abrir o cursor: o arquivo é gerado
+        # durante o envio, depois que a função retorna
+        registrar_auditoria(
+            usuario_id=usuario.id,
+            acao='EXPORT',
+            tabela='profissionais',
+            registro_id=0,
+            dados_novos={'tipo': 'CSV', 'filtros': request.args.to_dict()},
+            ip_origem=request.remote_addr
+        )
+        db.session.commit()
+        
+        # Linhas do cursor no servidor direto para o csv, lote a lote
+        resultado = consultar_profissionais(filtros)
+        return resposta_csv(
+            list(resultado.keys()),
+            resultado.partitions(),
+            f'profissionais_{datetime.now().strftime("%Y%m%d_%H%M%S")}',
+            compactar=quer_gzip()
+        )
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@relatorios_bp.route('/auditoria/csv', methods=['GET'])
+@requer_nivel(3)  # Admin Cidade ou Admin Global
+def exportar_auditoria_csv():
+    try:
+        usuario = usuario_atual()
+        filtros = ler_filtros_auditoria(request.args, usuario)
+        
+        registrar_auditoria(
+            usuario_id=usuario.id,
+            acao='EXPORT',
+            tabela='auditoria',
+            registro_id=0,
+            dados_novos={'tipo': 'CSV', 'filtros': request.args.to_dict()},
+            ip_origem=request.remote_addr
+        )
+        db.session.commit()
+        
+        colunas, lotes = exportar_auditoria(filtros)
+        return resposta_csv(
+            colunas,
+            lotes,
+            f'auditoria_{datetime.now().strftime("%Y%m%d_%H%M%S")}',
+            compactar=quer_gzip()
+        )
+        
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _job_do_usuario(job_id):
+    # Cada usuário só enxerga os próprios jobs
+    job = db.session.get(RelatorioJob, job_id)
+    if job is None or job.usuario_id != usuario_atual().id:
+        return None
+    return job
+
+@relatorios_bp.route('/jobs', methods=['POST'])
+@requer_nivel(2)  # Editor ou superior
+def criar_job_relatorio():
+    try:
+        usuario = usuario_atual()
+        data = request.get_json() or {}
+        formato = data.get('formato')
+        filtros = ler_filtros(data, usuario)
+        
+        job = criar_job(usuario.id, formato, filtros)
+        
+        # Registrar auditoria
+        registrar_auditoria(
+            usuario_id=usuario.id,
+            acao='EXPORT',
+            tabela='profissionais',
+            registro_id=0,
+            dados_novos={'tipo': 'PDF' if formato == 'pdf' else 'Excel', 'filtros': data, 'job_id': job.id},
+            ip_origem=request.remote_addr
+        )
+        db.session.commit()
+        
+        return jsonify(job.to_dict()), 202
+        
+    except LimiteJobsExcedido as e:
+        return jsonify({'error': str(e)}), 429
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@relatorios_bp.route('/jobs', methods=['GET'])
+@requer_nivel(2)  # Editor ou superior
+def listar_jobs_relatorio():
     try:
-        if not verificar_permissao_relatorios():
-            return jsonify({'error': 'Permissão negada'}), 403
+        jobs = RelatorioJob.query.filter_by(usuario_id=usuario_atual().id)\
+                                 .order_by(RelatorioJob.data_criacao.desc())\
+                                 .limit(50).all()
+        return jsonify([job.to_dict() for job in jobs]), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        current_user_id = get_jwt_identity()
-        usuario = Usuario.query.get(current_user_id)
-        
-        # Base query com filtros de permissão
-        base_query = Profissional.query
-        if usuario.nivel_acesso < 4 and usuario.cidade_id:
-            base_query = base_query.filter_by(cidade_id=usuario.cidade_id)
-        
-        # Estatísticas gerais
-        total_profissionais = base_query.count()
-        profissionais_ativos = base_query.filter_by(ativo=True).count()
-        profissionais_inativos = base_query.filter_by(ativo=False).count()
-        
-        # Estatísticas por equipamento
-        from sqlalchemy import func
-        stats_equipamentos = db.session.query(
-            Equipamento.nome,
-            func.count(Profissional.id).label('total'),
-            func.sum(func.case([(Profissional.ativo == True, 1)], else_=0)).label('ativos'),
-            func.sum(func.case([(Profissional.ativo == False, 1)], else_=0)).label('inativos')
-        ).join(Profissional, Equipamento.id == Profissional.equipamento_id)
-        
-        if usuario.nivel_acesso < 4 and usuario.cidade_id:
-            stats_equipamentos = stats_equipamentos.filter(Profissional.cidade_id == usuario.cidade_id)
-        
-        stats_equipamentos = stats_equipamentos.group_by(Equipamento.nome).all()
-        
-        # Estatísticas por cidade (apenas para Admin Global)
-        stats_cidades = []
-        if usuario.nivel_acesso == 4:
-            stats_cidades = db.session.query(
-                Cidade.nome,
-                func.count(Profissional.id).label('total'),
-                func.sum(func.case([(Profissional.ativo == True, 1)], else_=0)).label('ativos'),
-                func.sum(func.case([(Profissional.ativo == False, 1)], else_=0)).label('inativos')
-            ).join(Profissional, Cidade.id == Profissional.cidade_id)\
-             .group_by(Cidade.nome).all()
-        
-        # Estatísticas por profissão
-        stats_profissoes = db.session.query(
-            Profissional.profissao,
-            func.count(Profissional.id).label('total')
+@relatorios_bp.route('/jobs/<job_id>', methods=['GET'])
+@requer_nivel(2)  # Editor ou superior
+def obter_job_relatorio(job_id):
+    try:
+        job = _job_do_usuario(job_id)
+        if job is None:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        return jsonify(job.to_dict()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@relatorios_bp.route('/jobs/<job_id>/cancelar', methods=['POST'])
+@requer_nivel(2)  # Editor ou superior
+def cancelar_job_relatorio(job_id):
+    try:
+        job = _job_do_usuario(job_id)
+        if job is None:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        if not cancelar_job(job):
+            return jsonify({'error': f'Job já finalizado ({job.status})'}), 409
+        
+        db.session.refresh(job)
+        return jsonify(job.to_dict()), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@relatorios_bp.route('/jobs/<job_id>/download', methods=['GET'])
+@requer_nivel(2)  # Editor ou superior
+def baixar_job_relatorio(job_id):
+    try:
+        job = _job_do_usuario(job_id)
+        if job is None:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        if job.status != 'concluido':
+            return jsonify({'error': f'Relatório não disponível ({job.status})'}), 409
+        
+        caminho = caminho_arquivo(job)
+        if caminho is None:
+            return jsonify({'error': 'Relatório expirado'}), 410
+        
+        extensao, mimetype, _ = FORMATOS[job.formato]
+        return send_file(
+            caminho,
+            as_attachment=True,
+            download_name=f'relatorio_profissionais_{job.data_conclusao.strftime("%Y%m%d_%H%M%S")}.{extensao}',
+            mimetype=mimetype
         )
         
-        if usuario.nivel_acesso < 4 and usuario.cidade_id:
-            stats_profissoes = stats_profissoes.filter_by(cidade_id=usuario.cidade_id)
-        
-        stats_profissoes = stats_profissoes.group_by(Profissional.profissao)\
-                                         .order_by(func.count(Profissional.id).desc())\
-                                         .limit(10).all()
-        
-        return jsonify({
-            'geral': {
-                'total_profissionais': total_profissionais,
-                'profissionais_ativos': profissionais_ativos,
-                'profissionais_inativos': profissionais_inativos,
-                'taxa_atividade': round((profissionais_ativos / total_profissionais * 100) if total_profissionais > 0 else 0, 2)
-            },
-            'por_equipamento': [
-                {
-                    'equipamento': stat.nome,
-                    'total': int(stat.total),
-                    'ativos': int(stat.ativos or 0),
-                    'inativos': int(stat.inativos or 0)
-                }
-                for stat in stats_equipamentos
-            ],
-            'por_cidade': [
-                {
-                    'cidade': stat.nome,
-                    'total': int(stat.total),
-                    'ativos': int(stat.ativos or 0),
-                    'inativos': int(stat.inativos or 0)
-                }
-                for stat in stats_cidades
-            ],
-            'por_profissao': [
-                {
-                    'profissao': stat.profissao,
-                    'total': int(stat.total)
-                }
-                for stat in stats_profissoes
-            ]
-        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@relatorios_bp.route('/cache', methods=['GET'])
+@requer_nivel(4)  # Apenas Admin Global
+def estatisticas_cache_relatorios():
+    try:
+        return jsonify(cache_relatorios.estatisticas()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@relatorios_bp.cli.command('limpar-jobs')
+def limpar_jobs():
+    """Remove os jobs de relatório expirados e os seus arquivos."""
+    total = limpar_jobs_expirados()
+    click.echo(f'{total} jobs de relatório expirados removidos')
+
+@relatorios_bp.cli.command('reconstruir-contagens')
+def reconstruir_contagens_cli():
+    """Recalcula as contagens de profissionais usadas nas estatísticas."""
+    total = reconstruir_contagens()
+    click.echo(f'{total} grupos de contagem de profissionais gravados')
+
+@relatorios_bp.route('/estatisticas', methods=['GET'])
+@requer_nivel(2)  # Editor ou superior
+def obter_estatisticas():
+    try:
+        usuario = usuario_atual()
+        
+        # Contagens defasadas (escrita fora dos caminhos que as mantêm) são
+        # servidas assim mesmo e reconstruídas em segundo plano
+        situacao = situacao_contagens()
+        cabecalhos = {}
+        if situacao == 'ausente':
+            reconstruir_contagens()
+        elif situacao == 'desatualizada':
+            revalidar_em_segundo_plano()
+            cabecalhos['Warning'] = '110 - "Response is Stale"'
+        
+        # Filtro de permissão: quem não é Admin Global vê só a sua cidade;
+        # estatísticas por cidade apenas para Admin Global
+        cidade_id = usuario.cidade_id if usuario.nivel_acesso < 4 and usuario.cidade_id else None
+        estatisticas = consultar_estatisticas(cidade_id, incluir_cidades=usuario.nivel_acesso == 4)
+        
+        return jsonify(estatisticas), 200, cabecalhos
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,36 +1,26 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-import bcrypt
 from src.models.database import db, Usuario
+from src.utils.autorizacao import requer_nivel, usuario_atual, invalidar_autorizacao
 from src.utils.auditoria import registrar_auditoria
+from src.utils.senhas import SenhasSobrecarregadas, gerar_hash
+from src.utils.streaming import quer_streaming, resposta_ndjson
 
 usuarios_bp = Blueprint('usuarios', __name__)
 
-def verificar_permissao_admin():
-    current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(current_user_id)
-    return usuario and usuario.nivel_acesso >= 3  # Admin Cidade ou Admin Global
-
-def verificar_permissao_admin_global():
-    current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(current_user_id)
-    return usuario and usuario.nivel_acesso == 4  # Apenas Admin Global
-
 @usuarios_bp.route('/', methods=['GET'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def listar_usuarios():
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
-        current_user_id = get_jwt_identity()
-        usuario_atual = Usuario.query.get(current_user_id)
+        logado = usuario_atual()
         
         query = Usuario.query
         
         # Admin Cidade só vê usuários da sua cidade
-        if usuario_atual.nivel_acesso == 3 and usuario_atual.cidade_id:
-            query = query.filter_by(cidade_id=usuario_atual.cidade_id)
+        if logado.nivel_acesso == 3 and logado.cidade_id:
+            query = query.filter_by(cidade_id=logado.cidade_id)
+        
+        if quer_streaming():
+            return resposta_ndjson(query.order_by(Usuario.id), lambda usuario: usuario.to_dict())
         
         usuarios = query.all()
         return jsonify([usuario.to_dict() for usuario in usuarios]), 200
@@ -39,12 +29,9 @@ def listar_usuarios():
         return jsonify({'error': str(e)}), 500
 
 @usuarios_bp.route('/', methods=['POST'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def criar_usuario():
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         data = request.get_json()
         
         # Verificar se o email já existe
@@ -52,17 +39,16 @@ def criar_usuario():
             return jsonify({'error': 'Email já cadastrado'}), 400
         
         # Verificar se pode criar usuário com esse nível de acesso
-        current_user_id = get_jwt_identity()
-        usuario_atual = Usuario.query.get(current_user_id)
+        logado = usuario_atual()
         
         nivel_acesso_solicitado = data.get('nivel_acesso', 1)
         
         # Admin Cidade não pode criar Admin Global
-        if usuario_atual.nivel_acesso == 3 and nivel_acesso_solicitado == 4:
+        if logado.nivel_acesso == 3 and nivel_acesso_solicitado == 4:
             return jsonify({'error': 'Permissão negada para criar Admin Global'}), 403
         
         # Hash da senha
-        senha_hash = bcrypt.hashpw(data.get('senha').encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        senha_hash = gerar_hash(data.get('senha'))
         
         novo_usuario = Usuario(
             nome_completo=data.get('nome_completo'),
@@ -73,40 +59,40 @@ def criar_usuario():
         )
         
         db.session.add(novo_usuario)
-        db.session.commit()
+        db.session.flush()
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='CREATE',
             tabela='usuarios',
             registro_id=novo_usuario.id,
             dados_novos=novo_usuario.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(novo_usuario.to_dict()), 201
         
+    except SenhasSobrecarregadas as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @usuarios_bp.route('/<int:usuario_id>', methods=['PUT'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def atualizar_usuario(usuario_id):
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         usuario = Usuario.query.get_or_404(usuario_id)
         dados_antigos = usuario.to_dict()
         
-        current_user_id = get_jwt_identity()
-        usuario_atual = Usuario.query.get(current_user_id)
+        logado = usuario_atual()
         
         # Admin Cidade só pode editar usuários da sua cidade
-        if usuario_atual.nivel_acesso == 3:
-            if usuario.cidade_id != usuario_atual.cidade_id:
+        if logado.nivel_acesso == 3:
+            if usuario.cidade_id != logado.cidade_id:
                 return jsonify({'error': 'Permissão negada'}), 403
         
         data = request.get_json()
@@ -117,20 +103,23 @@ def atualizar_usuario(usuario_id):
         if 'email' in data:
             usuario.email = data['email']
         if 'senha' in data:
-            usuario.senha_hash = bcrypt.hashpw(data['senha'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            usuario.senha_hash = gerar_hash(data['senha'])
         if 'nivel_acesso' in data:
             # Verificar permissão para alterar nível de acesso
-            if usuario_atual.nivel_acesso == 3 and data['nivel_acesso'] == 4:
+            if logado.nivel_acesso == 3 and data['nivel_acesso'] == 4:
                 return jsonify({'error': 'Permissão negada para criar Admin Global'}), 403
             usuario.nivel_acesso = data['nivel_acesso']
         if 'cidade_id' in data:
             usuario.cidade_id = data['cidade_id']
         
-        db.session.commit()
+        # Tokens emitidos com o nível/cidade/senha anteriores deixam de valer
+        if 'senha' in data or usuario.nivel_acesso != dados_antigos['nivel_acesso'] \
+                or usuario.cidade_id != dados_antigos['cidade_id']:
+            invalidar_autorizacao(usuario)
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='UPDATE',
             tabela='usuarios',
             registro_id=usuario.id,
@@ -138,47 +127,47 @@ def atualizar_usuario(usuario_id):
             dados_novos=usuario.to_dict(),
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify(usuario.to_dict()), 200
         
+    except SenhasSobrecarregadas as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @usuarios_bp.route('/<int:usuario_id>', methods=['DELETE'])
-@jwt_required()
+@requer_nivel(3)  # Admin Cidade ou Admin Global
 def deletar_usuario(usuario_id):
     try:
-        if not verificar_permissao_admin():
-            return jsonify({'error': 'Permissão negada'}), 403
-        
         usuario = Usuario.query.get_or_404(usuario_id)
         dados_antigos = usuario.to_dict()
         
-        current_user_id = get_jwt_identity()
-        usuario_atual = Usuario.query.get(current_user_id)
+        logado = usuario_atual()
         
         # Não pode deletar a si mesmo
-        if usuario_id == current_user_id:
+        if usuario_id == logado.id:
             return jsonify({'error': 'Não é possível deletar seu próprio usuário'}), 400
         
         # Admin Cidade só pode deletar usuários da sua cidade
-        if usuario_atual.nivel_acesso == 3:
-            if usuario.cidade_id != usuario_atual.cidade_id:
+        if logado.nivel_acesso == 3:
+            if usuario.cidade_id != logado.cidade_id:
                 return jsonify({'error': 'Permissão negada'}), 403
         
         db.session.delete(usuario)
-        db.session.commit()
         
         # Registrar auditoria
         registrar_auditoria(
-            usuario_id=get_jwt_identity(),
+            usuario_id=usuario_atual().id,
             acao='DELETE',
             tabela='usuarios',
             registro_id=usuario.id,
             dados_antigos=dados_antigos,
             ip_origem=request.remote_addr
         )
+        db.session.commit()
         
         return jsonify({'message': 'Usuário deletado com sucesso'}), 200
         
@@ -0,0 +1,186 @@
+import gzip
+import heapq
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from src.models.database import db, Auditoria
+
+# Idade (dias) a partir da qual a auditoria sai da tabela e vai para o arquivo
+RETENCAO_DIAS_PADRAO = 365
+
+# Linhas movidas por transação; cada lote é apagado e confirmado antes do próximo
+LOTE_PADRAO = 5000
+
+NOME_INDICE = 'indice.json'
+
+_lock_indice = threading.Lock()
+
+
+def diretorio_arquivo():
+    diretorio = current_app.config.get('AUDITORIA_ARQUIVO_DIR') or \
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'arquivo_auditoria')
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+def ler_indice():
+    """
+    Índice do arquivo: mês (AAAA-MM) -> arquivo, total de linhas e o
+    intervalo de data_hora que ele cobre.
+    """
+    caminho = os.path.join(diretorio_arquivo(), NOME_INDICE)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def _gravar_indice(indice):
+    caminho = os.path.join(diretorio_arquivo(), NOME_INDICE)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(indice, arquivo, indent=2, sort_keys=True)
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    os.replace(temporario, caminho)
+
+
+def _acrescentar_mes(mes, linhas):
+    """Acrescenta as linhas ao arquivo do mês como um novo membro gzip."""
+    nome = f'auditoria-{mes}.jsonl.gz'
+    with open(os.path.join(diretorio_arquivo(), nome), 'ab') as arquivo:
+        with gzip.GzipFile(fileobj=arquivo, mode='wb') as compactado:
+            for linha in linhas:
+                compactado.write(json.dumps(linha, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                compactado.write(b'\n')
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    return nome
+
+
+def arquivar_auditoria(retencao_dias=None, lote=LOTE_PADRAO):
+    """
+    Move para o arquivo os registros de auditoria mais antigos que a retenção.
+
+    Cada lote é gravado no arquivo do mês correspondente e só então apagado
+    da tabela, em uma transação curta. Se o processo parar entre as duas
+    etapas, o lote é arquivado de novo na próxima execução; a leitura
+    descarta ids repetidos.
+
+    Args:
+        retencao_dias (int): Idade mínima dos registros movidos
+            (padrão: config AUDITORIA_RETENCAO_DIAS)
+        lote (int): Registros por transação
+
+    Returns:
+        int: Total de registros arquivados
+    """
+    if retencao_dias is None:
+        retencao_dias = current_app.config.get('AUDITORIA_RETENCAO_DIAS', RETENCAO_DIAS_PADRAO)
+    corte = datetime.utcnow() - timedelta(days=retencao_dias)
+
+    total = 0
+    while True:
+        registros = db.session.execute(
+            select(Auditoria).where(Auditoria.data_hora < corte).order_by(Auditoria.id).limit(lote)
+        ).scalars().all()
+        if not registros:
+            break
+
+        por_mes = {}
+        for registro in registros:
+            por_mes.setdefault(registro.data_hora.strftime('%Y-%m'), []).append(registro.to_dict())
+
+        with _lock_indice:
+            indice = ler_indice()
+            for mes, linhas in por_mes.items():
+                nome = _acrescentar_mes(mes, linhas)
+                entrada = indice.setdefault(mes, {'arquivo': nome, 'linhas': 0, 'data_min': None, 'data_max': None})
+                entrada['linhas'] += len(linhas)
+                datas = [linha['data_hora'] for linha in linhas]
+                entrada['data_min'] = min(filter(None, [entrada['data_min'], *datas]))
+                entrada['data_max'] = max(filter(None, [entrada['data_max'], *datas]))
+            _gravar_indice(indice)
+
+        db.session.execute(Auditoria.__table__.delete().where(
+            Auditoria.id.in_([registro.id for registro in registros])
+        ))
+        db.session.commit()
+        db.session.expunge_all()
+        total += len(registros)
+
+    return total
+
+
+def meses_no_intervalo(data_inicio=None, data_fim=None):
+    """Meses arquivados cujo intervalo de datas cruza [data_inicio, data_fim), do mais recente ao mais antigo."""
+    meses = []
+    for mes, entrada in ler_indice().items():
+        if data_inicio and entrada['data_max'] < data_inicio.isoformat():
+            continue
+        if data_fim and entrada['data_min'] >= data_fim.isoformat():
+            continue
+        meses.append(mes)
+    return sorted(meses, reverse=True)
+
+
+def _ler_mes(mes):
+    caminho = os.path.join(diretorio_arquivo(), ler_indice()[mes]['arquivo'])
+    vistos = set()
+    with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            registro = json.loads(linha)
+            if registro['id'] not in vistos:
+                vistos.add(registro['id'])
+                yield registro
+
+
+def consultar_arquivo(data_inicio=None, data_fim=None, tabela=None, acao=None, usuarios_ids=None, antes_de=None,
+                      registro_id=None):
+    """
+    Registros arquivados que atendem aos filtros, em ordem decrescente de
+    (data_hora, id), no mesmo formato de `Auditoria.to_dict()`.
+
+    Cada mês é lido e ordenado por vez, então a memória usada é limitada ao
+    maior mês do intervalo.
+
+    Args:
+        data_inicio (datetime): Início do intervalo (inclusivo)
+        data_fim (datetime): Fim do intervalo (exclusivo)
+        usuarios_ids (set): Restringe aos usuários informados (opcional)
+        antes_de (tuple): (data_hora, id) do cursor; só registros anteriores a ele
+        registro_id (int): Restringe ao registro informado (opcional)
+
+    Yields:
+        dict: Registro de auditoria
+    """
+    inicio = data_inicio.isoformat() if data_inicio else None
+    fim = data_fim.isoformat() if data_fim else None
+    if antes_de:
+        antes_de = (antes_de[0].isoformat(), antes_de[1])
+        if not data_fim or antes_de[0] < fim:
+            data_fim = datetime.fromisoformat(antes_de[0]) + timedelta(microseconds=1)
+
+    for mes in meses_no_intervalo(data_inicio, data_fim):
+        registros = [
+            registro for registro in _ler_mes(mes)
+            if (not inicio or registro['data_hora'] >= inicio)
+            and (not fim or registro['data_hora'] < fim)
+            and (not tabela or registro['tabela'] == tabela)
+            and (not acao or registro['acao'] == acao)
+            and (registro_id is None or registro['registro_id'] == registro_id)
+            and (usuarios_ids is None or registro['usuario_id'] in usuarios_ids)
+            and (not antes_de or (registro['data_hora'], registro['id']) < antes_de)
+        ]
+        registros.sort(key=lambda registro: (registro['data_hora'], registro['id']), reverse=True)
+        yield from registros
+
+
+def mesclar_com_arquivo(registros, arquivados):
+    """Intercala registros da tabela e do arquivo, ambos em ordem decrescente de (data_hora, id)."""
+    return heapq.merge(
+        registros, arquivados, key=lambda registro: (registro['data_hora'], registro['id']), reverse=True
+    )
@@ -1,8 +1,238 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
 from src.models.database import db, Auditoria
+from src.utils.resumo_auditoria import acumular_resumo
+
+logger = logging.getLogger(__name__)
+
+# Modos do pipeline (config AUDITORIA_MODO)
+MODO_TRANSACAO = 'transacao'    # a linha entra na mesma transação da alteração
+MODO_ASSINCRONO = 'assincrono'  # fila em memória gravada por uma thread em lotes
+
+FILA_MAXIMA_PADRAO = 10000
+LOTE_PADRAO = 500
+INTERVALO_MS_PADRAO = 200
+
+# A cada quantos registros de auditoria de um mesmo registro o estado
+# completo é gravado (os demais guardam só os campos alterados)
+INTERVALO_SNAPSHOT_PADRAO = 20
+
+
+class _GravadorAuditoria:
+    """
+    Fila limitada de eventos de auditoria e a thread que a grava.
+
+    A thread acorda a cada `AUDITORIA_INTERVALO_MS` ou quando há
+    `AUDITORIA_LOTE` eventos na fila e grava tudo com um INSERT de múltiplas
+    linhas. Com a fila cheia, novos eventos são descartados (e contados) em
+    vez de bloquear a requisição. No encerramento do processo a fila é
+    esvaziada antes de sair.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fila = None
+        self._thread = None
+        self._app = None
+        self._parar = threading.Event()
+        self.contadores = {'registrados': 0, 'gravados': 0, 'descartados': 0, 'falhas': 0}
+
+    def _contar(self, contador, quantidade=1):
+        with self._lock:
+            self.contadores[contador] += quantidade
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._app = current_app._get_current_object()
+                self._fila = queue.Queue(maxsize=self._app.config.get('AUDITORIA_FILA_MAXIMA', FILA_MAXIMA_PADRAO))
+                self._parar.clear()
+                self._thread = threading.Thread(target=self._executar, name='gravador-auditoria', daemon=True)
+                self._thread.start()
+                atexit.register(self.encerrar)
+
+    def enfileirar(self, linhas):
+        if self._thread is None:
+            self._iniciar()
+
+        for linha in linhas:
+            try:
+                self._fila.put_nowait(linha)
+                self._contar('registrados')
+            except queue.Full:
+                self._contar('descartados')
+                logger.warning('Fila de auditoria cheia: evento descartado (%s %s %s)',
+                               linha['acao'], linha['tabela'], linha['registro_id'])
+
+    def _retirar_lote(self, tamanho, prazo):
+        lote = []
+        while len(lote) < tamanho:
+            restante = prazo - time.monotonic()
+            try:
+                lote.append(self._fila.get(timeout=max(restante, 0)) if restante > 0 else self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _gravar(self, lote):
+        with self._app.app_context():
+            try:
+                db.session.execute(Auditoria.__table__.insert(), lote)
+                acumular_resumo(lote)
+                db.session.commit()
+                self._contar('gravados', len(lote))
+            except Exception:
+                db.session.rollback()
+                self._contar('falhas')
+                self._contar('descartados', len(lote))
+                logger.exception('Erro ao gravar %d eventos de auditoria', len(lote))
+
+    def _executar(self):
+        tamanho = self._app.config.get('AUDITORIA_LOTE', LOTE_PADRAO)
+        intervalo = self._app.config.get('AUDITORIA_INTERVALO_MS', INTERVALO_MS_PADRAO) / 1000
+
+        while not (self._parar.is_set() and self._fila.empty()):
+            lote = self._retirar_lote(tamanho, time.monotonic() + intervalo)
+            if lote:
+                self._gravar(lote)
+
+    def encerrar(self, timeout=10):
+        """Para a thread depois de gravar os eventos que ainda estão na fila."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._parar.set()
+            thread.join(timeout)
+
+    def profundidade(self):
+        return self._fila.qsize() if self._fila is not None else 0
+
+
+gravador_auditoria = _GravadorAuditoria()
+
+
+def modo_auditoria():
+    return current_app.config.get('AUDITORIA_MODO', MODO_TRANSACAO)
+
+
+def estatisticas_pipeline():
+    """Contadores do pipeline de auditoria (profundidade da fila e descartes)."""
+    return {
+        'modo': modo_auditoria(),
+        'fila': gravador_auditoria.profundidade(),
+        'fila_maxima': current_app.config.get('AUDITORIA_FILA_MAXIMA', FILA_MAXIMA_PADRAO),
+        **gravador_auditoria.contadores
+    }
+
+
+# No modo assíncrono os eventos aguardam na sessão e só vão para a fila se a
+# transação da alteração for confirmada. No modo transação as linhas já
+# foram inseridas, mas só entram em 'registrados' com o commit
+@event.listens_for(Session, 'after_commit')
+def _enfileirar_pendentes(session):
+    pendentes = session.info.pop('auditoria_pendente', None)
+    if pendentes:
+        gravador_auditoria.enfileirar(pendentes)
+    inseridos = session.info.pop('auditoria_inserida', 0)
+    if inseridos:
+        gravador_auditoria._contar('registrados', inseridos)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_pendentes(session, transacao_anterior):
+    session.info.pop('auditoria_pendente', None)
+    session.info.pop('auditoria_inserida', None)
+
+
+def diferenca(dados_antigos, dados_novos):
+    """Campos com valores diferentes entre os dois estados, como (antigos, novos)."""
+    campos = [campo for campo in {**dados_antigos, **dados_novos}
+              if dados_antigos.get(campo) != dados_novos.get(campo)]
+    return (
+        {campo: dados_antigos.get(campo) for campo in campos},
+        {campo: dados_novos.get(campo) for campo in campos}
+    )
+
+
+def versao_com_snapshot(versao):
+    """Indica se a alteração que leva um registro versionado a `versao` grava o estado completo."""
+    intervalo = current_app.config.get('AUDITORIA_INTERVALO_SNAPSHOT', INTERVALO_SNAPSHOT_PADRAO)
+    return versao is not None and versao % intervalo == 0
+
+
+def _precisa_snapshot(tabela, registro_id, dados_novos):
+    # Registros versionados (profissionais) ganham uma versão por alteração
+    # auditada: o snapshot sai a cada `intervalo` versões, sem consultar a
+    # auditoria
+    if dados_novos.get('versao') is not None:
+        return versao_com_snapshot(dados_novos['versao'])
+
+    # Sem versão (cidades, equipamentos, usuários, pouco alterados): sem
+    # estado completo entre os últimos registros, este será o próximo
+    intervalo = current_app.config.get('AUDITORIA_INTERVALO_SNAPSHOT', INTERVALO_SNAPSHOT_PADRAO)
+    recentes = db.session.execute(
+        select(Auditoria.snapshot)
+        .where(Auditoria.tabela == tabela, Auditoria.registro_id == registro_id)
+        .order_by(Auditoria.data_hora.desc(), Auditoria.id.desc())
+        .limit(intervalo - 1)
+    ).scalars().all()
+    return not any(recentes)
+
+
+def codificar_dados(tabela, registro_id, dados_antigos, dados_novos, verificar_snapshot=True):
+    """
+    Reduz os dados de uma alteração aos campos que mudaram.
+
+    Criações (sem dados antigos) guardam o estado completo. Em alterações,
+    periodicamente dados_novos guarda o estado completo (snapshot), o que
+    limita quantas diferenças precisam ser aplicadas para reconstruir um
+    estado. Com `versao` no estado novo, a decisão não consulta o banco;
+    sem ela, conta as alterações desde o último snapshot do registro.
+
+    Returns:
+        tuple: (dados_antigos, dados_novos, snapshot)
+    """
+    if dados_antigos is None or dados_novos is None:
+        return dados_antigos, dados_novos, dados_novos is not None
+
+    antigos, novos = diferenca(dados_antigos, dados_novos)
+    if verificar_snapshot and _precisa_snapshot(tabela, registro_id, dados_novos):
+        return antigos, dados_novos, True
+    return antigos, novos, False
+
+
+def _registrar_linhas(modo, linhas):
+    if modo == MODO_ASSINCRONO:
+        # Garante uma transação aberta para que um rollback descarte os pendentes
+        sessao = db.session()
+        if not sessao.in_transaction():
+            sessao.begin()
+        sessao.info.setdefault('auditoria_pendente', []).extend(linhas)
+        return
+
+    db.session.execute(Auditoria.__table__.insert(), linhas)
+    acumular_resumo(linhas)
+    sessao = db.session()
+    sessao.info['auditoria_inserida'] = sessao.info.get('auditoria_inserida', 0) + len(linhas)
+
 
 def registrar_auditoria(usuario_id, acao, tabela, registro_id, dados_antigos=None, dados_novos=None, ip_origem=None):
     """
-    Registra uma ação de auditoria no banco de dados.
+    Registra uma ação de auditoria junto com a transação atual.
+    
+    Com os dois estados completos, grava só os campos alterados (ver
+    `codificar_dados`). Deve ser chamada antes do commit da alteração
+    auditada. No modo `transacao` a linha é inserida na própria transação
+    (se ela falhar, a alteração também é desfeita); no modo `assincrono` o
+    evento entra na fila do gravador quando a transação é confirmada.
     
     Args:
         usuario_id (int): ID do usuário que realizou a ação
@@ -13,22 +243,66 @@ def registrar_auditoria(usuario_id, acao, tabela, registro_id, dados_antigos=Non
         dados_novos (dict): Dados após a alteração (opcional)
         ip_origem (str): IP de origem da requisição (opcional)
     """
-    try:
-        auditoria = Auditoria(
-            usuario_id=usuario_id,
-            acao=acao,
-            tabela=tabela,
-            registro_id=registro_id,
-            dados_antigos=dados_antigos,
-            dados_novos=dados_novos,
-            ip_origem=ip_origem
-        )
-        
-        db.session.add(auditoria)
-        db.session.commit()
-        
-    except Exception as e:
-        # Em caso de erro na auditoria, não deve interromper a operação principal
-        print(f"Erro ao registrar auditoria: {str(e)}")
-        db.session.rollback()
+    dados_antigos, dados_novos, snapshot = codificar_dados(tabela, registro_id, dados_antigos, dados_novos)
+    _registrar_linhas(modo_auditoria(), [{
+        'usuario_id': usuario_id,
+        'acao': acao,
+        'tabela': tabela,
+        'registro_id': registro_id,
+        'dados_antigos': dados_antigos,
+        'dados_novos': dados_novos,
+        'snapshot': snapshot,
+        'data_hora': datetime.utcnow(),
+        'ip_origem': ip_origem
+    }])
+
+
+def serializar_dados(dados):
+    """Converte datas de um dict de campos para o formato ISO usado na auditoria."""
+    return {
+        campo: valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+        for campo, valor in dados.items()
+    }
+
+def registrar_auditoria_em_lote(usuario_id, acao, tabela, registros, ip_origem=None):
+    """
+    Registra várias ações de auditoria com um único INSERT de múltiplas linhas.
+
+    Usada pelas operações em massa (importação, lote). Em qualquer modo as
+    linhas entram na transação atual: o INSERT já é um só, e passar milhares
+    de eventos pela fila arriscaria descartá-los.
+
+    As alterações costumam trazer só os campos alterados. Quando `versao`
+    está em dados_novos, a regra de snapshot é a mesma de
+    `registrar_auditoria`, e nas versões de `versao_com_snapshot` os dois
+    estados precisam estar completos.
 
+    Args:
+        usuario_id (int): ID do usuário que realizou a ação
+        acao (str): Tipo de ação (CREATE, UPDATE, DELETE)
+        tabela (str): Nome da tabela afetada
+        registros (list): Tuplas (registro_id, dados_antigos, dados_novos)
+        ip_origem (str): IP de origem da requisição (opcional)
+    """
+    if not registros:
+        return
+
+    data_hora = datetime.utcnow()
+    linhas = []
+    for registro_id, dados_antigos, dados_novos in registros:
+        # Sem versão não há como saber se os dados estão completos: sem snapshot
+        dados_antigos, dados_novos, snapshot = codificar_dados(
+            tabela, registro_id, dados_antigos, dados_novos, verificar_snapshot='versao' in (dados_novos or {})
+        )
+        linhas.append({
+            'usuario_id': usuario_id,
+            'acao': acao,
+            'tabela': tabela,
+            'registro_id': registro_id,
+            'dados_antigos': dados_antigos,
+            'dados_novos': dados_novos,
+            'snapshot': snapshot,
+            'data_hora': data_hora,
+            'ip_origem': ip_origem
+        })
+    _registrar_linhas(MODO_TRANSACAO, linhas)
@@ -0,0 +1,255 @@
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, g, jsonify
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, jwt_required
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+from src.models.database import db, Usuario, TokenRevogado
+
+# Por quanto tempo (segundos) o mapa de versões de autorização é reutilizado
+# antes de ser recarregado do banco. Define o atraso máximo para que um
+# rebaixamento feito em outro worker invalide os tokens antigos.
+CACHE_TTL_PADRAO = 30
+
+# Intervalo mínimo (segundos) entre recargas provocadas por usuário ausente
+# do mapa (ex.: usuário criado depois da última carga)
+INTERVALO_RECARGA_AUSENTE = 1
+
+
+class UsuarioAtual:
+    """Usuário da requisição, montado a partir das claims do token (sem consulta ao banco)."""
+
+    __slots__ = ('id', 'nivel_acesso', 'cidade_id')
+
+    def __init__(self, id, nivel_acesso, cidade_id):
+        self.id = id
+        self.nivel_acesso = nivel_acesso
+        self.cidade_id = cidade_id
+
+
+class _VersoesAutorizacao:
+    """
+    Cache em memória de `Usuario.versao_autorizacao` para todos os usuários.
+
+    O mapa completo é recarregado com uma única consulta a cada TTL, de modo
+    que a verificação de revogação não custa uma ida ao banco por requisição.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versoes = {}
+        self._carregado_em = None
+
+    def obter(self, usuario_id):
+        ttl = current_app.config.get('AUTORIZACAO_CACHE_TTL', CACHE_TTL_PADRAO)
+        with self._lock:
+            idade = None if self._carregado_em is None else time.monotonic() - self._carregado_em
+            if idade is None or idade > ttl or \
+                    (usuario_id not in self._versoes and idade > INTERVALO_RECARGA_AUSENTE):
+                self._versoes = dict(db.session.execute(
+                    select(Usuario.id, Usuario.versao_autorizacao)
+                ).all())
+                self._carregado_em = time.monotonic()
+            return self._versoes.get(usuario_id)
+
+    def invalidar(self):
+        with self._lock:
+            self._carregado_em = None
+
+
+versoes_autorizacao = _VersoesAutorizacao()
+
+
+class _JtisRevogados:
+    """
+    Cache em memória dos jti revogados e ainda não expirados.
+
+    A tabela tokens_revogados é lida de forma incremental (apenas linhas com
+    id maior que o último lido) no máximo uma vez por TTL, então a checagem
+    feita em cada requisição é só uma busca em dicionário. Entradas expiradas
+    são descartadas a cada sincronização, o que limita o tamanho do cache aos
+    tokens revogados dentro da validade do refresh token.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis = {}
+        self._ultimo_id = 0
+        self._carregado_em = None
+
+    def _sincronizar(self):
+        agora = datetime.utcnow()
+        linhas = db.session.execute(
+            select(TokenRevogado.id, TokenRevogado.jti, TokenRevogado.expira_em)
+            .where(TokenRevogado.id > self._ultimo_id, TokenRevogado.expira_em > agora)
+            .order_by(TokenRevogado.id)
+        ).all()
+        for registro_id, jti, expira_em in linhas:
+            self._jtis[jti] = expira_em
+            self._ultimo_id = registro_id
+        self._jtis = {jti: expira_em for jti, expira_em in self._jtis.items() if expira_em > agora}
+        self._carregado_em = time.monotonic()
+
+    def contem(self, jti):
+        ttl = current_app.config.get('AUTORIZACAO_CACHE_TTL', CACHE_TTL_PADRAO)
+        with self._lock:
+            if self._carregado_em is None or time.monotonic() - self._carregado_em > ttl:
+                self._sincronizar()
+            return jti in self._jtis
+
+    def adicionar(self, jti, expira_em):
+        with self._lock:
+            self._jtis[jti] = expira_em
+
+
+jtis_revogados = _JtisRevogados()
+
+
+def claims_usuario(usuario):
+    """Claims adicionais gravadas no token de acesso no login."""
+    return {
+        'nivel_acesso': usuario.nivel_acesso,
+        'cidade_id': usuario.cidade_id,
+        'versao_autorizacao': usuario.versao_autorizacao
+    }
+
+
+def emitir_tokens(usuario):
+    """Par de tokens (acesso e refresh) com as claims atuais do usuário."""
+    claims = claims_usuario(usuario)
+    return {
+        'access_token': create_access_token(identity=str(usuario.id), additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=str(usuario.id), additional_claims=claims)
+    }
+
+
+def revogar_token(jwt_payload, motivo):
+    """
+    Grava o jti do token em tokens_revogados (sem commit).
+
+    O jti é único na tabela: revogar duas vezes o mesmo token levanta
+    IntegrityError no flush, o que a rotação do refresh token usa para
+    detectar reuso.
+
+    Args:
+        jwt_payload (dict): Claims do token
+        motivo (str): 'rotacao' ou 'logout'
+    """
+    expira_em = datetime.utcfromtimestamp(jwt_payload['exp'])
+    db.session.add(TokenRevogado(
+        jti=jwt_payload['jti'],
+        usuario_id=int(jwt_payload['sub']),
+        tipo=jwt_payload['type'],
+        motivo=motivo,
+        expira_em=expira_em
+    ))
+    db.session.flush()
+    jtis_revogados.adicionar(jwt_payload['jti'], expira_em)
+
+
+def motivo_revogacao(jti):
+    """Motivo gravado para um jti revogado, ou None."""
+    return db.session.execute(select(TokenRevogado.motivo).where(TokenRevogado.jti == jti)).scalar()
+
+
+def limpar_tokens_expirados():
+    """Remove de tokens_revogados os registros de tokens já expirados."""
+    resultado = db.session.execute(delete(TokenRevogado).where(TokenRevogado.expira_em <= datetime.utcnow()))
+    db.session.commit()
+    return resultado.rowcount
+
+
+def invalidar_autorizacao(usuario):
+    """
+    Revoga todos os tokens já emitidos para o usuário (ex.: após rebaixamento
+    ou troca de senha).
+
+    Deve ser chamado antes do commit da alteração do usuário. O cache de
+    versões só é descartado depois do commit: antes dele, uma recarga feita
+    por outra requisição ainda leria a versão antiga e a manteria por um TTL.
+    """
+    usuario.versao_autorizacao = (usuario.versao_autorizacao or 0) + 1
+    db.session.info['invalidar_autorizacao'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_versoes(session):
+    if session.info.pop('invalidar_autorizacao', None):
+        versoes_autorizacao.invalidar()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_invalidacao(session, transacao_anterior):
+    session.info.pop('invalidar_autorizacao', None)
+
+
+def token_revogado(jwt_header, jwt_payload):
+    """
+    Callback `token_in_blocklist_loader`: o token é recusado se foi emitido
+    sem as claims de autorização, antes da última mudança de permissão ou
+    senha do usuário, ou se o seu jti foi revogado. Nenhuma das verificações
+    consulta o banco fora das recargas periódicas dos caches.
+    """
+    if 'versao_autorizacao' not in jwt_payload:
+        return True
+    if versoes_autorizacao.obter(int(jwt_payload['sub'])) != jwt_payload['versao_autorizacao']:
+        return True
+    # O jti do refresh token é conferido no banco por /auth/refresh, que precisa
+    # distinguir reuso (rotação) de logout
+    if jwt_payload['type'] == 'refresh':
+        return False
+    return jtis_revogados.contem(jwt_payload['jti'])
+
+
+def usuario_atual():
+    """Usuário autenticado da requisição, resolvido uma única vez a partir das claims."""
+    if 'usuario_atual' not in g:
+        claims = get_jwt()
+        g.usuario_atual = UsuarioAtual(int(claims['sub']), claims['nivel_acesso'], claims.get('cidade_id'))
+    return g.usuario_atual
+
+
+def carregar_usuario():
+    """Instância completa de Usuario do usuário autenticado (no máximo uma consulta por requisição)."""
+    if 'usuario_carregado' not in g:
+        g.usuario_carregado = db.session.get(Usuario, usuario_atual().id)
+    return g.usuario_carregado
+
+
+def requer_nivel(nivel_minimo=1):
+    """
+    Decorator de rota: exige token válido e nível de acesso mínimo.
+
+    Níveis: 1=Visualização, 2=Editor, 3=Admin Cidade, 4=Admin Global.
+    """
+    def decorador(funcao):
+        @wraps(funcao)
+        @jwt_required()
+        def envolvida(*args, **kwargs):
+            if usuario_atual().nivel_acesso < nivel_minimo:
+                return jsonify({'error': 'Permissão negada'}), 403
+            return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def pode_editar_profissional(profissional=None):
+    """
+    Editor e Admin Cidade editam profissionais da própria cidade; Admin
+    Global edita todos. Sem profissional (criação), basta o nível.
+    """
+    usuario = usuario_atual()
+
+    # Admin Global pode tudo
+    if usuario.nivel_acesso == 4:
+        return True
+
+    # Admin Cidade e Editor podem editar profissionais da sua cidade
+    if usuario.nivel_acesso in (2, 3):
+        if profissional:
+            return profissional.cidade_id == usuario.cidade_id
+        return True  # Para criação, verificar depois
+
+    return False  # Visualização não pode editar
@@ -0,0 +1,248 @@
+import logging
+import re
+import threading
+import unicodedata
+from flask import current_app
+from sqlalchemy import select, func, case, union_all, false, or_
+from src.models.database import db, Profissional, ProfissionalBusca
+
+logger = logging.getLogger(__name__)
+
+# Peso de cada campo no cálculo de relevância
+PESOS = {
+    'cpf': 8,
+    'email': 4,
+    'nome_completo': 3,
+    'profissao': 1,
+    'cargo': 1
+}
+
+# Campos do profissional que alimentam o índice
+CAMPOS_INDEXADOS = ('cpf', 'nome_completo', 'email', 'profissao', 'cargo')
+
+# Palavras ignoradas na indexação e na busca
+STOPWORDS = {'a', 'da', 'das', 'de', 'do', 'dos', 'e', 'o'}
+
+_SEPARADORES = re.compile(r'[^a-z0-9]+')
+_SOMENTE_DOCUMENTO = re.compile(r'^[\d.\-/\s]+$')
+
+# Quantidade de profissionais processados por lote na reindexação
+TAMANHO_LOTE = 1000
+
+# Uma reindexação em segundo plano por vez neste processo
+_reindexando = threading.Lock()
+
+
+def normalizar(texto):
+    """Converte para minúsculas e remove acentos ("José" -> "jose")."""
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def somente_digitos(texto):
+    return re.sub(r'\D', '', texto or '')
+
+
+def tokenizar(texto):
+    """Divide o texto normalizado em palavras, descartando stopwords."""
+    return [t for t in _SEPARADORES.split(normalizar(texto)) if t and t not in STOPWORDS]
+
+
+def termos_busca(q):
+    """
+    Converte o texto digitado pelo usuário em termos de busca.
+
+    Entradas compostas apenas por dígitos e pontuação (ex.: "123.456.789")
+    são tratadas como um único prefixo de CPF.
+    """
+    if q and _SOMENTE_DOCUMENTO.match(q) and somente_digitos(q):
+        return [somente_digitos(q)]
+    return tokenizar(q)
+
+
+def tokens_profissional(dados):
+    """
+    Gera as linhas do índice de busca de um profissional.
+
+    Args:
+        dados: Instância de Profissional ou objeto com os mesmos atributos
+
+    Returns:
+        list: Dicionários (campo, token, peso) sem repetição
+    """
+    tokens = {}
+
+    cpf = somente_digitos(dados.cpf)
+    if cpf:
+        tokens[('cpf', cpf)] = PESOS['cpf']
+
+    for campo in ('nome_completo', 'email', 'profissao', 'cargo'):
+        for token in tokenizar(getattr(dados, campo)):
+            tokens[(campo, token[:255])] = PESOS[campo]
+
+    return [
+        {'campo': campo, 'token': token, 'peso': peso}
+        for (campo, token), peso in tokens.items()
+    ]
+
+
+def indexar_profissional(profissional):
+    """
+    Atualiza o índice de busca de um profissional na sessão atual.
+
+    Deve ser chamado após o flush (o profissional precisa ter id) e antes do
+    commit, para que o índice seja gravado na mesma transação.
+    """
+    db.session.execute(
+        ProfissionalBusca.__table__.delete()
+        .where(ProfissionalBusca.profissional_id == profissional.id)
+    )
+
+    linhas = tokens_profissional(profissional)
+    for linha in linhas:
+        linha['profissional_id'] = profissional.id
+
+    if linhas:
+        db.session.execute(ProfissionalBusca.__table__.insert(), linhas)
+
+
+def reindexar_todos():
+    """
+    Reconstrói o índice de busca de todos os profissionais em lotes.
+
+    Returns:
+        int: Quantidade de profissionais indexados
+    """
+    tabela = ProfissionalBusca.__table__
+    db.session.execute(tabela.delete())
+
+    consulta = select(
+        Profissional.id, Profissional.cpf, Profissional.nome_completo,
+        Profissional.email, Profissional.profissao, Profissional.cargo
+    ).order_by(Profissional.id).execution_options(yield_per=TAMANHO_LOTE)
+
+    total = 0
+    lote = []
+    for linha in db.session.execute(consulta):
+        for token in tokens_profissional(linha):
+            token['profissional_id'] = linha.id
+            lote.append(token)
+        total += 1
+
+        if len(lote) >= TAMANHO_LOTE:
+            db.session.execute(tabela.insert(), lote)
+            lote = []
+
+    if lote:
+        db.session.execute(tabela.insert(), lote)
+
+    db.session.commit()
+    return total
+
+
+def indice_disponivel():
+    """
+    Indica se o índice de busca pode ser consultado. Em bases anteriores ao
+    índice, a tabela começa vazia mesmo havendo profissionais (todo
+    profissional tem ao menos o token do CPF).
+    """
+    if db.session.execute(select(ProfissionalBusca.profissional_id).limit(1)).first():
+        return True
+    return db.session.execute(select(Profissional.id).limit(1)).first() is None
+
+
+def reindexar_em_segundo_plano():
+    """
+    Monta o índice de busca em uma thread, sem bloquear a requisição.
+
+    Returns:
+        bool: False se já há uma reindexação em andamento neste processo
+    """
+    if not _reindexando.acquire(blocking=False):
+        return False
+    app = current_app._get_current_object()
+
+    def executar():
+        try:
+            with app.app_context():
+                try:
+                    reindexar_todos()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Erro ao reindexar a busca de profissionais')
+        finally:
+            _reindexando.release()
+
+    threading.Thread(target=executar, name='reindexar-busca', daemon=True).start()
+    return True
+
+
+def _faixa_prefixo(termo):
+    # Comparação por faixa (token >= termo AND token < próximo) usa o índice
+    # tanto no SQLite quanto no MySQL, ao contrário de LIKE 'termo%'
+    proximo = termo[:-1] + chr(ord(termo[-1]) + 1)
+    return ProfissionalBusca.token >= termo, ProfissionalBusca.token < proximo
+
+
+def subquery_relevancia(termos, campos=None):
+    """
+    Monta a subquery (profissional_id, relevancia) dos profissionais que
+    casam com todos os termos por prefixo.
+
+    Um termo idêntico ao token vale o dobro do peso do campo; um prefixo
+    vale o peso simples. A relevância é a soma do melhor casamento de cada
+    termo.
+
+    Args:
+        termos (list): Termos já normalizados (ver `termos_busca`)
+        campos (tuple): Restringe a busca a esses campos (opcional)
+    """
+    consultas = []
+    for termo in termos:
+        consulta = select(
+            ProfissionalBusca.profissional_id.label('profissional_id'),
+            func.max(case(
+                (ProfissionalBusca.token == termo, ProfissionalBusca.peso * 2),
+                else_=ProfissionalBusca.peso
+            )).label('pontos')
+        ).where(*_faixa_prefixo(termo))
+
+        if campos:
+            consulta = consulta.where(ProfissionalBusca.campo.in_(campos))
+
+        consultas.append(consulta.group_by(ProfissionalBusca.profissional_id))
+
+    casamentos = union_all(*consultas).subquery()
+
+    return select(
+        casamentos.c.profissional_id,
+        func.sum(casamentos.c.pontos).label('relevancia')
+    ).group_by(casamentos.c.profissional_id)\
+     .having(func.count() == len(termos))\
+     .subquery()
+
+
+def filtrar_por_termos(query, texto, campos=None, indice=True):
+    """
+    Restringe uma query de Profissional aos registros que casam com `texto`.
+
+    Um texto sem termos (só stopwords ou pontuação) não casa com nenhum
+    registro. Com `indice=False` (índice ainda não montado), usa ILIKE
+    sobre as colunas, sem relevância.
+
+    Returns:
+        tuple: (query filtrada, coluna de relevância ou None)
+    """
+    if not indice:
+        colunas = [getattr(Profissional, campo) for campo in (campos or CAMPOS_INDEXADOS)]
+        return query.filter(or_(*[coluna.ilike(f'%{texto}%') for coluna in colunas])), None
+
+    termos = termos_busca(texto)
+    if not termos:
+        return query.filter(false()), None
+
+    relevancia = subquery_relevancia(termos, campos)
+    query = query.join(relevancia, Profissional.id == relevancia.c.profissional_id)
+    return query, relevancia.c.relevancia
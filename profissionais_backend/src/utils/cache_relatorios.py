@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from flask import current_app
+from src.utils.relatorios import arquivo_temporario
+from src.utils.versoes import ler_versoes
+
+# Espaço máximo ocupado pelos relatórios guardados (0 desativa o cache)
+BYTES_PADRAO = 512 * 1024 * 1024
+
+# Horas sem uso depois das quais um relatório guardado é removido
+HORAS_PADRAO = 24
+
+# Filtros que mudam o conteúdo do relatório (jobs antigos podem não ter todos)
+CAMPOS_FILTROS = ('status', 'cidade_id', 'equipamento_id', 'cidade_escopo', 'agrupar')
+
+
+def escopos_relatorio(filtros):
+    """Escopos de versão cujos dados aparecem no relatório."""
+    cidade_id = filtros['cidade_escopo'] or filtros['cidade_id']
+    profissionais = f'profissionais:cidade:{cidade_id}' if cidade_id else 'profissionais'
+    return [profissionais, 'cidades', 'equipamentos']
+
+
+def chave_cache(formato, filtros):
+    """
+    Chave de um relatório: formato, filtros normalizados (já com o escopo do
+    usuário) e a versão atual dos dados envolvidos. Qualquer escrita nesses
+    dados muda a chave, então um relatório guardado nunca fica desatualizado.
+
+    A versão é lida antes dos dados: o arquivo gerado em seguida é no mínimo
+    tão recente quanto a chave.
+    """
+    escopos = escopos_relatorio(filtros)
+    conteudo = json.dumps(
+        [formato, {campo: filtros.get(campo) for campo in CAMPOS_FILTROS},
+         list(zip(escopos, ler_versoes(*escopos)))],
+        separators=(',', ':'),
+        sort_keys=True
+    )
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def vincular(origem, destino):
+    """Cria `destino` com o conteúdo de `origem` (hard link ou cópia), de forma atômica."""
+    parcial = f'{destino}.{uuid.uuid4().hex}.parcial'
+    try:
+        os.link(origem, parcial)
+    except OSError:
+        shutil.copyfile(origem, parcial)
+    os.replace(parcial, destino)
+
+
+class _CacheRelatorios:
+    """
+    Cache em disco dos arquivos de relatório, um arquivo por chave.
+
+    A data de modificação do arquivo marca o último uso: é atualizada a cada
+    acerto. Depois de cada gravação, saem os arquivos sem uso há mais de
+    RELATORIO_CACHE_HORAS e, se o total passar de RELATORIO_CACHE_BYTES, os
+    usados há mais tempo. Os contadores são do processo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = {'acertos': 0, 'falhas': 0, 'remocoes': 0}
+
+    def _contar(self, contador, quantidade=1):
+        with self._lock:
+            self.contadores[contador] += quantidade
+
+    def ativo(self):
+        return current_app.config.get('RELATORIO_CACHE_BYTES', BYTES_PADRAO) > 0
+
+    def diretorio(self):
+        diretorio = current_app.config.get('RELATORIO_CACHE_DIR') or \
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'cache_relatorios')
+        os.makedirs(diretorio, exist_ok=True)
+        return diretorio
+
+    def _caminho(self, chave, extensao):
+        return os.path.join(self.diretorio(), f'{chave}.{extensao}')
+
+    def _usar(self, chave, extensao):
+        # Caminho do relatório guardado, marcado como usado agora; None se ausente
+        if not self.ativo():
+            return None
+        caminho = self._caminho(chave, extensao)
+        try:
+            os.utime(caminho)
+        except FileNotFoundError:
+            self._contar('falhas')
+            return None
+        self._contar('acertos')
+        return caminho
+
+    def abrir(self, chave, extensao):
+        """Arquivo guardado aberto para leitura, ou None (falha)."""
+        caminho = self._usar(chave, extensao)
+        if caminho is None:
+            return None
+        try:
+            return open(caminho, 'rb')
+        except FileNotFoundError:
+            # Removido entre a marcação e a abertura
+            return None
+
+    def copiar(self, chave, extensao, destino):
+        """Cria `destino` a partir do relatório guardado. Retorna False se ele não existe."""
+        caminho = self._usar(chave, extensao)
+        if caminho is None:
+            return False
+        try:
+            vincular(caminho, destino)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def gerar(self, chave, extensao, gerar):
+        """
+        Gera o relatório com `gerar(destino)`, guarda-o no cache e o retorna
+        aberto para leitura. Com o cache desativado, gera em um arquivo
+        temporário.
+        """
+        if not self.ativo():
+            destino = arquivo_temporario()
+            try:
+                gerar(destino)
+            except Exception:
+                destino.close()
+                raise
+            destino.seek(0)
+            return destino
+
+        caminho = self._caminho(chave, extensao)
+        parcial = f'{caminho}.{uuid.uuid4().hex}.parcial'
+        try:
+            with open(parcial, 'wb') as destino:
+                gerar(destino)
+            arquivo = open(parcial, 'rb')
+            os.replace(parcial, caminho)
+        except Exception:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            raise
+
+        self.remover_excedentes()
+        return arquivo
+
+    def guardar(self, chave, extensao, origem):
+        """Guarda no cache um relatório já gerado em `origem`."""
+        if not self.ativo():
+            return
+        vincular(origem, self._caminho(chave, extensao))
+        self.remover_excedentes()
+
+    def _arquivos(self):
+        arquivos = []
+        for entrada in os.scandir(self.diretorio()):
+            if entrada.is_file() and not entrada.name.endswith('.parcial'):
+                try:
+                    estado = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                arquivos.append((estado.st_mtime, estado.st_size, entrada.path))
+        return arquivos
+
+    def remover_excedentes(self):
+        """Remove os arquivos expirados e, acima do limite de espaço, os usados há mais tempo."""
+        limite = current_app.config.get('RELATORIO_CACHE_BYTES', BYTES_PADRAO)
+        corte = time.time() - current_app.config.get('RELATORIO_CACHE_HORAS', HORAS_PADRAO) * 3600
+
+        arquivos = sorted(self._arquivos())
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        removidos = 0
+        for usado_em, tamanho, caminho in arquivos:
+            if usado_em >= corte and total <= limite:
+                break
+            try:
+                os.remove(caminho)
+                removidos += 1
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+        if removidos:
+            self._contar('remocoes', removidos)
+        return removidos
+
+    def estatisticas(self):
+        """Contadores do processo e ocupação atual do cache."""
+        arquivos = self._arquivos() if self.ativo() else []
+        with self._lock:
+            contadores = dict(self.contadores)
+        consultas = contadores['acertos'] + contadores['falhas']
+        return {
+            **contadores,
+            'taxa_acertos': round(contadores['acertos'] / consultas, 3) if consultas else None,
+            'arquivos': len(arquivos),
+            'bytes': sum(tamanho for _, tamanho, _ in arquivos),
+            'bytes_maximo': current_app.config.get('RELATORIO_CACHE_BYTES', BYTES_PADRAO),
+            'horas': current_app.config.get('RELATORIO_CACHE_HORAS', HORAS_PADRAO)
+        }
+
+
+cache_relatorios = _CacheRelatorios()
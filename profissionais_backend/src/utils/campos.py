@@ -0,0 +1,55 @@
+from sqlalchemy.orm import load_only
+
+
+def ler_campos(valor, modelo):
+    """
+    Interpreta o parâmetro `fields` (lista separada por vírgulas).
+
+    Args:
+        valor (str): Valor recebido na query string (pode ser None)
+        modelo: Modelo cujas colunas podem ser solicitadas
+
+    Returns:
+        list: Campos solicitados, sempre incluindo `id`, ou None para
+        retornar a representação completa
+    """
+    if not valor:
+        return None
+
+    colunas = modelo.__table__.columns.keys()
+    campos = ['id']
+
+    for campo in valor.split(','):
+        campo = campo.strip()
+        if not campo or campo in campos:
+            continue
+        if campo not in colunas:
+            raise ValueError(f'Campo inválido: {campo}')
+        campos.append(campo)
+
+    return campos
+
+
+def opcoes_carregamento(modelo, campos, *extras):
+    """
+    Gera a opção load_only para que apenas as colunas necessárias sejam
+    incluídas no SELECT.
+
+    Args:
+        modelo: Modelo consultado
+        campos (list): Campos solicitados (resultado de `ler_campos`)
+        *extras (str): Colunas usadas internamente pela rota (permissão,
+            ordenação) que precisam ser carregadas mesmo fora de `campos`
+
+    Returns:
+        list: Opções para `query.options(...)` (vazia se campos for None)
+    """
+    if campos is None:
+        return []
+
+    nomes = list(campos)
+    for extra in extras:
+        if extra not in nomes:
+            nomes.append(extra)
+
+    return [load_only(*[getattr(modelo, nome) for nome in nomes])]
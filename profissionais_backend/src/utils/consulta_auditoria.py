@@ -0,0 +1,184 @@
+import base64
+import heapq
+import json
+import zlib
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from sqlalchemy import Text, select, type_coerce
+from src.models.database import db, Auditoria, Usuario
+from src.utils.arquivo_auditoria import consultar_arquivo, meses_no_intervalo
+
+# Linhas buscadas do banco por vez na exportação
+LOTE_EXPORTACAO = 1000
+
+# Início do JSON gravado compactado por JSONCompactavel
+_MARCA_COMPACTADO = '{"_zlib"'
+
+
+def ler_data(valor, nome):
+    """Converte um parâmetro de data AAAA-MM-DD da query string."""
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Parâmetro {nome} inválido. Use AAAA-MM-DD')
+
+
+def usuarios_visiveis(usuario):
+    """Ids dos usuários cujas ações o usuário pode ver; Admin Cidade só vê os da sua cidade (None = todos)."""
+    if usuario.nivel_acesso >= 4:
+        return None
+    # Sem cidade não há escopo: `cidade_id IS NULL` alcançaria os demais
+    # usuários sem cidade, inclusive os Admin Global
+    if usuario.cidade_id is None:
+        return set()
+    return set(db.session.execute(
+        select(Usuario.id).where(Usuario.cidade_id == usuario.cidade_id)
+    ).scalars())
+
+
+def ler_filtros_auditoria(args, usuario):
+    """
+    Filtros da consulta de auditoria (listagem e exportação), já restritos
+    aos usuários que o usuário autenticado pode ver.
+
+    Args:
+        args: Query string da requisição
+        usuario: Usuário autenticado (`usuario_atual()`)
+
+    Returns:
+        dict: tabela, acao, registro_id, usuarios_ids (None = todos),
+            data_inicio e data_fim (exclusiva: o dia informado é incluído)
+
+    Raises:
+        ValueError: Parâmetro inválido
+        PermissionError: usuario_id fora do escopo do usuário
+    """
+    data_fim = ler_data(args.get('data_fim'), 'data_fim')
+    filtros = {
+        'tabela': args.get('tabela') or None,
+        'acao': args.get('acao') or None,
+        'registro_id': int(args['registro_id']) if args.get('registro_id') else None,
+        'usuarios_ids': usuarios_visiveis(usuario),
+        'data_inicio': ler_data(args.get('data_inicio'), 'data_inicio'),
+        # data_fim inclui o dia inteiro
+        'data_fim': data_fim + timedelta(days=1) if data_fim else None
+    }
+
+    if args.get('usuario_id'):
+        usuario_id = int(args['usuario_id'])
+        if filtros['usuarios_ids'] is not None and usuario_id not in filtros['usuarios_ids']:
+            raise PermissionError('Permissão negada')
+        filtros['usuarios_ids'] = {usuario_id}
+
+    return filtros
+
+
+def condicoes_auditoria(filtros):
+    """Condições WHERE sobre a tabela auditoria para os filtros de `ler_filtros_auditoria`."""
+    condicoes = []
+    if filtros['usuarios_ids'] is not None:
+        condicoes.append(Auditoria.usuario_id.in_(sorted(filtros['usuarios_ids'])))
+    if filtros['tabela']:
+        condicoes.append(Auditoria.tabela == filtros['tabela'])
+    if filtros['acao']:
+        condicoes.append(Auditoria.acao == filtros['acao'])
+    if filtros['registro_id'] is not None:
+        condicoes.append(Auditoria.registro_id == filtros['registro_id'])
+    if filtros['data_inicio']:
+        condicoes.append(Auditoria.data_hora >= filtros['data_inicio'])
+    if filtros['data_fim']:
+        condicoes.append(Auditoria.data_hora < filtros['data_fim'])
+    return condicoes
+
+
+def consultar_arquivados(filtros, antes_de=None):
+    """Registros arquivados do intervalo pedido, ou None se o intervalo não cobre meses arquivados."""
+    if not (filtros['data_inicio'] or filtros['data_fim']):
+        return None
+    if not meses_no_intervalo(filtros['data_inicio'], filtros['data_fim']):
+        return None
+    return consultar_arquivo(
+        filtros['data_inicio'], filtros['data_fim'], filtros['tabela'], filtros['acao'],
+        filtros['usuarios_ids'], antes_de, filtros['registro_id']
+    )
+
+
+def _texto_json(texto):
+    # Os dados são lidos como texto, sem decodificar o JSON; só os gravados
+    # compactados precisam ser abertos
+    if texto and texto.startswith(_MARCA_COMPACTADO):
+        return zlib.decompress(base64.b64decode(json.loads(texto)['_zlib'])).decode('utf-8')
+    return texto
+
+
+def _abrir_compactados(lote):
+    return [
+        linha if not (linha[8] and linha[8].startswith(_MARCA_COMPACTADO)
+                      or linha[9] and linha[9].startswith(_MARCA_COMPACTADO))
+        else (*linha[:8], _texto_json(linha[8]), _texto_json(linha[9]), linha[10])
+        for linha in lote
+    ]
+
+
+def _em_lotes(linhas, tamanho):
+    linhas = iter(linhas)
+    while True:
+        lote = list(islice(linhas, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def exportar_auditoria(filtros):
+    """
+    Registros de auditoria para exportação, do mais recente ao mais antigo,
+    lidos do banco com cursor no servidor em lotes de LOTE_EXPORTACAO.
+
+    dados_antigos/dados_novos saem como gravados (JSON das diferenças, com
+    o estado completo nos snapshots). Se o intervalo de datas cobre meses
+    arquivados, os registros do arquivo são intercalados na mesma ordem.
+
+    Returns:
+        tuple: (nomes das colunas, iterável de lotes de linhas)
+    """
+    consulta = select(
+        Auditoria.id,
+        Auditoria.data_hora,
+        Auditoria.usuario_id,
+        Usuario.email.label('usuario_email'),
+        Auditoria.acao,
+        Auditoria.tabela,
+        Auditoria.registro_id,
+        Auditoria.snapshot,
+        type_coerce(Auditoria.dados_antigos, Text).label('dados_antigos'),
+        type_coerce(Auditoria.dados_novos, Text).label('dados_novos'),
+        Auditoria.ip_origem
+    ).select_from(Auditoria)\
+     .outerjoin(Usuario, Usuario.id == Auditoria.usuario_id)\
+     .where(*condicoes_auditoria(filtros))\
+     .order_by(Auditoria.data_hora.desc(), Auditoria.id.desc())
+
+    resultado = db.session.execute(consulta.execution_options(yield_per=LOTE_EXPORTACAO))
+    colunas = list(resultado.keys())
+    lotes = (_abrir_compactados(lote) for lote in resultado.partitions())
+
+    arquivados = consultar_arquivados(filtros)
+    if arquivados is None:
+        return colunas, lotes
+
+    emails = dict(db.session.execute(select(Usuario.id, Usuario.email)).all())
+    linhas_arquivadas = (
+        (registro['id'], datetime.fromisoformat(registro['data_hora']), registro['usuario_id'],
+         emails.get(registro['usuario_id']), registro['acao'], registro['tabela'], registro['registro_id'],
+         registro.get('snapshot'),
+         None if registro['dados_antigos'] is None else json.dumps(registro['dados_antigos']),
+         None if registro['dados_novos'] is None else json.dumps(registro['dados_novos']),
+         registro['ip_origem'])
+        for registro in arquivados
+    )
+    linhas = heapq.merge(
+        chain.from_iterable(lotes), linhas_arquivadas, key=lambda linha: (linha[1], linha[0]), reverse=True
+    )
+    return colunas, _em_lotes(linhas, LOTE_EXPORTACAO)
@@ -0,0 +1,217 @@
+import logging
+import threading
+from collections import Counter
+from flask import current_app
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.dialects import mysql, sqlite
+from src.models.database import db, Cidade, Equipamento, Profissional, ProfissionalContagem, VersaoDados
+from src.utils.versoes import ler_versoes
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_CONTAGEM = ('cidade_id', 'equipamento_id', 'profissao', 'ativo')
+
+# Versão de 'profissionais' refletida nas contagens. Cada escrita mantida
+# incrementa as duas; se 'profissionais' avançar sozinho (escrita que não
+# passou por ajustar_contagens), as contagens estão desatualizadas
+ESCOPO_CONTAGEM = 'contagem:profissionais'
+
+# Profissões listadas nas estatísticas
+LIMITE_PROFISSOES = 10
+
+# Uma reconstrução em segundo plano por vez neste processo
+_revalidando = threading.Lock()
+
+
+def chave_contagem(dados):
+    """Grupo de contagem de um profissional (instância ou dict com CAMPOS_CONTAGEM)."""
+    valor = dados.get if isinstance(dados, dict) else lambda campo: getattr(dados, campo)
+    return (valor('cidade_id'), valor('equipamento_id'), valor('profissao'), bool(valor('ativo')))
+
+
+def _somar(deltas):
+    """Soma os deltas às linhas de contagem (upsert), na transação atual."""
+    tabela = ProfissionalContagem.__table__
+    dialeto = db.session.get_bind().dialect.name
+
+    # Ordem fixa das chaves: transações concorrentes travam as linhas na
+    # mesma sequência e não entram em deadlock
+    linhas = [dict(zip(CAMPOS_CONTAGEM, chave), total=total) for chave, total in sorted(deltas.items())]
+    if not linhas:
+        return
+
+    if dialeto == 'sqlite':
+        comando = sqlite.insert(tabela).values(linhas)
+        comando = comando.on_conflict_do_update(
+            index_elements=[tabela.c[coluna] for coluna in CAMPOS_CONTAGEM],
+            set_={'total': tabela.c.total + comando.excluded.total}
+        )
+        db.session.execute(comando)
+    elif dialeto == 'mysql':
+        comando = mysql.insert(tabela).values(linhas)
+        comando = comando.on_duplicate_key_update(total=tabela.c.total + comando.inserted.total)
+        db.session.execute(comando)
+    else:
+        for linha in linhas:
+            resultado = db.session.execute(
+                tabela.update().where(*[tabela.c[coluna] == linha[coluna] for coluna in CAMPOS_CONTAGEM])
+                     .values(total=tabela.c.total + linha['total'])
+            )
+            if not resultado.rowcount:
+                db.session.execute(tabela.insert().values(**linha))
+
+
+def ajustar_contagens(removidas=(), adicionadas=()):
+    """
+    Atualiza as contagens com os profissionais que saíram e entraram em cada
+    grupo. Deve rodar na mesma transação da escrita em profissionais, junto
+    com o `incrementar_versao` dela (uma chamada por escrita).
+
+    Args:
+        removidas: Chaves (`chave_contagem`) dos estados anteriores
+        adicionadas: Chaves dos novos estados
+    """
+    deltas = Counter(adicionadas)
+    deltas.subtract(Counter(removidas))
+    _somar({chave: delta for chave, delta in deltas.items() if delta})
+
+    db.session.execute(
+        update(VersaoDados).where(VersaoDados.escopo == ESCOPO_CONTAGEM).values(versao=VersaoDados.versao + 1)
+    )
+
+
+def situacao_contagens():
+    """
+    Compara a versão das contagens com a de profissionais.
+
+    Returns:
+        str: 'atualizada', 'desatualizada' ou 'ausente' (nunca reconstruída)
+    """
+    versoes = dict(db.session.execute(
+        select(VersaoDados.escopo, VersaoDados.versao)
+        .where(VersaoDados.escopo.in_(['profissionais', ESCOPO_CONTAGEM]))
+    ).all())
+    if ESCOPO_CONTAGEM not in versoes:
+        return 'ausente'
+    return 'atualizada' if versoes[ESCOPO_CONTAGEM] == versoes.get('profissionais', 0) else 'desatualizada'
+
+
+def reconstruir_contagens():
+    """
+    Recalcula as contagens a partir da tabela profissionais.
+
+    A versão é lida antes das contagens: uma escrita concorrente pode entrar
+    na contagem sem entrar na versão, o que só faz a próxima consulta
+    reconstruir de novo.
+
+    Returns:
+        int: Grupos gravados
+    """
+    versao = ler_versoes('profissionais')[0]
+    tabela = ProfissionalContagem.__table__
+
+    db.session.execute(delete(ProfissionalContagem))
+    resultado = db.session.execute(insert(tabela).from_select(
+        [*CAMPOS_CONTAGEM, 'total'],
+        select(*[getattr(Profissional, campo) for campo in CAMPOS_CONTAGEM], func.count())
+        .group_by(*[getattr(Profissional, campo) for campo in CAMPOS_CONTAGEM])
+    ))
+
+    db.session.execute(delete(VersaoDados).where(VersaoDados.escopo == ESCOPO_CONTAGEM))
+    db.session.add(VersaoDados(escopo=ESCOPO_CONTAGEM, versao=versao))
+    db.session.commit()
+
+    return resultado.rowcount
+
+
+def revalidar_em_segundo_plano():
+    """
+    Reconstrói as contagens em uma thread, sem bloquear a requisição.
+
+    Returns:
+        bool: False se já há uma reconstrução em andamento neste processo
+    """
+    if not _revalidando.acquire(blocking=False):
+        return False
+    app = current_app._get_current_object()
+
+    def executar():
+        try:
+            with app.app_context():
+                try:
+                    reconstruir_contagens()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Erro ao reconstruir as contagens de profissionais')
+        finally:
+            _revalidando.release()
+
+    threading.Thread(target=executar, name='revalidar-contagens', daemon=True).start()
+    return True
+
+
+def consultar_estatisticas(cidade_id=None, incluir_cidades=False):
+    """
+    Estatísticas de profissionais lidas das contagens, em O(grupos).
+
+    Args:
+        cidade_id (int): Restringe à cidade (escopo do usuário); None = todas
+        incluir_cidades (bool): Inclui o total por cidade
+
+    Returns:
+        dict: geral, por_equipamento, por_cidade e por_profissao
+    """
+    contagem = ProfissionalContagem
+    filtros = [contagem.cidade_id == cidade_id] if cidade_id else []
+    total = func.sum(contagem.total)
+    ativos = func.sum(case((contagem.ativo == True, contagem.total), else_=0))
+    inativos = func.sum(case((contagem.ativo == False, contagem.total), else_=0))
+
+    total_profissionais, profissionais_ativos = db.session.execute(
+        select(total, ativos).where(*filtros)
+    ).one()
+    total_profissionais = int(total_profissionais or 0)
+    profissionais_ativos = int(profissionais_ativos or 0)
+
+    def por(modelo, coluna):
+        return db.session.execute(
+            select(modelo.nome, total, ativos, inativos)
+            .select_from(contagem)
+            .join(modelo, modelo.id == coluna)
+            .where(*filtros)
+            .group_by(modelo.nome)
+            .having(total > 0)
+            .order_by(modelo.nome)
+        ).all()
+
+    stats_cidades = por(Cidade, contagem.cidade_id) if incluir_cidades else []
+
+    stats_profissoes = db.session.execute(
+        select(contagem.profissao, total)
+        .where(*filtros)
+        .group_by(contagem.profissao)
+        .having(total > 0)
+        .order_by(total.desc(), contagem.profissao)
+        .limit(LIMITE_PROFISSOES)
+    ).all()
+
+    return {
+        'geral': {
+            'total_profissionais': total_profissionais,
+            'profissionais_ativos': profissionais_ativos,
+            'profissionais_inativos': total_profissionais - profissionais_ativos,
+            'taxa_atividade': round((profissionais_ativos / total_profissionais * 100) if total_profissionais > 0 else 0, 2)
+        },
+        'por_equipamento': [
+            {'equipamento': nome, 'total': int(soma), 'ativos': int(soma_ativos or 0), 'inativos': int(soma_inativos or 0)}
+            for nome, soma, soma_ativos, soma_inativos in por(Equipamento, contagem.equipamento_id)
+        ],
+        'por_cidade': [
+            {'cidade': nome, 'total': int(soma), 'ativos': int(soma_ativos or 0), 'inativos': int(soma_inativos or 0)}
+            for nome, soma, soma_ativos, soma_inativos in stats_cidades
+        ],
+        'por_profissao': [
+            {'profissao': profissao, 'total': int(soma)}
+            for profissao, soma in stats_profissoes
+        ]
+    }
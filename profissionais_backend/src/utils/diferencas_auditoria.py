@@ -0,0 +1,230 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, bindparam, case, func, or_, select
+from src.models.database import db, Auditoria
+from src.utils.auditoria import INTERVALO_SNAPSHOT_PADRAO, diferenca
+
+# Registros convertidos por transação em `compactar_auditoria`
+LOTE_PADRAO = 1000
+
+
+def _ancora():
+    # Registros cujo dados_novos é o estado completo; criações anteriores à
+    # codificação por diferença também servem
+    return or_(Auditoria.snapshot == True, and_(Auditoria.snapshot.is_(None), Auditoria.acao == 'CREATE'))
+
+
+def reconstruir_estado(tabela, registro_id, ate=None):
+    """
+    Estado de um registro reconstruído a partir da auditoria.
+
+    Parte do snapshot mais recente anterior à posição pedida e aplica as
+    diferenças gravadas depois dele, em ordem. Como há um snapshot a cada
+    AUDITORIA_INTERVALO_SNAPSHOT alterações, o custo não depende do tamanho
+    do histórico.
+
+    Args:
+        tabela (str): Tabela do registro
+        registro_id (int): ID do registro
+        ate (datetime | tuple): Instante (inclusivo) ou (data_hora, id) da
+            última alteração considerada (padrão: todas)
+
+    Returns:
+        dict: Estado do registro, ou None se não há snapshot até a posição
+            (registro ainda não criado, excluído ou com o início do histórico arquivado)
+    """
+    condicoes = [Auditoria.tabela == tabela, Auditoria.registro_id == registro_id]
+    if isinstance(ate, datetime):
+        condicoes.append(Auditoria.data_hora <= ate)
+    elif ate:
+        data_hora, auditoria_id = ate
+        condicoes.append(and_(Auditoria.data_hora <= data_hora,
+                              or_(Auditoria.data_hora < data_hora, Auditoria.id <= auditoria_id)))
+
+    ancora = db.session.execute(
+        select(Auditoria.data_hora, Auditoria.id, Auditoria.dados_novos)
+        .where(*condicoes, _ancora())
+        .order_by(Auditoria.data_hora.desc(), Auditoria.id.desc())
+        .limit(1)
+    ).first()
+
+    if not ancora:
+        return None
+
+    estado = dict(ancora.dados_novos)
+    for dados_novos in db.session.execute(
+        select(Auditoria.dados_novos)
+        .where(*condicoes, and_(Auditoria.data_hora >= ancora.data_hora,
+                                or_(Auditoria.data_hora > ancora.data_hora, Auditoria.id > ancora.id)))
+        .order_by(Auditoria.data_hora, Auditoria.id)
+    ).scalars():
+        if dados_novos is None:
+            return None
+        estado.update(dados_novos)
+
+    return estado
+
+
+def expandir_registro(registro):
+    """
+    Versão de um registro de auditoria (formato `to_dict()`) com os estados
+    completos antes e depois da alteração em dados_antigos/dados_novos.
+    """
+    if registro['acao'] == 'EXPORT' or registro['dados_antigos'] is None or registro['dados_novos'] is None:
+        return registro
+
+    if registro.get('snapshot'):
+        depois = registro['dados_novos']
+    else:
+        depois = reconstruir_estado(
+            registro['tabela'], registro['registro_id'],
+            (datetime.fromisoformat(registro['data_hora']), registro['id'])
+        )
+        if depois is None:
+            return registro
+
+    return {**registro, 'dados_antigos': {**depois, **registro['dados_antigos']}, 'dados_novos': depois}
+
+
+def campos_alterados(auditoria):
+    """
+    Campos alterados por um registro de auditoria.
+
+    Returns:
+        dict: campo -> {'antes': valor, 'depois': valor}; em criações, 'antes' é None
+    """
+    antigos, novos = auditoria.dados_antigos, auditoria.dados_novos
+    if novos is None:
+        return {}
+    if antigos is None:
+        return {campo: {'antes': None, 'depois': valor} for campo, valor in novos.items()}
+
+    # Snapshots trazem o estado completo em dados_novos; os registros antigos,
+    # os dois estados completos
+    if auditoria.snapshot is None:
+        antigos, novos = diferenca(antigos, novos)
+    return {campo: {'antes': antigos.get(campo), 'depois': novos.get(campo)} for campo in antigos}
+
+
+def tamanho_auditoria():
+    """Bytes ocupados pelos dados (JSON) da auditoria e total de registros por formato."""
+    tamanho = func.coalesce(func.length(Auditoria.dados_antigos), 0) + \
+        func.coalesce(func.length(Auditoria.dados_novos), 0)
+    bytes_total, registros, legados = db.session.execute(select(
+        func.coalesce(func.sum(tamanho), 0),
+        func.count(),
+        func.coalesce(func.sum(case((Auditoria.snapshot.is_(None), 1), else_=0)), 0)
+    )).one()
+    return {'bytes': int(bytes_total), 'registros': registros, 'legados': int(legados)}
+
+
+def _campos_completos():
+    # Campos do estado completo de cada tabela, tirados de uma criação registrada
+    primeiras = select(func.min(Auditoria.id)).where(
+        Auditoria.acao == 'CREATE', Auditoria.dados_novos.is_not(None)
+    ).group_by(Auditoria.tabela)
+    return {
+        tabela: set(dados_novos)
+        for tabela, dados_novos in db.session.execute(
+            select(Auditoria.tabela, Auditoria.dados_novos).where(Auditoria.id.in_(primeiras))
+        )
+    }
+
+
+def _converter_registro(linhas, campos, intervalo):
+    """Codifica por diferença os registros legados (snapshot NULL) do histórico de um registro."""
+    alteradas = []
+    estado = None
+    desde_snapshot = 0
+
+    for linha in linhas:
+        antigos, novos = linha.dados_antigos, linha.dados_novos
+
+        if linha.snapshot is not None:
+            if linha.snapshot:
+                estado, desde_snapshot = dict(novos), 0
+            else:
+                estado = None if estado is None or novos is None else {**estado, **novos}
+                desde_snapshot += 1
+            continue
+
+        if antigos is None or novos is None:
+            snapshot = novos is not None
+            estado = dict(novos) if snapshot else None
+            desde_snapshot = 0 if snapshot else desde_snapshot + 1
+            alteradas.append({'_id': linha.id, '_antigos': antigos, '_novos': novos, '_snapshot': snapshot})
+            continue
+
+        # Registros legados de PUT trazem o estado completo; os de PATCH e das
+        # operações em massa, só os campos alterados
+        if campos is not None and campos <= set(novos):
+            depois = dict(novos)
+        else:
+            depois = None if estado is None else {**estado, **novos}
+
+        delta_antigos, delta_novos = diferenca(antigos, novos)
+        if depois is not None and (estado is None or desde_snapshot >= intervalo - 1):
+            alteradas.append({'_id': linha.id, '_antigos': delta_antigos, '_novos': depois, '_snapshot': True})
+            desde_snapshot = 0
+        else:
+            alteradas.append({'_id': linha.id, '_antigos': delta_antigos, '_novos': delta_novos, '_snapshot': False})
+            desde_snapshot += 1
+        estado = depois
+
+    return alteradas
+
+
+def compactar_auditoria(lote=LOTE_PADRAO):
+    """
+    Converte os registros de auditoria gravados com os estados completos
+    (anteriores à codificação por diferença) para o formato atual.
+
+    O histórico de cada registro é percorrido em ordem: os dados passam a
+    guardar só os campos alterados, com o estado completo a cada
+    AUDITORIA_INTERVALO_SNAPSHOT alterações. Com AUDITORIA_COMPRESSAO_BYTES
+    configurado, os dados grandes também são compactados. Pode ser
+    interrompido e executado de novo.
+
+    Args:
+        lote (int): Registros de auditoria convertidos por transação
+
+    Returns:
+        dict: Registros convertidos e bytes ocupados antes e depois
+    """
+    intervalo = current_app.config.get('AUDITORIA_INTERVALO_SNAPSHOT', INTERVALO_SNAPSHOT_PADRAO)
+    antes = tamanho_auditoria()
+    campos = _campos_completos()
+
+    tabela = Auditoria.__table__
+    atualizar = tabela.update().where(tabela.c.id == bindparam('_id')).values(
+        dados_antigos=bindparam('_antigos', type_=tabela.c.dados_antigos.type),
+        dados_novos=bindparam('_novos', type_=tabela.c.dados_novos.type),
+        snapshot=bindparam('_snapshot')
+    )
+
+    registros = db.session.execute(
+        select(Auditoria.tabela, Auditoria.registro_id).where(Auditoria.snapshot.is_(None)).distinct()
+    ).all()
+
+    convertidos = 0
+    pendentes = []
+    for tabela_nome, registro_id in registros:
+        linhas = db.session.execute(
+            select(Auditoria.id, Auditoria.acao, Auditoria.dados_antigos, Auditoria.dados_novos, Auditoria.snapshot)
+            .where(Auditoria.tabela == tabela_nome, Auditoria.registro_id == registro_id)
+            .order_by(Auditoria.data_hora, Auditoria.id)
+        ).all()
+        pendentes.extend(_converter_registro(linhas, campos.get(tabela_nome), intervalo))
+
+        if len(pendentes) >= lote:
+            db.session.execute(atualizar, pendentes)
+            db.session.commit()
+            convertidos += len(pendentes)
+            pendentes = []
+
+    if pendentes:
+        db.session.execute(atualizar, pendentes)
+        db.session.commit()
+        convertidos += len(pendentes)
+
+    return {'convertidos': convertidos, 'bytes_antes': antes['bytes'], 'bytes_depois': tamanho_auditoria()['bytes']}
@@ -0,0 +1,252 @@
+import csv
+import io
+from datetime import date, datetime
+from openpyxl import load_workbook
+from sqlalchemy import select
+from src.models.database import db, Profissional, ProfissionalBusca, Cidade, Equipamento
+from src.utils.auditoria import registrar_auditoria_em_lote
+from src.utils.busca import tokens_profissional
+from src.utils.versoes import incrementar_versao, escopos_profissionais
+from src.utils.contagem_profissionais import ajustar_contagens, chave_contagem
+
+# Linhas por INSERT e por consulta IN
+TAMANHO_LOTE = 500
+
+CAMPOS_OBRIGATORIOS = (
+    'equipamento_id', 'nome_completo', 'data_nascimento', 'cpf', 'rg', 'data_expedicao_rg',
+    'escolaridade', 'profissao', 'cargo', 'vinculo_institucional', 'telefone', 'email',
+    'data_inicio_trabalho', 'endereco_residencial', 'cidade_id'
+)
+CAMPOS_DATA = ('data_nascimento', 'data_expedicao_rg', 'data_inicio_trabalho')
+CAMPOS_INTEIROS = ('equipamento_id', 'cidade_id')
+CAMPOS_UNICOS = ('cpf', 'rg', 'email')
+
+# Mesmas mensagens de criar_profissional
+MENSAGENS_DUPLICIDADE = {
+    'cpf': 'CPF já cadastrado',
+    'rg': 'RG já cadastrado',
+    'email': 'Email já cadastrado'
+}
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def converter_data(valor):
+    """Aceita date/datetime (XLSX), 'AAAA-MM-DD' ou 'DD/MM/AAAA'."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+
+    texto = _texto(valor)
+    if '/' in texto:
+        dia, mes, ano = texto.split('/')
+        return date(int(ano), int(mes), int(dia))
+    return date.fromisoformat(texto)
+
+
+def ler_linhas(arquivo):
+    """
+    Lê um arquivo CSV ou XLSX enviado no formulário.
+
+    O XLSX é aberto em modo somente leitura (streaming). A primeira linha deve
+    conter os nomes dos campos do profissional.
+
+    Yields:
+        tuple: (número da linha no arquivo, dict campo -> valor)
+    """
+    nome = (arquivo.filename or '').lower()
+
+    if nome.endswith('.xlsx'):
+        planilha = load_workbook(arquivo.stream, read_only=True, data_only=True)
+        try:
+            linhas = planilha.active.iter_rows(values_only=True)
+            cabecalho = [_texto(coluna) for coluna in next(linhas, ())]
+            for numero, valores in enumerate(linhas, 2):
+                if any(valor is not None for valor in valores):
+                    yield numero, dict(zip(cabecalho, valores))
+        finally:
+            planilha.close()
+
+    elif nome.endswith('.csv'):
+        texto = io.TextIOWrapper(arquivo.stream, encoding='utf-8-sig', newline='')
+        primeira = texto.readline()
+        delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+        cabecalho = [coluna.strip() for coluna in next(csv.reader([primeira], delimiter=delimitador))]
+        for numero, valores in enumerate(csv.reader(texto, delimiter=delimitador), 2):
+            if any(valor.strip() for valor in valores):
+                yield numero, dict(zip(cabecalho, valores))
+
+    else:
+        raise ValueError('Formato de arquivo não suportado. Use CSV ou XLSX')
+
+
+def validar_linha(dados, usuario):
+    """
+    Converte e valida uma linha isoladamente (sem consultar o banco).
+
+    Returns:
+        tuple: (dict pronto para inserção ou None, lista de erros)
+    """
+    erros = []
+    linha = {}
+
+    for campo in CAMPOS_OBRIGATORIOS:
+        valor = dados.get(campo)
+        if campo == 'cidade_id' and _texto(valor) == '' and usuario.nivel_acesso < 4:
+            valor = usuario.cidade_id
+
+        if _texto(valor) == '':
+            erros.append(f'{campo} é obrigatório')
+            continue
+
+        try:
+            if campo in CAMPOS_DATA:
+                linha[campo] = converter_data(valor)
+            elif campo in CAMPOS_INTEIROS:
+                linha[campo] = int(_texto(valor))
+            else:
+                linha[campo] = _texto(valor)
+        except (TypeError, ValueError):
+            erros.append(f'{campo} inválido: {_texto(valor)}')
+
+    # Editor e Admin Cidade só importam para a própria cidade
+    if usuario.nivel_acesso < 4 and 'cidade_id' in linha and linha['cidade_id'] != usuario.cidade_id:
+        erros.append('Permissão negada para a cidade informada')
+
+    return (None if erros else linha), erros
+
+
+def _existentes(coluna, valores):
+    """Valores de `coluna` que já existem, consultados em lotes com IN."""
+    valores = list(valores)
+    encontrados = set()
+    for inicio in range(0, len(valores), TAMANHO_LOTE):
+        lote = valores[inicio:inicio + TAMANHO_LOTE]
+        encontrados.update(db.session.execute(select(coluna).where(coluna.in_(lote))).scalars())
+    return encontrados
+
+
+def _inserir_lote(linhas, usuario_id, ip_origem):
+    """Insere um lote de profissionais com índice de busca e auditoria."""
+    tabela = Profissional.__table__
+    agora = datetime.utcnow()
+    # versao explícita: a auditoria de criação é montada de um objeto
+    # transiente, em que o default da coluna ainda não foi aplicado
+    for linha in linhas:
+        linha.update(data_cadastro=agora, ativo=True, versao=1)
+
+    db.session.execute(tabela.insert(), linhas)
+
+    # executemany não retorna ids de forma portável: recuperar pelo CPF (único)
+    ids = dict(db.session.execute(
+        select(Profissional.cpf, Profissional.id).where(Profissional.cpf.in_([l['cpf'] for l in linhas]))
+    ).all())
+
+    tokens = []
+    auditorias = []
+    for linha in linhas:
+        profissional = Profissional(id=ids[linha['cpf']], motivo_inativacao=None, data_inativacao=None, **linha)
+        for token in tokens_profissional(profissional):
+            token['profissional_id'] = profissional.id
+            tokens.append(token)
+        auditorias.append((profissional.id, None, profissional.to_dict()))
+
+    if tokens:
+        db.session.execute(ProfissionalBusca.__table__.insert(), tokens)
+
+    registrar_auditoria_em_lote(usuario_id, 'CREATE', 'profissionais', auditorias, ip_origem)
+    incrementar_versao(*escopos_profissionais(*sorted({l['cidade_id'] for l in linhas})))
+    ajustar_contagens(adicionadas=[chave_contagem(linha) for linha in linhas])
+
+
+def importar_profissionais(arquivo, usuario, ip_origem=None, dry_run=False, parcial=False):
+    """
+    Importa profissionais de um arquivo CSV/XLSX em lotes.
+
+    Todas as verificações de unicidade (CPF, RG, email) e de existência de
+    cidade/equipamento são feitas com consultas IN sobre o arquivo inteiro,
+    antes de qualquer inserção.
+
+    Args:
+        arquivo: Arquivo recebido em request.files
+        usuario: Usuario que está importando (define a cidade permitida)
+        ip_origem (str): IP de origem da requisição
+        dry_run (bool): Apenas valida, sem gravar nada
+        parcial (bool): Grava as linhas válidas mesmo que outras tenham erro,
+            com um commit por lote. Sem ele, a importação é tudo ou nada.
+
+    Returns:
+        dict: Relatório com totais e erros por linha
+    """
+    validas = []
+    erros = {}
+    vistos = {campo: {} for campo in CAMPOS_UNICOS}
+    total_linhas = 0
+
+    for numero, dados in ler_linhas(arquivo):
+        total_linhas += 1
+        linha, erros_linha = validar_linha(dados, usuario)
+
+        # Duplicidade dentro do próprio arquivo
+        if linha:
+            for campo in CAMPOS_UNICOS:
+                anterior = vistos[campo].setdefault(linha[campo], numero)
+                if anterior != numero:
+                    erros_linha.append(f'{campo} repetido na linha {anterior}')
+
+        if erros_linha:
+            erros[numero] = erros_linha
+        else:
+            validas.append((numero, linha))
+
+    # Unicidade no banco e existência das referências, em conjunto
+    for campo in CAMPOS_UNICOS:
+        existentes = _existentes(getattr(Profissional, campo), {linha[campo] for _, linha in validas})
+        for numero, linha in validas:
+            if linha[campo] in existentes:
+                erros.setdefault(numero, []).append(MENSAGENS_DUPLICIDADE[campo])
+
+    cidades = _existentes(Cidade.id, {linha['cidade_id'] for _, linha in validas})
+    equipamentos = _existentes(Equipamento.id, {linha['equipamento_id'] for _, linha in validas})
+    for numero, linha in validas:
+        if linha['cidade_id'] not in cidades:
+            erros.setdefault(numero, []).append('Cidade não encontrada')
+        if linha['equipamento_id'] not in equipamentos:
+            erros.setdefault(numero, []).append('Equipamento não encontrado')
+
+    validas = [(numero, linha) for numero, linha in validas if numero not in erros]
+
+    importados = 0
+    if not dry_run and (parcial or not erros):
+        for inicio in range(0, len(validas), TAMANHO_LOTE):
+            lote = validas[inicio:inicio + TAMANHO_LOTE]
+            try:
+                _inserir_lote([linha for _, linha in lote], usuario.id, ip_origem)
+                if parcial:
+                    db.session.commit()
+                importados += len(lote)
+            except Exception as e:
+                db.session.rollback()
+                if not parcial:
+                    raise
+                for numero, _ in lote:
+                    erros.setdefault(numero, []).append(f'Erro ao gravar o lote: {str(e)}')
+
+        if not parcial:
+            db.session.commit()
+
+    return {
+        'total_linhas': total_linhas,
+        'validas': len(validas),
+        'importados': importados,
+        'dry_run': dry_run,
+        'parcial': parcial,
+        'erros': [{'linha': numero, 'erros': erros[numero]} for numero in sorted(erros)]
+    }
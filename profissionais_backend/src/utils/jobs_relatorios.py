@@ -0,0 +1,355 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import Flask, current_app
+from sqlalchemy import select, update
+from src.models.database import db, RelatorioJob
+from src.utils.cache_relatorios import cache_relatorios, chave_cache
+from src.utils.relatorios import contar_profissionais, gerar_pdf, gerar_excel
+
+logger = logging.getLogger(__name__)
+
+# Processos que geram relatórios; a renderização é CPU-bound e presa ao GIL
+WORKERS_PADRAO = min(2, os.cpu_count() or 1)
+
+# Jobs pendentes ou em execução por usuário
+JOBS_POR_USUARIO_PADRAO = 2
+
+# Horas que o arquivo de um job concluído fica disponível para download
+RETENCAO_HORAS_PADRAO = 24
+
+FORMATOS = {
+    'pdf': ('pdf', 'application/pdf', gerar_pdf),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', gerar_excel),
+}
+
+EM_ANDAMENTO = ('pendente', 'executando')
+
+# Configurações repassadas aos processos do pool
+_CONFIG_PROCESSO = ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ENGINE_OPTIONS', 'RELATORIO_SPOOL_BYTES')
+
+
+class LimiteJobsExcedido(Exception):
+    """O usuário já tem o máximo de relatórios em andamento."""
+
+
+class _JobCancelado(Exception):
+    pass
+
+
+def diretorio_relatorios():
+    diretorio = current_app.config.get('RELATORIO_DIR') or \
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'relatorios')
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def _executar_job(job_id, config, diretorio):
+    """
+    Gera o arquivo de um job. Roda em um processo do pool, com um app
+    próprio e a sua conexão com o banco.
+
+    O job só é executado se ainda estiver pendente (a mudança para
+    'executando' é condicional), então enviá-lo mais de uma vez ao pool não
+    gera o relatório duas vezes. O cancelamento é conferido a cada lote escrito.
+    """
+    app = Flask(__name__)
+    app.config.update(config)
+    db.init_app(app)
+
+    with app.app_context():
+        iniciado = db.session.execute(
+            update(RelatorioJob)
+            .where(RelatorioJob.id == job_id, RelatorioJob.status == 'pendente')
+            .values(status='executando', data_inicio=datetime.utcnow())
+        )
+        db.session.commit()
+        if not iniciado.rowcount:
+            return
+
+        job = db.session.get(RelatorioJob, job_id)
+        formato, filtros = job.formato, job.filtros
+        extensao, _, gerar = FORMATOS[formato]
+        arquivo = f'{job_id}.{extensao}'
+        parcial = os.path.join(diretorio, arquivo + '.parcial')
+
+        def progresso(linhas):
+            atualizado = db.session.execute(
+                update(RelatorioJob)
+                .where(RelatorioJob.id == job_id, RelatorioJob.status == 'executando')
+                .values(linhas_processadas=linhas)
+            )
+            db.session.commit()
+            if not atualizado.rowcount:
+                raise _JobCancelado()
+
+        try:
+            db.session.execute(
+                update(RelatorioJob).where(RelatorioJob.id == job_id)
+                .values(total_linhas=contar_profissionais(filtros))
+            )
+            db.session.commit()
+
+            with open(parcial, 'wb') as destino:
+                gerar(filtros, destino, progresso)
+            os.replace(parcial, os.path.join(diretorio, arquivo))
+
+            concluido = db.session.execute(
+                update(RelatorioJob)
+                .where(RelatorioJob.id == job_id, RelatorioJob.status == 'executando')
+                .values(status='concluido', arquivo=arquivo, data_conclusao=datetime.utcnow(),
+                        expira_em=datetime.utcnow() + timedelta(hours=config['RELATORIO_RETENCAO_HORAS']))
+            )
+            db.session.commit()
+            if not concluido.rowcount:
+                _remover(os.path.join(diretorio, arquivo))
+
+        except _JobCancelado:
+            db.session.rollback()
+            _remover(parcial)
+
+        except Exception as e:
+            db.session.rollback()
+            _remover(parcial)
+            logger.exception('Erro ao gerar o relatório do job %s', job_id)
+            db.session.execute(
+                update(RelatorioJob)
+                .where(RelatorioJob.id == job_id, RelatorioJob.status == 'executando')
+                .values(status='erro', erro=str(e), data_conclusao=datetime.utcnow(),
+                        expira_em=datetime.utcnow() + timedelta(hours=config['RELATORIO_RETENCAO_HORAS']))
+            )
+            db.session.commit()
+
+
+class _PoolRelatorios:
+    """
+    Pool limitado de processos que geram os relatórios dos jobs.
+
+    A fila é a própria tabela relatorio_jobs: o pool recebe só o id do job e
+    o processo lê o resto do banco. Na primeira utilização, os jobs que
+    ficaram pendentes (reinício do servidor) são enviados de novo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._app = None
+        self._futuros = {}
+
+    def _config(self):
+        config = {chave: self._app.config[chave] for chave in _CONFIG_PROCESSO if chave in self._app.config}
+        config['RELATORIO_RETENCAO_HORAS'] = self._app.config.get('RELATORIO_RETENCAO_HORAS', RETENCAO_HORAS_PADRAO)
+        return config
+
+    def _iniciar(self):
+        with self._lock:
+            if self._executor is not None:
+                return False
+            self._app = current_app._get_current_object()
+            # spawn: os processos não herdam conexões nem threads do servidor
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._app.config.get('RELATORIO_WORKERS', WORKERS_PADRAO),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            atexit.register(self.encerrar)
+            return True
+
+    def enviar(self, job_id, chave=None):
+        """
+        Envia o job ao pool. Com `chave`, o arquivo gerado é guardado no cache
+        de relatórios quando o job termina.
+        """
+        if self._executor is None and self._iniciar():
+            pendentes = db.session.execute(
+                select(RelatorioJob.id).where(RelatorioJob.status == 'pendente', RelatorioJob.id != job_id)
+                .order_by(RelatorioJob.data_criacao)
+            ).scalars().all()
+            for pendente in pendentes:
+                self._submeter(pendente)
+        self._submeter(job_id, chave)
+
+    def _submeter(self, job_id, chave=None):
+        try:
+            futuro = self._executor.submit(_executar_job, job_id, self._config(), diretorio_relatorios())
+        except BrokenProcessPool:
+            # Um processo morreu (ex.: falta de memória); o pool é recriado
+            logger.warning('Pool de relatórios quebrado, recriando')
+            self.encerrar()
+            self._iniciar()
+            futuro = self._executor.submit(_executar_job, job_id, self._config(), diretorio_relatorios())
+
+        with self._lock:
+            self._futuros[job_id] = futuro
+        futuro.add_done_callback(lambda futuro: self._finalizado(job_id, chave, futuro))
+
+    def _finalizado(self, job_id, chave, futuro):
+        with self._lock:
+            self._futuros.pop(job_id, None)
+        if futuro.cancelled():
+            return
+        if futuro.exception() is None:
+            if chave:
+                self._guardar_no_cache(job_id, chave)
+            return
+
+        # O processo morreu antes de registrar o resultado
+        logger.error('Falha no processo do job %s: %s', job_id, futuro.exception())
+        with self._app.app_context():
+            db.session.execute(
+                update(RelatorioJob)
+                .where(RelatorioJob.id == job_id, RelatorioJob.status.in_(EM_ANDAMENTO))
+                .values(status='erro', erro='Falha no processo de geração do relatório',
+                        data_conclusao=datetime.utcnow(), expira_em=datetime.utcnow())
+            )
+            db.session.commit()
+
+    def _guardar_no_cache(self, job_id, chave):
+        with self._app.app_context():
+            job = db.session.get(RelatorioJob, job_id)
+            caminho = caminho_arquivo(job) if job else None
+            if caminho:
+                try:
+                    cache_relatorios.guardar(chave, FORMATOS[job.formato][0], caminho)
+                except OSError:
+                    logger.exception('Erro ao guardar no cache o relatório do job %s', job_id)
+
+    def cancelar(self, job_id):
+        """Retira o job da fila do pool, se ele ainda não começou neste processo."""
+        with self._lock:
+            futuro = self._futuros.get(job_id)
+        if futuro is not None:
+            futuro.cancel()
+
+    def encerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+pool_relatorios = _PoolRelatorios()
+
+
+def criar_job(usuario_id, formato, filtros):
+    """
+    Registra um job de relatório e o envia ao pool. Se o mesmo relatório
+    (filtros, escopo e versão dos dados) está no cache, o job já é criado
+    concluído, com uma cópia do arquivo guardado.
+
+    Args:
+        usuario_id (int): Dono do job
+        formato (str): 'pdf' ou 'excel'
+        filtros (dict): Resultado de `ler_filtros` (já com o escopo do usuário)
+
+    Returns:
+        RelatorioJob: Job criado, pendente ou já concluído
+
+    Raises:
+        ValueError: Formato desconhecido
+        LimiteJobsExcedido: O usuário já tem RELATORIO_JOBS_POR_USUARIO jobs em andamento
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: use {', '.join(FORMATOS)}")
+
+    limite = current_app.config.get('RELATORIO_JOBS_POR_USUARIO', JOBS_POR_USUARIO_PADRAO)
+    em_andamento = RelatorioJob.query.filter(
+        RelatorioJob.usuario_id == usuario_id, RelatorioJob.status.in_(EM_ANDAMENTO)
+    ).count()
+    if em_andamento >= limite:
+        raise LimiteJobsExcedido(f'Limite de {limite} relatórios em andamento atingido; aguarde ou cancele um deles')
+
+    job = RelatorioJob(id=str(uuid.uuid4()), usuario_id=usuario_id, formato=formato, filtros=filtros)
+    extensao = FORMATOS[formato][0]
+    chave = chave_cache(formato, filtros)
+
+    arquivo = f'{job.id}.{extensao}'
+    if cache_relatorios.copiar(chave, extensao, os.path.join(diretorio_relatorios(), arquivo)):
+        agora = datetime.utcnow()
+        job.status = 'concluido'
+        job.arquivo = arquivo
+        job.data_inicio = job.data_conclusao = agora
+        job.expira_em = agora + timedelta(
+            hours=current_app.config.get('RELATORIO_RETENCAO_HORAS', RETENCAO_HORAS_PADRAO)
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    db.session.add(job)
+    db.session.commit()
+
+    pool_relatorios.enviar(job.id, chave)
+    return job
+
+
+def cancelar_job(job):
+    """
+    Cancela um job pendente ou em execução. Um job em execução para no
+    próximo lote escrito.
+
+    Returns:
+        bool: False se o job já tinha terminado
+    """
+    cancelado = db.session.execute(
+        update(RelatorioJob)
+        .where(RelatorioJob.id == job.id, RelatorioJob.status.in_(EM_ANDAMENTO))
+        .values(status='cancelado', data_conclusao=datetime.utcnow(), expira_em=datetime.utcnow() + timedelta(
+            hours=current_app.config.get('RELATORIO_RETENCAO_HORAS', RETENCAO_HORAS_PADRAO)
+        ))
+    )
+    db.session.commit()
+    if not cancelado.rowcount:
+        return False
+
+    pool_relatorios.cancelar(job.id)
+    return True
+
+
+def caminho_arquivo(job):
+    """Caminho do arquivo de um job concluído, ou None se expirou ou foi removido."""
+    if job.status != 'concluido' or not job.arquivo or (job.expira_em and job.expira_em < datetime.utcnow()):
+        return None
+    caminho = os.path.join(diretorio_relatorios(), job.arquivo)
+    return caminho if os.path.exists(caminho) else None
+
+
+def limpar_jobs_expirados():
+    """
+    Remove os jobs expirados e os seus arquivos. Jobs parados em
+    'executando' por mais que a retenção (processo interrompido) são
+    marcados como erro.
+
+    Returns:
+        int: Jobs removidos
+    """
+    agora = datetime.utcnow()
+    retencao = timedelta(hours=current_app.config.get('RELATORIO_RETENCAO_HORAS', RETENCAO_HORAS_PADRAO))
+
+    db.session.execute(
+        update(RelatorioJob)
+        .where(RelatorioJob.status == 'executando', RelatorioJob.data_inicio < agora - retencao)
+        .values(status='erro', erro='Geração interrompida', data_conclusao=agora, expira_em=agora)
+    )
+
+    expirados = RelatorioJob.query.filter(RelatorioJob.expira_em < agora).all()
+    diretorio = diretorio_relatorios()
+    for job in expirados:
+        if job.arquivo:
+            _remover(os.path.join(diretorio, job.arquivo))
+        db.session.delete(job)
+    db.session.commit()
+
+    return len(expirados)
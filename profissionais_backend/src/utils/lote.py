@@ -0,0 +1,149 @@
+from sqlalchemy import select
+from src.models.database import db, Profissional
+from src.utils.auditoria import registrar_auditoria_em_lote, serializar_dados, versao_com_snapshot
+from src.utils.versoes import incrementar_versao, escopos_profissionais
+from src.utils.contagem_profissionais import ajustar_contagens, chave_contagem
+
+# Ids por UPDATE/SELECT com IN
+TAMANHO_LOTE = 500
+
+# Filtros aceitos em {"filtro": {...}}
+CAMPOS_FILTRO = ('cidade_id', 'equipamento_id', 'status')
+
+
+def _em_lotes(valores):
+    for inicio in range(0, len(valores), TAMANHO_LOTE):
+        yield valores[inicio:inicio + TAMANHO_LOTE]
+
+
+def condicoes_selecao(dados, usuario):
+    """
+    Traduz o corpo da requisição em condições WHERE sobre profissionais.
+
+    Aceita uma lista explícita (`ids`) ou um filtro (`filtro` com cidade_id,
+    equipamento_id e/ou status). O escopo de permissão do usuário é sempre
+    aplicado: quem não é Admin Global só alcança a própria cidade.
+
+    Returns:
+        tuple: (lista de condições, lista de ids solicitados ou None)
+    """
+    ids = dados.get('ids')
+    filtro = dados.get('filtro')
+
+    if bool(ids) == bool(filtro):
+        raise ValueError('Informe "ids" ou "filtro"')
+
+    condicoes = []
+    if usuario.nivel_acesso < 4:
+        condicoes.append(Profissional.cidade_id == usuario.cidade_id)
+
+    if ids:
+        ids = sorted({int(registro_id) for registro_id in ids})
+        return condicoes, ids
+
+    desconhecidos = set(filtro) - set(CAMPOS_FILTRO)
+    if desconhecidos:
+        raise ValueError(f"Filtro inválido: {', '.join(sorted(desconhecidos))}")
+
+    if filtro.get('cidade_id'):
+        condicoes.append(Profissional.cidade_id == int(filtro['cidade_id']))
+    if filtro.get('equipamento_id'):
+        condicoes.append(Profissional.equipamento_id == int(filtro['equipamento_id']))
+    if filtro.get('status') == 'ativo':
+        condicoes.append(Profissional.ativo == True)
+    elif filtro.get('status') == 'inativo':
+        condicoes.append(Profissional.ativo == False)
+
+    # Um filtro vazio alcançaria toda a base: exigir ao menos um critério
+    if not any(filtro.get(campo) for campo in ('cidade_id', 'equipamento_id')):
+        raise ValueError('O filtro deve conter cidade_id ou equipamento_id')
+
+    return condicoes, None
+
+
+def selecionar(condicoes, ids, colunas):
+    """
+    Busca os valores atuais das `colunas` dos profissionais selecionados.
+
+    Returns:
+        dict: id -> dict coluna -> valor
+    """
+    consulta_base = select(Profissional.id, *[getattr(Profissional, c) for c in colunas]).where(*condicoes)
+
+    linhas = []
+    if ids is None:
+        linhas = db.session.execute(consulta_base).all()
+    else:
+        for lote in _em_lotes(ids):
+            linhas.extend(db.session.execute(consulta_base.where(Profissional.id.in_(lote))).all())
+
+    return {linha[0]: dict(zip(colunas, linha[1:])) for linha in linhas}
+
+
+def atualizar_em_lote(atuais, valores, acao, usuario_id, ip_origem=None):
+    """
+    Aplica `valores` aos profissionais selecionados com UPDATEs por conjunto
+    de ids e registra a auditoria em um único INSERT, na mesma transação.
+
+    Profissionais cujos campos já têm os valores pedidos são ignorados.
+    Cada alterado ganha uma versão; os que chegam a uma versão de snapshot
+    têm o estado completo relido para a auditoria.
+
+    Args:
+        atuais (dict): Resultado de `selecionar` (id -> valores atuais, com
+            `versao` e os CAMPOS_CONTAGEM)
+        valores (dict): Campos e novos valores
+        acao (str): Ação registrada na auditoria
+        usuario_id (int): Usuário que executou a operação
+        ip_origem (str): IP de origem da requisição
+
+    Returns:
+        list: Ids efetivamente alterados
+    """
+    alterados = sorted(
+        registro_id for registro_id, dados in atuais.items()
+        if any(dados[campo] != valor for campo, valor in valores.items())
+    )
+    if not alterados:
+        return []
+
+    tabela = Profissional.__table__
+    for lote in _em_lotes(alterados):
+        db.session.execute(
+            tabela.update().where(tabela.c.id.in_(lote)).values(versao=tabela.c.versao + 1, **valores)
+        )
+
+    # Estado completo (já com os novos valores) só de quem chega a uma
+    # versão de snapshot
+    completos = {}
+    snapshots = [registro_id for registro_id in alterados if versao_com_snapshot(atuais[registro_id]['versao'] + 1)]
+    for lote in _em_lotes(snapshots):
+        completos.update(
+            (profissional.id, profissional.to_dict())
+            for profissional in db.session.execute(
+                select(Profissional).where(Profissional.id.in_(lote)).execution_options(populate_existing=True)
+            ).scalars()
+        )
+
+    # Os demais guardam apenas os campos alterados pela operação e a versão
+    novos = serializar_dados(valores)
+    registros = []
+    for registro_id in alterados:
+        versao = atuais[registro_id]['versao']
+        antigos = {**serializar_dados({campo: atuais[registro_id][campo] for campo in valores}), 'versao': versao}
+        if registro_id in completos:
+            registros.append((registro_id, {**completos[registro_id], **antigos}, completos[registro_id]))
+        else:
+            registros.append((registro_id, antigos, {**novos, 'versao': versao + 1}))
+    registrar_auditoria_em_lote(usuario_id, acao, 'profissionais', registros, ip_origem)
+
+    cidades = {atuais[registro_id]['cidade_id'] for registro_id in alterados}
+    if 'cidade_id' in valores:
+        cidades.add(valores['cidade_id'])
+    incrementar_versao(*escopos_profissionais(*sorted(cidades)))
+    ajustar_contagens(
+        [chave_contagem(atuais[registro_id]) for registro_id in alterados],
+        [chave_contagem({**atuais[registro_id], **valores}) for registro_id in alterados]
+    )
+
+    return alterados
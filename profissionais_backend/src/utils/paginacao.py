@@ -0,0 +1,195 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_, func, select
+
+# Tamanho máximo de página aceito em qualquer listagem paginada
+LIMITE_MAXIMO = 500
+
+# Acima deste número de linhas a contagem deixa de ser exata
+LIMITE_CONTAGEM_EXATA = 10000
+
+
+def ler_limite(valor, padrao=None):
+    """
+    Converte o parâmetro `limit` da query string, respeitando LIMITE_MAXIMO.
+
+    Args:
+        valor (str): Valor recebido na query string (pode ser None)
+        padrao (int): Valor usado quando o parâmetro não foi informado
+
+    Returns:
+        int: Limite validado, ou `padrao` se nenhum valor foi informado
+    """
+    if valor is None or valor == '':
+        return padrao
+
+    try:
+        limite = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError('Parâmetro limit inválido')
+
+    if limite < 1:
+        raise ValueError('Parâmetro limit deve ser maior que zero')
+
+    return min(limite, LIMITE_MAXIMO)
+
+
+def ler_ordenacao(valor, campos, padrao):
+    """
+    Interpreta o parâmetro `sort` no formato `campo` ou `-campo` (decrescente).
+
+    Args:
+        valor (str): Valor recebido na query string (pode ser None)
+        campos (dict): Mapa nome do campo -> coluna do modelo
+        padrao (str): Ordenação usada quando o parâmetro não foi informado
+
+    Returns:
+        tuple: (nome do campo, descendente)
+    """
+    valor = (valor or padrao).strip()
+    descendente = valor.startswith('-')
+    campo = valor.lstrip('-')
+
+    if campo not in campos:
+        raise ValueError(f"Ordenação inválida. Use: {', '.join(sorted(campos))}")
+
+    return campo, descendente
+
+
+def codificar_cursor(campo, descendente, valor, registro_id):
+    """Gera um cursor opaco a partir da última linha de uma página."""
+    if isinstance(valor, (datetime, date)):
+        valor = valor.isoformat()
+
+    conteudo = json.dumps([campo, descendente, valor, registro_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(conteudo.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, campo, descendente, coluna):
+    """
+    Recupera (valor, id) de um cursor gerado por `codificar_cursor`.
+
+    O cursor só é aceito se tiver sido gerado para a mesma ordenação.
+    """
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        conteudo = base64.urlsafe_b64decode(cursor + preenchimento).decode('utf-8')
+        campo_cursor, descendente_cursor, valor, registro_id = json.loads(conteudo)
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+
+    if campo_cursor != campo or descendente_cursor != descendente:
+        raise ValueError('Cursor não corresponde à ordenação solicitada')
+
+    if valor is not None:
+        tipo = coluna.type.python_type
+        try:
+            if tipo is datetime:
+                valor = datetime.fromisoformat(valor)
+            elif tipo is date:
+                valor = date.fromisoformat(valor)
+        except (TypeError, ValueError):
+            raise ValueError('Cursor inválido')
+
+    return valor, int(registro_id)
+
+
+def aplicar_ordenacao(query, coluna, coluna_id, descendente):
+    """Ordena pela coluna escolhida usando o id como critério de desempate."""
+    if coluna is coluna_id:
+        return query.order_by(coluna_id.desc() if descendente else coluna_id.asc())
+
+    if descendente:
+        return query.order_by(coluna.desc(), coluna_id.desc())
+    return query.order_by(coluna.asc(), coluna_id.asc())
+
+
+def aplicar_cursor(query, coluna, coluna_id, descendente, valor, registro_id):
+    """Restringe a query às linhas posteriores à posição (valor, id) do cursor."""
+    if coluna is coluna_id:
+        return query.filter(coluna_id < registro_id if descendente else coluna_id > registro_id)
+
+    # A primeira condição (só sobre a coluna) permite ao banco iniciar a
+    # leitura do índice já na posição do cursor; o OR sozinho não é usado
+    # como faixa do índice e faria páginas profundas percorrerem as anteriores
+    if descendente:
+        condicao = and_(coluna <= valor, or_(coluna < valor, coluna_id < registro_id))
+    else:
+        condicao = and_(coluna >= valor, or_(coluna > valor, coluna_id > registro_id))
+
+    return query.filter(condicao)
+
+
+def paginar(query, coluna, coluna_id, campo, descendente, limite, cursor=None):
+    """
+    Executa uma página da query usando paginação por cursor (keyset).
+
+    Args:
+        query: Query do SQLAlchemy já filtrada e sem ordenação
+        coluna: Coluna usada na ordenação
+        coluna_id: Coluna de id do modelo, usada como desempate
+        campo (str): Nome público do campo de ordenação (gravado no cursor)
+        descendente (bool): Ordenação decrescente
+        limite (int): Quantidade de linhas da página
+        cursor (str): Cursor recebido do cliente (opcional)
+
+    Returns:
+        tuple: (lista de registros, próximo cursor ou None)
+    """
+    if cursor:
+        valor, registro_id = decodificar_cursor(cursor, campo, descendente, coluna)
+        query = aplicar_cursor(query, coluna, coluna_id, descendente, valor, registro_id)
+
+    query = aplicar_ordenacao(query, coluna, coluna_id, descendente)
+
+    # Busca uma linha a mais para saber se existe próxima página
+    registros = query.limit(limite + 1).all()
+
+    proximo_cursor = None
+    if len(registros) > limite:
+        registros = registros[:limite]
+        ultimo = registros[-1]
+        proximo_cursor = codificar_cursor(
+            campo,
+            descendente,
+            getattr(ultimo, coluna.key),
+            getattr(ultimo, coluna_id.key)
+        )
+
+    return registros, proximo_cursor
+
+
+def contar_total(query, coluna_id):
+    """
+    Conta as linhas da query com custo limitado.
+
+    A contagem percorre no máximo LIMITE_CONTAGEM_EXATA + 1 linhas. Quando o
+    resultado ultrapassa esse limite, o valor retornado é um piso e a
+    contagem é marcada como aproximada.
+
+    Returns:
+        tuple: (total, aproximado)
+    """
+    subquery = query.with_entities(coluna_id).order_by(None)\
+                    .limit(LIMITE_CONTAGEM_EXATA + 1).subquery()
+    total = query.session.execute(select(func.count()).select_from(subquery)).scalar()
+
+    if total > LIMITE_CONTAGEM_EXATA:
+        return LIMITE_CONTAGEM_EXATA, True
+    return total, False
+
+
+def cabecalhos_paginacao(proximo_cursor=None, total=None, aproximado=False):
+    """Monta os cabeçalhos HTTP que acompanham uma página de resultados."""
+    cabecalhos = {}
+
+    if proximo_cursor:
+        cabecalhos['X-Next-Cursor'] = proximo_cursor
+
+    if total is not None:
+        cabecalhos['X-Total-Count'] = str(total)
+        if aproximado:
+            cabecalhos['X-Total-Count-Approximate'] = 'true'
+
+    return cabecalhos
@@ -0,0 +1,477 @@
+import pickle
+import tempfile
+from collections import Counter
+from contextlib import suppress
+from datetime import datetime
+from itertools import groupby, islice
+from operator import itemgetter
+from xml.sax.saxutils import escape
+from flask import current_app
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, CondPageBreak
+from sqlalchemy import func, select
+from src.models.database import db, Profissional, Cidade, Equipamento
+
+# Linhas buscadas do banco por vez; o resultado é lido sob demanda
+LOTE_LEITURA = 1000
+
+# Bytes de um arquivo gerado mantidos em memória antes de passar para disco
+SPOOL_PADRAO = 8 * 1024 * 1024
+
+LARGURA_MAXIMA_EXCEL = 50
+
+# Valores aceitos em `agrupar` e o título de cada grupo no PDF
+AGRUPAMENTOS = {'cidade': 'Cidade', 'equipamento': 'Equipamento'}
+
+# Linhas por tabela do PDF: cada tabela é composta (e quebrada entre
+# páginas) separadamente, o que mantém o custo linear
+LINHAS_POR_TABELA_PDF = 100
+
+# Colunas do PDF e a fração da largura útil da página ocupada por cada uma
+COLUNAS_PDF = [
+    ('Nome', 0.25), ('CPF', 0.15), ('Profissão', 0.16),
+    ('Cargo', 0.16), ('Equipamento', 0.18), ('Status', 0.10)
+]
+
+# Espaço horizontal entre o texto e a borda das células do PDF
+ESPACAMENTO_PDF = 3
+
+ESTILO_TABELA_PDF = TableStyle([
+    # Cabeçalho
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+
+    # Dados
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('LEFTPADDING', (0, 0), (-1, -1), ESPACAMENTO_PDF),
+    ('RIGHTPADDING', (0, 0), (-1, -1), ESPACAMENTO_PDF),
+
+    # Alternating row colors
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+])
+
+ESTILO_SUBTOTAL_PDF = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#dddddd')),
+    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+])
+
+CABECALHOS_EXCEL = [
+    'Nome Completo', 'CPF', 'RG', 'Data Nascimento', 'Escolaridade',
+    'Profissão', 'Cargo', 'Vínculo', 'Telefone', 'Email',
+    'Data Início Trabalho', 'Endereço', 'Cidade', 'Equipamento', 'Status'
+]
+
+
+def ler_filtros(args, usuario):
+    """
+    Normaliza os filtros de um relatório e aplica o escopo do usuário.
+
+    Quem não é Admin Global só alcança a própria cidade, independentemente
+    do cidade_id pedido.
+
+    Args:
+        args: Query string da requisição
+        usuario: Usuário autenticado (`usuario_atual()`)
+
+    Returns:
+        dict: status, cidade_id, equipamento_id, cidade_escopo e agrupar (None quando não aplicável)
+    """
+    # Qualquer status diferente de ativo/inativo inclui todos
+    status = args.get('status', 'ativo')
+    if status not in ('ativo', 'inativo'):
+        status = 'todos'
+
+    try:
+        cidade_id = int(args['cidade_id']) if args.get('cidade_id') else None
+        equipamento_id = int(args['equipamento_id']) if args.get('equipamento_id') else None
+    except ValueError:
+        raise ValueError('Parâmetros cidade_id e equipamento_id devem ser números')
+
+    cidade_escopo = usuario.cidade_id if usuario.nivel_acesso < 4 and usuario.cidade_id else None
+
+    agrupar = args.get('agrupar') or None
+    if agrupar is not None and agrupar not in AGRUPAMENTOS:
+        raise ValueError('Parâmetro agrupar deve ser cidade ou equipamento')
+
+    return {
+        'status': status,
+        'cidade_id': cidade_id,
+        'equipamento_id': equipamento_id,
+        'cidade_escopo': cidade_escopo,
+        'agrupar': agrupar
+    }
+
+
+def _condicoes(filtros):
+    condicoes = []
+    if filtros['cidade_escopo']:
+        condicoes.append(Profissional.cidade_id == filtros['cidade_escopo'])
+    if filtros['status'] == 'ativo':
+        condicoes.append(Profissional.ativo == True)
+    elif filtros['status'] == 'inativo':
+        condicoes.append(Profissional.ativo == False)
+    if filtros['cidade_id']:
+        condicoes.append(Profissional.cidade_id == filtros['cidade_id'])
+    if filtros['equipamento_id']:
+        condicoes.append(Profissional.equipamento_id == filtros['equipamento_id'])
+    return condicoes
+
+
+def contar_profissionais(filtros):
+    """Total de profissionais do relatório (usado no progresso dos jobs)."""
+    return db.session.execute(
+        select(func.count()).select_from(Profissional).where(*_condicoes(filtros))
+    ).scalar()
+
+
+def consultar_profissionais(filtros):
+    """
+    Profissionais do relatório, com os nomes da cidade e do equipamento,
+    em uma única consulta lida em lotes de LOTE_LEITURA linhas.
+
+    As linhas são tuplas do SQLAlchemy (acesso por posição ou por nome:
+    nome_completo, cpf, ..., ativo, cidade_id, equipamento_id, cidade_nome,
+    equipamento_nome), sem instâncias do ORM. Com `agrupar`, as linhas de
+    uma mesma cidade/equipamento vêm juntas, na ordem dos nomes.
+
+    Args:
+        filtros (dict): Resultado de `ler_filtros`
+
+    Returns:
+        Result: Iterável de linhas, ordenadas por nome
+    """
+    consulta = select(
+        Profissional.id,
+        Profissional.nome_completo,
+        Profissional.cpf,
+        Profissional.rg,
+        Profissional.data_nascimento,
+        Profissional.escolaridade,
+        Profissional.profissao,
+        Profissional.cargo,
+        Profissional.vinculo_institucional,
+        Profissional.telefone,
+        Profissional.email,
+        Profissional.data_inicio_trabalho,
+        Profissional.endereco_residencial,
+        Profissional.ativo,
+        Profissional.cidade_id,
+        Profissional.equipamento_id,
+        Cidade.nome.label('cidade_nome'),
+        Equipamento.nome.label('equipamento_nome')
+    ).select_from(Profissional)\
+     .outerjoin(Cidade, Cidade.id == Profissional.cidade_id)\
+     .outerjoin(Equipamento, Equipamento.id == Profissional.equipamento_id)\
+     .where(*_condicoes(filtros))
+
+    agrupar = filtros.get('agrupar')
+    if agrupar == 'cidade':
+        consulta = consulta.order_by(Cidade.nome, Profissional.cidade_id)
+    elif agrupar == 'equipamento':
+        consulta = consulta.order_by(Equipamento.nome, Profissional.equipamento_id)
+    consulta = consulta.order_by(Profissional.nome_completo, Profissional.id)
+
+    return db.session.execute(consulta.execution_options(yield_per=LOTE_LEITURA))
+
+
+def nomes_filtros(filtros):
+    """Nomes da cidade e do equipamento filtrados, para o cabeçalho do relatório."""
+    cidade = db.session.get(Cidade, filtros['cidade_id']) if filtros['cidade_id'] else None
+    equipamento = db.session.get(Equipamento, filtros['equipamento_id']) if filtros['equipamento_id'] else None
+    return (
+        cidade.nome if cidade else None,
+        equipamento.nome if equipamento else None
+    )
+
+
+def arquivo_temporario():
+    """Arquivo temporário em memória até RELATORIO_SPOOL_BYTES, depois em disco."""
+    return tempfile.SpooledTemporaryFile(max_size=current_app.config.get('RELATORIO_SPOOL_BYTES', SPOOL_PADRAO))
+
+
+def _valores_excel(prof):
+    return [
+        prof.nome_completo,
+        prof.cpf,
+        prof.rg,
+        prof.data_nascimento.strftime('%d/%m/%Y') if prof.data_nascimento else '',
+        prof.escolaridade,
+        prof.profissao,
+        prof.cargo,
+        prof.vinculo_institucional,
+        prof.telefone,
+        prof.email,
+        prof.data_inicio_trabalho.strftime('%d/%m/%Y') if prof.data_inicio_trabalho else '',
+        prof.endereco_residencial,
+        prof.cidade_nome or 'N/A',
+        prof.equipamento_nome or 'N/A',
+        'Ativo' if prof.ativo else 'Inativo'
+    ]
+
+
+def _acompanhar(linhas, progresso):
+    # Repassa as linhas e informa a quantidade escrita a cada lote. Só é usado
+    # depois de lida a consulta: com o cursor aberto, o SQLite não aceita
+    # gravações de outra conexão e o MySQL não aceita outro comando na mesma
+    escritas = 0
+    for linha in linhas:
+        yield linha
+        escritas += 1
+        if progresso and escritas % LOTE_LEITURA == 0:
+            progresso(escritas)
+    if progresso:
+        progresso(escritas)
+
+
+def _reler(arquivo):
+    while True:
+        try:
+            yield pickle.load(arquivo)
+        except EOFError:
+            return
+
+
+class _DocumentoSobDemanda(SimpleDocTemplate):
+    """
+    SimpleDocTemplate que busca os flowables seguintes em um iterador à
+    medida que as páginas são compostas, em vez de recebê-los todos de uma
+    vez: só a tabela em composição fica em memória.
+    """
+
+    _historia = None
+    _pendentes = iter(())
+
+    def build(self, flowables, pendentes, **kwargs):
+        """Compõe `flowables` e, em seguida, os obtidos de `pendentes`."""
+        self._historia = flowables
+        self._pendentes = pendentes
+        super().build(flowables, **kwargs)
+
+    def filterFlowables(self, flowables):
+        # Também é chamado para listas internas do reportlab (início de
+        # página); só a lista principal é completada
+        if flowables is not self._historia:
+            return
+        # O build termina quando a lista esvazia: mantém pelo menos um
+        # flowable além do que vai ser composto agora
+        while len(flowables) < 2:
+            proximo = next(self._pendentes, None)
+            if proximo is None:
+                return
+            flowables.append(proximo)
+
+
+def _celula_pdf(texto, largura, estilo):
+    # Texto simples quando cabe na coluna; Paragraph (que quebra linhas) só
+    # para os longos, por ser bem mais caro de compor
+    texto = texto or ''
+    if stringWidth(texto, estilo.fontName, estilo.fontSize) <= largura - 2 * ESPACAMENTO_PDF:
+        return texto
+    return Paragraph(escape(texto), estilo)
+
+
+def _secoes_pdf(linhas, larguras, agrupar, subtotais, progresso):
+    # Tabelas de até LINHAS_POR_TABELA_PDF linhas, cada uma com o cabeçalho;
+    # com agrupamento, título e subtotal de cada cidade/equipamento
+    styles = getSampleStyleSheet()
+    estilo_celula = ParagraphStyle('Celula', fontName='Helvetica', fontSize=8, leading=10, alignment=1)
+    estilo_grupo = ParagraphStyle('Grupo', parent=styles['Heading3'], spaceBefore=12)
+    cabecalho = [titulo for titulo, _ in COLUNAS_PDF]
+
+    for grupo, linhas_grupo in groupby(_acompanhar(_reler(linhas), progresso), key=itemgetter(0)):
+        if agrupar:
+            # O título não fica sozinho no fim da página (keepWithNext juntaria
+            # o título à primeira tabela inteira)
+            yield CondPageBreak(inch)
+            yield Paragraph(f'{AGRUPAMENTOS[agrupar]}: {escape(grupo[1] or "N/A")}', estilo_grupo)
+
+        while True:
+            bloco = list(islice(linhas_grupo, LINHAS_POR_TABELA_PDF))
+            if not bloco:
+                break
+            dados = [cabecalho]
+            for _, nome, cpf, profissao, cargo, equipamento, ativo in bloco:
+                valores = [nome, cpf, profissao, cargo, equipamento, 'Ativo' if ativo else 'Inativo']
+                dados.append([
+                    _celula_pdf(valor, largura, estilo_celula) for valor, largura in zip(valores, larguras)
+                ])
+            yield Table(dados, colWidths=larguras, repeatRows=1, style=ESTILO_TABELA_PDF)
+
+        if agrupar:
+            ativos, inativos = subtotais[grupo, True], subtotais[grupo, False]
+            yield Table(
+                [[f'Subtotal: {ativos + inativos} profissionais ({ativos} ativos, {inativos} inativos)']],
+                colWidths=[sum(larguras)], style=ESTILO_SUBTOTAL_PDF
+            )
+
+
+def gerar_pdf(filtros, destino, progresso=None):
+    """
+    Grava o relatório PDF de profissionais em `destino`.
+
+    As linhas lidas do banco vão para um arquivo temporário (o cursor é
+    fechado antes da composição) e são compostas em tabelas de
+    LINHAS_POR_TABELA_PDF linhas, montadas só quando chega a vez delas na
+    página. Cada tabela traz o cabeçalho, repetido também nas quebras de
+    página, e textos longos quebram linha dentro da coluna. Assim o tempo e
+    a memória crescem linearmente com o número de linhas.
+
+    Com `agrupar` (cidade ou equipamento), cada grupo tem título e subtotal.
+
+    Args:
+        filtros (dict): Resultado de `ler_filtros`
+        destino: Caminho ou arquivo binário onde gravar o PDF
+        progresso (callable): Chamada com o total de linhas escritas a cada lote (opcional)
+    """
+    agrupar = filtros.get('agrupar')
+    total = 0
+    # Quantidade por (grupo, ativo), para os subtotais
+    subtotais = Counter()
+
+    with arquivo_temporario() as linhas:
+        for prof in consultar_profissionais(filtros):
+            if agrupar == 'cidade':
+                grupo = (prof.cidade_id, prof.cidade_nome)
+            elif agrupar == 'equipamento':
+                grupo = (prof.equipamento_id, prof.equipamento_nome)
+            else:
+                grupo = None
+            pickle.dump(
+                (grupo, prof.nome_completo, prof.cpf, prof.profissao, prof.cargo,
+                 prof.equipamento_nome or 'N/A', prof.ativo),
+                linhas, pickle.HIGHEST_PROTOCOL
+            )
+            subtotais[grupo, bool(prof.ativo)] += 1
+            total += 1
+        linhas.seek(0)
+
+        doc = _DocumentoSobDemanda(destino, pagesize=A4)
+        larguras = [fracao * doc.width for _, fracao in COLUNAS_PDF]
+
+        # Estilos
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            spaceAfter=30,
+            alignment=1  # Centralizado
+        )
+
+        # Conteúdo
+        story = []
+
+        # Título
+        title = Paragraph("Relatório de Profissionais", title_style)
+        story.append(title)
+
+        # Informações do relatório
+        info_data = [
+            ['Data de Geração:', datetime.now().strftime('%d/%m/%Y %H:%M')],
+            ['Status:', filtros['status'].title()],
+            ['Total de Registros:', str(total)]
+        ]
+
+        cidade_nome, equipamento_nome = nomes_filtros(filtros)
+        if filtros['cidade_id']:
+            info_data.append(['Cidade:', cidade_nome or 'N/A'])
+
+        if filtros['equipamento_id']:
+            info_data.append(['Equipamento:', equipamento_nome or 'N/A'])
+
+        if agrupar:
+            info_data.append(['Agrupado por:', AGRUPAMENTOS[agrupar]])
+
+        info_table = Table(info_data, colWidths=[2*inch, 4*inch])
+        info_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]))
+
+        story.append(info_table)
+        story.append(Spacer(1, 20))
+
+        # As tabelas de profissionais entram durante a composição
+        if not total:
+            story.append(Paragraph("Nenhum profissional encontrado com os filtros aplicados.", styles['Normal']))
+
+        # Gerar PDF
+        doc.build(story, _secoes_pdf(linhas, larguras, agrupar, subtotais, progresso))
+
+
+def gerar_excel(filtros, destino, progresso=None):
+    """
+    Grava a planilha de profissionais em `destino` com memória constante.
+
+    As larguras das colunas são calculadas durante a leitura do banco. Como
+    o XLSX traz as larguras antes das linhas, as linhas lidas vão para um
+    arquivo temporário e só depois são escritas no modo write-only do
+    openpyxl, que não mantém as células em memória.
+
+    Args:
+        filtros (dict): Resultado de `ler_filtros`
+        destino: Caminho ou arquivo binário (com seek) onde gravar o XLSX
+        progresso (callable): Chamada com o total de linhas escritas a cada lote (opcional)
+    """
+    larguras = [len(cabecalho) for cabecalho in CABECALHOS_EXCEL]
+
+    with arquivo_temporario() as linhas:
+        for prof in consultar_profissionais(filtros):
+            valores = _valores_excel(prof)
+            for coluna, valor in enumerate(valores):
+                if valor is not None and len(str(valor)) > larguras[coluna]:
+                    larguras[coluna] = len(str(valor))
+            pickle.dump(valores, linhas, pickle.HIGHEST_PROTOCOL)
+        linhas.seek(0)
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Profissionais")
+
+        for coluna, largura in enumerate(larguras, 1):
+            ws.column_dimensions[get_column_letter(coluna)].width = min(largura + 2, LARGURA_MAXIMA_EXCEL)
+
+        # Cabeçalhos
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        header_alignment = Alignment(horizontal="center", vertical="center")
+        cabecalhos = []
+        for cabecalho in CABECALHOS_EXCEL:
+            cell = WriteOnlyCell(ws, value=cabecalho)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = header_alignment
+            cabecalhos.append(cell)
+        ws.append(cabecalhos)
+
+        try:
+            for valores in _acompanhar(_reler(linhas), progresso):
+                ws.append(valores)
+        except Exception:
+            # Interrompida (erro ou cancelamento do job): conclui a planilha
+            # parcial em um arquivo descartável nosso, o que faz o openpyxl
+            # apagar o seu arquivo temporário (senão removido só no fim do
+            # processo)
+            with suppress(Exception), tempfile.TemporaryFile() as descarte:
+                wb.save(descarte)
+            raise
+
+        wb.save(destino)
@@ -0,0 +1,139 @@
+from collections import Counter
+from datetime import date, datetime
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import mysql, sqlite
+from src.models.database import db, Auditoria, AuditoriaResumoDiario
+from src.utils.arquivo_auditoria import consultar_arquivo, ler_indice
+
+# Linhas do resumo por INSERT na reconstrução
+LOTE_RECONSTRUCAO = 1000
+
+CHAVE = ('dia', 'acao', 'tabela', 'usuario_id')
+
+
+def _como_data(valor):
+    # func.date() devolve texto no SQLite e date no MySQL
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def _somar(contagens):
+    """Soma as contagens às linhas do resumo (upsert), na transação atual."""
+    tabela = AuditoriaResumoDiario.__table__
+    dialeto = db.session.get_bind().dialect.name
+
+    # Ordem fixa das chaves: transações concorrentes travam as linhas na
+    # mesma sequência e não entram em deadlock
+    linhas = [dict(zip(CHAVE, chave), total=total) for chave, total in sorted(contagens.items())]
+    if not linhas:
+        return
+
+    if dialeto == 'sqlite':
+        comando = sqlite.insert(tabela).values(linhas)
+        comando = comando.on_conflict_do_update(
+            index_elements=[tabela.c[coluna] for coluna in CHAVE],
+            set_={'total': tabela.c.total + comando.excluded.total}
+        )
+        db.session.execute(comando)
+    elif dialeto == 'mysql':
+        comando = mysql.insert(tabela).values(linhas)
+        comando = comando.on_duplicate_key_update(total=tabela.c.total + comando.inserted.total)
+        db.session.execute(comando)
+    else:
+        for linha in linhas:
+            resultado = db.session.execute(
+                tabela.update().where(*[tabela.c[coluna] == linha[coluna] for coluna in CHAVE])
+                     .values(total=tabela.c.total + linha['total'])
+            )
+            if not resultado.rowcount:
+                db.session.execute(tabela.insert().values(**linha))
+
+
+def acumular_resumo(linhas):
+    """
+    Contabiliza no resumo diário as linhas de auditoria que estão sendo
+    gravadas. Deve rodar na mesma transação do INSERT da auditoria.
+
+    Args:
+        linhas (list): Dicts com data_hora, acao, tabela e usuario_id
+    """
+    _somar(Counter(
+        (linha['data_hora'].date(), linha['acao'], linha['tabela'], linha['usuario_id'])
+        for linha in linhas
+    ))
+
+
+def reconstruir_resumo(desde=None):
+    """
+    Recalcula o resumo diário a partir da tabela auditoria e do arquivo.
+
+    Args:
+        desde (date): Recalcula só os dias a partir desta data (padrão: todos)
+
+    Returns:
+        int: Linhas do resumo gravadas
+    """
+    inicio = datetime.combine(desde, datetime.min.time()) if desde else None
+
+    apagar = delete(AuditoriaResumoDiario)
+    consulta = select(
+        func.date(Auditoria.data_hora), Auditoria.acao, Auditoria.tabela, Auditoria.usuario_id, func.count()
+    ).group_by(func.date(Auditoria.data_hora), Auditoria.acao, Auditoria.tabela, Auditoria.usuario_id)
+    if inicio:
+        apagar = apagar.where(AuditoriaResumoDiario.dia >= desde)
+        consulta = consulta.where(Auditoria.data_hora >= inicio)
+
+    contagens = Counter()
+    for dia, acao, tabela, usuario_id, total in db.session.execute(consulta):
+        contagens[(_como_data(dia), acao, tabela, usuario_id)] += total
+
+    # Um arquivamento interrompido deixa o último lote no arquivo e na tabela;
+    # esses registros já foram contados acima
+    datas_arquivadas = [entrada['data_max'] for entrada in ler_indice().values()]
+    na_tabela = set()
+    if datas_arquivadas:
+        na_tabela = set(db.session.execute(
+            select(Auditoria.id).where(Auditoria.data_hora <= datetime.fromisoformat(max(datas_arquivadas)))
+        ).scalars())
+
+    for registro in consultar_arquivo(data_inicio=inicio):
+        if registro['id'] not in na_tabela:
+            contagens[(date.fromisoformat(registro['data_hora'][:10]), registro['acao'],
+                       registro['tabela'], registro['usuario_id'])] += 1
+
+    db.session.execute(apagar)
+    chaves = sorted(contagens)
+    for posicao in range(0, len(chaves), LOTE_RECONSTRUCAO):
+        _somar({chave: contagens[chave] for chave in chaves[posicao:posicao + LOTE_RECONSTRUCAO]})
+    db.session.commit()
+
+    return len(chaves)
+
+
+def consultar_resumo(data_inicio=None, data_fim=None, usuarios_ids=None):
+    """
+    Totais por (acao, tabela, usuario_id) no intervalo de dias.
+
+    Args:
+        data_inicio (date): Primeiro dia (inclusivo)
+        data_fim (date): Último dia (inclusivo)
+        usuarios_ids (set): Restringe aos usuários informados (opcional)
+
+    Returns:
+        list: Tuplas (acao, tabela, usuario_id, total)
+    """
+    resumo = AuditoriaResumoDiario
+    consulta = select(resumo.acao, resumo.tabela, resumo.usuario_id, func.sum(resumo.total))\
+        .group_by(resumo.acao, resumo.tabela, resumo.usuario_id)
+
+    if data_inicio:
+        consulta = consulta.where(resumo.dia >= data_inicio)
+    if data_fim:
+        consulta = consulta.where(resumo.dia <= data_fim)
+    if usuarios_ids is not None:
+        consulta = consulta.where(resumo.usuario_id.in_(sorted(usuarios_ids)))
+
+    return [(acao, tabela, usuario_id, int(total)) for acao, tabela, usuario_id, total in db.session.execute(consulta)]
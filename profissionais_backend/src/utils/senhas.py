@@ -0,0 +1,125 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+
+# Custo padrão do bcrypt (2^12 iterações)
+BCRYPT_ROUNDS_PADRAO = 12
+
+# Threads que executam bcrypt; a extensão libera o GIL durante o hash
+WORKERS_PADRAO = min(4, os.cpu_count() or 1)
+
+# Verificações aguardando na fila, por worker, antes de recusar novas.
+# Também limita quanto uma requisição aceita espera pelo resultado
+# (cerca de FILA_POR_WORKER hashes de ~250 ms)
+FILA_POR_WORKER = 4
+
+
+class SenhasSobrecarregadas(Exception):
+    """A fila de verificação de senhas está cheia."""
+
+
+class _PoolSenhas:
+    """
+    Pool limitado de threads para as operações de bcrypt.
+
+    Limita quantos hashes rodam ao mesmo tempo (e quantos esperam na fila),
+    para que um pico de logins não ocupe toda a CPU dos workers e atrase as
+    demais rotas. Com a fila cheia a requisição é recusada na hora, sem
+    prender a thread do servidor esperando vaga.
+
+    Também mantém o hash fictício de cada custo, usado para emails
+    desconhecidos. Ele é gerado no pool quando o pool inicia ou quando uma
+    operação encontra um custo novo, fora das vagas das requisições.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._vagas = None
+        self._ficticios = {}
+
+    def _iniciar(self):
+        with self._lock:
+            if self._executor is None:
+                workers = current_app.config.get('SENHAS_WORKERS', WORKERS_PADRAO)
+                self._vagas = threading.BoundedSemaphore(workers * (FILA_POR_WORKER + 1))
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+                self._ficticios = {}
+
+    def _preparar_ficticio(self, custo):
+        with self._lock:
+            if custo not in self._ficticios:
+                self._ficticios[custo] = self._executor.submit(
+                    bcrypt.hashpw, os.urandom(16).hex().encode('utf-8'), bcrypt.gensalt(custo)
+                )
+            return self._ficticios[custo]
+
+    def executar(self, funcao, *args):
+        if self._executor is None:
+            self._iniciar()
+        self._preparar_ficticio(custo_configurado())
+
+        if not self._vagas.acquire(blocking=False):
+            raise SenhasSobrecarregadas('Muitas tentativas de login simultâneas, tente novamente')
+
+        try:
+            return self._executor.submit(funcao, *args).result()
+        finally:
+            self._vagas.release()
+
+    def hash_ficticio(self):
+        """Hash de uma senha aleatória com o custo configurado (não ocupa vaga na fila)."""
+        if self._executor is None:
+            self._iniciar()
+        return self._preparar_ficticio(custo_configurado()).result().decode('utf-8')
+
+    def encerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+pool_senhas = _PoolSenhas()
+
+
+def custo_configurado():
+    return current_app.config.get('BCRYPT_ROUNDS', BCRYPT_ROUNDS_PADRAO)
+
+
+def custo_do_hash(senha_hash):
+    """Custo gravado em um hash bcrypt ($2b$<custo>$...)."""
+    try:
+        return int(senha_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def gerar_hash(senha, custo=None):
+    """Gera o hash bcrypt da senha com o custo configurado."""
+    sal = bcrypt.gensalt(custo or custo_configurado())
+    return pool_senhas.executar(bcrypt.hashpw, senha.encode('utf-8'), sal).decode('utf-8')
+
+
+def verificar_senha(senha, senha_hash):
+    """
+    Confere a senha no pool de bcrypt.
+
+    Sem `senha_hash` (email desconhecido), a senha é comparada com um hash
+    fictício do mesmo custo, para que a resposta leve o mesmo tempo de uma
+    senha errada e não revele quais emails estão cadastrados.
+
+    Raises:
+        SenhasSobrecarregadas: Se a fila estiver cheia
+    """
+    conferido = pool_senhas.executar(
+        bcrypt.checkpw, senha.encode('utf-8'), (senha_hash or pool_senhas.hash_ficticio()).encode('utf-8')
+    )
+    return conferido and senha_hash is not None
+
+
+def precisa_rehash(senha_hash):
+    """Indica se o hash foi gerado com um custo diferente do configurado."""
+    return custo_do_hash(senha_hash) != custo_configurado()
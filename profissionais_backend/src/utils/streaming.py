@@ -0,0 +1,105 @@
+import csv
+import io
+import zlib
+from flask import Response, current_app, request, stream_with_context
+
+MIMETYPE_NDJSON = 'application/x-ndjson'
+MIMETYPE_CSV = 'text/csv; charset=utf-8'
+MIMETYPE_GZIP = 'application/gzip'
+
+# Bytes de CSV acumulados antes de enviar um pedaço da resposta
+TAMANHO_PEDACO = 64 * 1024
+
+# Nível de compressão do gzip: próximo do máximo em tamanho, bem mais rápido
+NIVEL_GZIP = 6
+
+# Linhas buscadas do banco por vez no modo streaming
+TAMANHO_LOTE = 500
+
+
+def quer_streaming():
+    """Indica se o cliente pediu a listagem em NDJSON (stream=1 ou Accept)."""
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    melhor = request.accept_mimetypes.best_match(['application/json', MIMETYPE_NDJSON])
+    return melhor == MIMETYPE_NDJSON
+
+
+def resposta_ndjson(query, serializar, cabecalhos=None):
+    """
+    Transmite o resultado da query como NDJSON, um registro por linha.
+
+    A query é percorrida com yield_per, de modo que apenas um lote de
+    registros fica em memória por vez, independente do tamanho do resultado.
+
+    Args:
+        query: Query do SQLAlchemy já filtrada e ordenada
+        serializar: Função que converte um registro em dict
+        cabecalhos (dict): Cabeçalhos adicionais da resposta (opcional)
+    """
+    return resposta_ndjson_registros(
+        (serializar(registro) for registro in query.yield_per(TAMANHO_LOTE)), cabecalhos
+    )
+
+
+def resposta_ndjson_registros(registros, cabecalhos=None):
+    """Transmite como NDJSON um iterável de dicts já serializados."""
+    dumps = current_app.json.dumps
+
+    def gerar():
+        for registro in registros:
+            yield dumps(registro) + '\n'
+
+    return Response(stream_with_context(gerar()), mimetype=MIMETYPE_NDJSON, headers=cabecalhos)
+
+
+def quer_gzip():
+    """Indica se o cliente pediu o arquivo compactado (gzip=1)."""
+    return request.args.get('gzip') in ('1', 'true')
+
+
+def resposta_csv(colunas, lotes, nome_arquivo, compactar=False):
+    """
+    Transmite linhas como CSV (UTF-8), opcionalmente compactado em gzip.
+
+    Cada lote é escrito de uma vez pelo módulo csv; o texto é enviado em
+    pedaços de pelo menos TAMANHO_PEDACO bytes, e a compressão acontece
+    durante a transmissão. Apenas um lote e um pedaço ficam em memória.
+
+    Args:
+        colunas (list): Nomes das colunas (primeira linha do arquivo)
+        lotes: Iterável de lotes (listas de tuplas) na ordem das colunas
+        nome_arquivo (str): Nome sem extensão para o Content-Disposition
+        compactar (bool): Envia .csv.gz em vez de .csv
+    """
+    compressor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compactar else None
+
+    def codificar(texto):
+        dados = texto.encode('utf-8')
+        return compressor.compress(dados) if compressor else dados
+
+    def gerar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator='\n')
+        escritor.writerow(colunas)
+        for lote in lotes:
+            escritor.writerows(lote)
+            if buffer.tell() >= TAMANHO_PEDACO:
+                pedaco = codificar(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+                # O compressor pode reter os dados até ter o suficiente
+                if pedaco:
+                    yield pedaco
+        pedaco = codificar(buffer.getvalue())
+        if compressor:
+            pedaco += compressor.flush()
+        if pedaco:
+            yield pedaco
+
+    extensao = 'csv.gz' if compactar else 'csv'
+    return Response(
+        stream_with_context(gerar()),
+        mimetype=MIMETYPE_GZIP if compactar else MIMETYPE_CSV,
+        headers={'Content-Disposition': f'attachment; filename={nome_arquivo}.{extensao}'}
+    )
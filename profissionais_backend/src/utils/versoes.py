@@ -0,0 +1,90 @@
+import hashlib
+import json
+from flask import request
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
+from src.models.database import db, VersaoDados
+
+
+def escopos_profissionais(*cidades_ids):
+    """Escopos afetados por uma escrita em profissionais das cidades informadas."""
+    escopos = ['profissionais']
+    for cidade_id in cidades_ids:
+        if cidade_id is not None:
+            escopo = f'profissionais:cidade:{cidade_id}'
+            if escopo not in escopos:
+                escopos.append(escopo)
+    return escopos
+
+
+def escopo_leitura_profissionais(usuario):
+    """Escopo cujo contador cobre tudo o que o usuário pode listar."""
+    if usuario.nivel_acesso < 4 and usuario.cidade_id:
+        return f'profissionais:cidade:{usuario.cidade_id}'
+    return 'profissionais'
+
+
+def incrementar_versao(*escopos):
+    """
+    Incrementa os contadores de versão na transação atual.
+
+    Deve ser chamado antes do commit da alteração, para que o novo valor só
+    fique visível junto com os dados.
+    """
+    tabela = VersaoDados.__table__
+    dialeto = db.session.get_bind().dialect.name
+
+    for escopo in escopos:
+        if dialeto == 'sqlite':
+            comando = sqlite.insert(tabela).values(escopo=escopo, versao=1)
+            comando = comando.on_conflict_do_update(
+                index_elements=[tabela.c.escopo],
+                set_={'versao': tabela.c.versao + 1}
+            )
+        elif dialeto == 'mysql':
+            comando = mysql.insert(tabela).values(escopo=escopo, versao=1)
+            comando = comando.on_duplicate_key_update(versao=tabela.c.versao + 1)
+        else:
+            resultado = db.session.execute(
+                tabela.update().where(tabela.c.escopo == escopo)
+                     .values(versao=tabela.c.versao + 1)
+            )
+            if resultado.rowcount:
+                continue
+            comando = tabela.insert().values(escopo=escopo, versao=1)
+
+        db.session.execute(comando)
+
+
+def ler_versoes(*escopos):
+    """Lê os contadores dos escopos em uma única consulta (0 se inexistente)."""
+    linhas = db.session.execute(
+        select(VersaoDados.escopo, VersaoDados.versao).where(VersaoDados.escopo.in_(escopos))
+    ).all()
+    versoes = dict(linhas)
+    return [versoes.get(escopo, 0) for escopo in escopos]
+
+
+def gerar_etag(escopos, *partes):
+    """
+    Gera um ETag forte a partir das versões dos escopos e dos parâmetros da
+    requisição (query string e demais `partes` que alterem a resposta).
+    """
+    conteudo = json.dumps(
+        [list(zip(escopos, ler_versoes(*escopos))), sorted(request.args.items(multi=True)), partes],
+        separators=(',', ':'),
+        default=str
+    )
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+
+def cabecalhos_etag(etag):
+    # no-cache obriga o navegador a revalidar com If-None-Match a cada uso
+    return {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+
+
+def nao_modificado(etag):
+    """Retorna a resposta 304 se o cliente já possui a versão `etag`, senão None."""
+    if request.if_none_match.contains(etag) or request.if_none_match.star_tag:
+        return '', 304, cabecalhos_etag(etag)
+    return None
@@ -0,0 +1,91 @@
+"""
+Auditoria das operações em lote: versão registrada e snapshots periódicos.
+
+Uso:
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import select
+from src.models.database import db, Auditoria, Cidade, Equipamento, Profissional
+from src.utils.diferencas_auditoria import reconstruir_estado
+from src.utils.lote import atualizar_em_lote, selecionar
+from src.utils.contagem_profissionais import CAMPOS_CONTAGEM
+
+INTERVALO = 4
+
+
+class AuditoriaLoteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['AUDITORIA_INTERVALO_SNAPSHOT'] = INTERVALO
+        db.init_app(self.app)
+        self.contexto = self.app.app_context()
+        self.contexto.push()
+        db.create_all()
+
+        agora = datetime.utcnow()
+        db.session.add(Cidade(id=1, nome='Cidade 1', status='ativo', data_cadastro=agora))
+        db.session.add(Equipamento(id=1, nome='CRAS 1', status='ativo', data_cadastro=agora))
+        profissional = Profissional(
+            equipamento_id=1, cidade_id=1, nome_completo='Ana Silva', data_nascimento=date(1980, 1, 1),
+            cpf='000.000.000-01', rg='RG1', data_expedicao_rg=date(2000, 1, 1), escolaridade='Superior',
+            profissao='Assistente Social', cargo='Técnico', vinculo_institucional='Efetivo',
+            telefone='(11) 99999-0000', email='ana@exemplo.com', data_inicio_trabalho=date(2020, 1, 1),
+            endereco_residencial='Rua A, 1', data_cadastro=agora, ativo=True
+        )
+        db.session.add(profissional)
+        db.session.flush()
+        db.session.add(Auditoria(
+            usuario_id=1, acao='CREATE', tabela='profissionais', registro_id=profissional.id,
+            dados_novos=profissional.to_dict(), snapshot=True, data_hora=agora
+        ))
+        db.session.commit()
+        self.profissional_id = profissional.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.contexto.pop()
+
+    def alternar_status(self, ativo):
+        valores = {'ativo': ativo, 'motivo_inativacao': None if ativo else 'Transferência', 'data_inativacao': None}
+        colunas = list(dict.fromkeys([*valores, *CAMPOS_CONTAGEM, 'versao']))
+        atuais = selecionar([], [self.profissional_id], colunas)
+        alterados = atualizar_em_lote(atuais, valores, 'UPDATE', 1)
+        db.session.commit()
+        return alterados
+
+    def test_inativacao_em_lote_atravessando_snapshot(self):
+        # versão 1 (criação) -> 5, passando pela versão de snapshot 4
+        for ativo in (False, True, False, True):
+            self.assertEqual(self.alternar_status(ativo), [self.profissional_id])
+
+        versao = db.session.execute(
+            select(Profissional.versao).where(Profissional.id == self.profissional_id)
+        ).scalar()
+        self.assertEqual(versao, 5)
+
+        estado = reconstruir_estado('profissionais', self.profissional_id, datetime.utcnow())
+        self.assertEqual(estado['versao'], versao)
+        self.assertEqual(estado, db.session.get(Profissional, self.profissional_id).to_dict())
+
+        snapshots = db.session.execute(
+            select(Auditoria.dados_novos)
+            .where(Auditoria.tabela == 'profissionais', Auditoria.registro_id == self.profissional_id,
+                   Auditoria.acao == 'UPDATE', Auditoria.snapshot == True)
+        ).scalars().all()
+        self.assertEqual([dados['versao'] for dados in snapshots], [INTERVALO])
+        self.assertEqual(len(snapshots[0]), len(estado))
+
+
+if __name__ == '__main__':
+    unittest.main()
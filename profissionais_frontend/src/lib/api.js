@@ -22,13 +22,49 @@ api.interceptors.request.use(
   }
 );
 
+// Renovação do token de acesso (uma única chamada para requisições simultâneas)
+let renovacao = null;
+
+const renovarToken = () => {
+  if (!renovacao) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    renovacao = (refreshToken
+      ? axios.post('/api/auth/refresh', null, { headers: { Authorization: `Bearer ${refreshToken}` } })
+          .then((response) => {
+            localStorage.setItem('token', response.data.access_token);
+            localStorage.setItem('refresh_token', response.data.refresh_token);
+            return response.data.access_token;
+          })
+      : Promise.reject(new Error('Sem refresh token'))
+    ).finally(() => {
+      renovacao = null;
+    });
+  }
+  return renovacao;
+};
+
 // Interceptor para tratar respostas e erros
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401) {
+  async (error) => {
+    const original = error.config;
+    
+    if (error.response?.status === 401 && original && !original._renovado && !original.url?.startsWith('/auth/')) {
+      // Token de acesso expirado: renovar e repetir a requisição uma vez
+      original._renovado = true;
+      try {
+        const token = await renovarToken();
+        original.headers.Authorization = `Bearer ${token}`;
+        return api(original);
+      } catch {
+        // Refresh token expirado ou revogado: cai no logout abaixo
+      }
+    }
+    
+    if (error.response?.status === 401 && !original?.url?.startsWith('/auth/login')) {
       // Token expirado ou inválido
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
       localStorage.removeItem('user');
       window.location.href = '/login';
     }
@@ -48,6 +84,13 @@ export const auth = {
     return response.data;
   },
   
+  logout: async (token, refreshToken) => {
+    const response = await axios.post('/api/auth/logout', { refresh_token: refreshToken }, {
+      headers: { Authorization: `Bearer ${token}` }
+    });
+    return response.data;
+  },
+  
   getCurrentUser: async () => {
     const response = await api.get('/auth/me');
     return response.data;
@@ -105,25 +148,75 @@ export const equipamentos = {
   }
 };
 
+// Itens por página na listagem de profissionais
+const LIMITE_PROFISSIONAIS = 100;
+
 // Funções para profissionais
 export const profissionais = {
-  listar: async (filtros = {}) => {
+  // Uma página de profissionais; passe o proximoCursor retornado para buscar a seguinte
+  listar: async (filtros = {}, cursor = null) => {
     const params = new URLSearchParams();
     Object.keys(filtros).forEach(key => {
       if (filtros[key]) {
         params.append(key, filtros[key]);
       }
     });
+    params.append('limit', LIMITE_PROFISSIONAIS);
+    if (cursor) {
+      params.append('cursor', cursor);
+    }
     
     const response = await api.get(`/profissionais?${params.toString()}`);
-    return response.data;
+    return {
+      registros: response.data,
+      proximoCursor: response.headers['x-next-cursor'] || null
+    };
   },
   
-  obter: async (id) => {
-    const response = await api.get(`/profissionais/${id}`);
+  // Total com os filtros, lido de X-Total-Count (sem baixar a lista);
+  // acima de 10.000 o valor é um piso e `aproximado` vem true
+  contar: async (filtros = {}) => {
+    const params = new URLSearchParams();
+    Object.keys(filtros).forEach(key => {
+      if (filtros[key]) {
+        params.append(key, filtros[key]);
+      }
+    });
+    params.append('limit', 1);
+    params.append('fields', 'id');
+    params.append('total', 1);
+    
+    const response = await api.get(`/profissionais?${params.toString()}`);
+    return {
+      total: Number(response.headers['x-total-count'] || 0),
+      aproximado: response.headers['x-total-count-approximate'] === 'true'
+    };
+  },
+  
+  // asOf (ISO 8601): estado do profissional nesse instante, reconstruído pela auditoria
+  obter: async (id, asOf = null) => {
+    const params = new URLSearchParams();
+    if (asOf) {
+      params.append('as_of', asOf);
+    }
+    
+    const response = await api.get(`/profissionais/${id}?${params.toString()}`);
     return response.data;
   },
   
+  historico: async (id, cursor = null) => {
+    const params = new URLSearchParams();
+    if (cursor) {
+      params.append('cursor', cursor);
+    }
+    
+    const response = await api.get(`/profissionais/${id}/historico?${params.toString()}`);
+    return {
+      alteracoes: response.data,
+      proximoCursor: response.headers['x-next-cursor'] || null
+    };
+  },
+  
   criar: async (profissionalData) => {
     const response = await api.post('/profissionais', profissionalData);
     return response.data;
@@ -172,20 +265,34 @@ export const usuarios = {
 
 // Funções para auditoria
 export const auditoria = {
-  listar: async (filtros = {}) => {
+  // Uma página de registros; passe o proximoCursor retornado para buscar a seguinte
+  listar: async (filtros = {}, cursor = null) => {
     const params = new URLSearchParams();
     Object.keys(filtros).forEach(key => {
       if (filtros[key]) {
         params.append(key, filtros[key]);
       }
     });
+    if (cursor) {
+      params.append('cursor', cursor);
+    }
     
     const response = await api.get(`/auditoria?${params.toString()}`);
-    return response.data;
+    return {
+      registros: response.data,
+      proximoCursor: response.headers['x-next-cursor'] || null
+    };
   },
   
-  estatisticas: async () => {
-    const response = await api.get('/auditoria/estatisticas');
+  estatisticas: async (periodo = {}) => {
+    const params = new URLSearchParams();
+    ['data_inicio', 'data_fim'].forEach(key => {
+      if (periodo[key]) {
+        params.append(key, periodo[key]);
+      }
+    });
+    
+    const response = await api.get(`/auditoria/estatisticas?${params.toString()}`);
     return response.data;
   }
 };
@@ -220,6 +327,53 @@ export const relatorios = {
     return response.data;
   },
   
+  // Jobs: o relatório é gerado em segundo plano e baixado quando concluído
+  criarJob: async (formato, filtros = {}) => {
+    const dados = { formato };
+    Object.keys(filtros).forEach(key => {
+      if (filtros[key]) {
+        dados[key] = filtros[key];
+      }
+    });
+    
+    const response = await api.post('/relatorios/jobs', dados);
+    return response.data;
+  },
+  
+  obterJob: async (id) => {
+    const response = await api.get(`/relatorios/jobs/${id}`);
+    return response.data;
+  },
+  
+  cancelarJob: async (id) => {
+    const response = await api.post(`/relatorios/jobs/${id}/cancelar`);
+    return response.data;
+  },
+  
+  baixarJob: async (id) => {
+    const response = await api.get(`/relatorios/jobs/${id}/download`, {
+      responseType: 'blob'
+    });
+    return response.data;
+  },
+  
+  // Cria o job, consulta o andamento a cada `intervalo` ms e retorna o arquivo
+  gerarEmSegundoPlano: async (formato, filtros = {}, aoProgredir = null, intervalo = 1000) => {
+    let job = await relatorios.criarJob(formato, filtros);
+    while (job.status === 'pendente' || job.status === 'executando') {
+      await new Promise(resolve => setTimeout(resolve, intervalo));
+      job = await relatorios.obterJob(job.id);
+      if (aoProgredir) {
+        aoProgredir(job);
+      }
+    }
+    
+    if (job.status !== 'concluido') {
+      throw new Error(job.erro || `Relatório ${job.status}`);
+    }
+    return relatorios.baixarJob(job.id);
+  },
+  
   obterEstatisticas: async () => {
     const response = await api.get('/relatorios/estatisticas');
     return response.data;
@@ -31,6 +31,7 @@ export const AuthProvider = ({ children }) => {
       const response = await auth.login(email, senha);
       
       localStorage.setItem('token', response.access_token);
+      localStorage.setItem('refresh_token', response.refresh_token);
       localStorage.setItem('user', JSON.stringify(response.usuario));
       
       setUser(response.usuario);
@@ -45,7 +46,13 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    // Revoga os tokens no servidor; a sessão local é encerrada mesmo se a chamada falhar
+    const token = localStorage.getItem('token');
+    if (token) {
+      auth.logout(token, localStorage.getItem('refresh_token')).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     localStorage.removeItem('user');
     setUser(null);
   };
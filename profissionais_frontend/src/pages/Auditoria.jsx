@@ -11,6 +11,8 @@ import { useAuth } from '../lib/auth.jsx';
 
 const Auditoria = () => {
   const [auditoriaList, setAuditoriaList] = useState([]);
+  const [proximoCursor, setProximoCursor] = useState(null);
+  const [carregandoMais, setCarregandoMais] = useState(false);
   const [usuariosList, setUsuariosList] = useState([]);
   const [estatisticas, setEstatisticas] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -38,10 +40,11 @@ const Auditoria = () => {
       const [auditoriaData, usuariosData, estatisticasData] = await Promise.all([
         auditoria.listar(filtros),
         usuarios.listar(),
-        auditoria.estatisticas()
+        auditoria.estatisticas(filtros)
       ]);
       
-      setAuditoriaList(auditoriaData);
+      setAuditoriaList(auditoriaData.registros);
+      setProximoCursor(auditoriaData.proximoCursor);
       setUsuariosList(usuariosData);
       setEstatisticas(estatisticasData);
     } catch (error) {
@@ -52,6 +55,20 @@ const Auditoria = () => {
     }
   };
 
+  const carregarMais = async () => {
+    try {
+      setCarregandoMais(true);
+      const pagina = await auditoria.listar(filtros, proximoCursor);
+      setAuditoriaList(anteriores => [...anteriores, ...pagina.registros]);
+      setProximoCursor(pagina.proximoCursor);
+    } catch (error) {
+      console.error('Erro ao carregar mais registros:', error);
+      setError('Erro ao carregar dados de auditoria');
+    } finally {
+      setCarregandoMais(false);
+    }
+  };
+
   const getUsuarioNome = (usuarioId) => {
     const usuario = usuariosList.find(u => u.id === usuarioId);
     return usuario ? usuario.nome_completo : 'Usuário não encontrado';
@@ -165,8 +182,8 @@ const Auditoria = () => {
             </CardHeader>
             <CardContent>
               <div className="space-y-2">
-                {estatisticas.usuarios.slice(0, 5).map((item, index) => (
-                  <div key={index} className="flex justify-between items-center">
+                {estatisticas.usuarios.slice(0, 5).map((item) => (
+                  <div key={item.usuario_id} className="flex justify-between items-center">
                     <span className="text-sm truncate">{item.usuario}</span>
                     <span className="text-sm font-medium">{item.total}</span>
                   </div>
@@ -325,6 +342,14 @@ const Auditoria = () => {
         ))}
       </div>
 
+      {proximoCursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={carregarMais} disabled={carregandoMais}>
+            {carregandoMais ? 'Carregando...' : 'Carregar mais'}
+          </Button>
+        </div>
+      )}
+
       {auditoriaList.length === 0 && (
         <Card>
           <CardContent className="text-center py-8">
@@ -3,6 +3,9 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '../co
 import { Users, Building2, MapPin, UserCheck, UserX } from 'lucide-react';
 import { profissionais, equipamentos, cidades } from '../lib/api';
 
+// Totais acima do limite de contagem exata aparecem como piso ("10000+")
+const formatarTotal = ({ total, aproximado }) => (aproximado ? `${total}+` : total);
+
 const Dashboard = () => {
   const [stats, setStats] = useState({
     totalProfissionais: 0,
@@ -16,24 +19,25 @@ const Dashboard = () => {
   useEffect(() => {
     const fetchStats = async () => {
       try {
+        // Só as contagens (X-Total-Count), sem baixar os profissionais
         const [
-          profissionaisData,
-          profissionaisAtivosData,
-          profissionaisInativosData,
+          profissionaisTotal,
+          profissionaisAtivosTotal,
+          profissionaisInativosTotal,
           equipamentosData,
           cidadesData
         ] = await Promise.all([
-          profissionais.listar(),
-          profissionais.listar({ status: 'ativo' }),
-          profissionais.listar({ status: 'inativo' }),
+          profissionais.contar({ status: 'todos' }),
+          profissionais.contar({ status: 'ativo' }),
+          profissionais.contar({ status: 'inativo' }),
           equipamentos.listar(),
           cidades.listar()
         ]);
 
         setStats({
-          totalProfissionais: profissionaisData.length,
-          profissionaisAtivos: profissionaisAtivosData.length,
-          profissionaisInativos: profissionaisInativosData.length,
+          totalProfissionais: formatarTotal(profissionaisTotal),
+          profissionaisAtivos: formatarTotal(profissionaisAtivosTotal),
+          profissionaisInativos: formatarTotal(profissionaisInativosTotal),
           totalEquipamentos: equipamentosData.length,
           totalCidades: cidadesData.length
         });
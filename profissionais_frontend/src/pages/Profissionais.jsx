@@ -13,6 +13,8 @@ import { useAuth } from '../lib/auth.jsx';
 
 const Profissionais = () => {
   const [profissionaisList, setProfissionaisList] = useState([]);
+  const [proximoCursor, setProximoCursor] = useState(null);
+  const [carregandoMais, setCarregandoMais] = useState(false);
   const [cidadesList, setCidadesList] = useState([]);
   const [equipamentosList, setEquipamentosList] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -24,6 +26,7 @@ const Profissionais = () => {
     cargo: ''
   });
   const [searchTerm, setSearchTerm] = useState('');
+  const [busca, setBusca] = useState('');
   const [showInativarDialog, setShowInativarDialog] = useState(false);
   const [profissionalSelecionado, setProfissionalSelecionado] = useState(null);
   const [motivoInativacao, setMotivoInativacao] = useState('');
@@ -31,20 +34,27 @@ const Profissionais = () => {
 
   const { hasPermission } = useAuth();
 
+  // A busca é feita no servidor (parâmetro q) depois de uma pausa na digitação
+  useEffect(() => {
+    const timer = setTimeout(() => setBusca(searchTerm.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
   useEffect(() => {
     fetchData();
-  }, [filtros]);
+  }, [filtros, busca]);
 
   const fetchData = async () => {
     try {
       setLoading(true);
       const [profissionaisData, cidadesData, equipamentosData] = await Promise.all([
-        profissionais.listar(filtros),
+        profissionais.listar({ ...filtros, q: busca }),
         cidades.listar(),
         equipamentos.listar()
       ]);
 
-      setProfissionaisList(profissionaisData);
+      setProfissionaisList(profissionaisData.registros);
+      setProximoCursor(profissionaisData.proximoCursor);
       setCidadesList(cidadesData);
       setEquipamentosList(equipamentosData);
     } catch (error) {
@@ -55,6 +65,20 @@ const Profissionais = () => {
     }
   };
 
+  const carregarMais = async () => {
+    try {
+      setCarregandoMais(true);
+      const pagina = await profissionais.listar({ ...filtros, q: busca }, proximoCursor);
+      setProfissionaisList(anteriores => [...anteriores, ...pagina.registros]);
+      setProximoCursor(pagina.proximoCursor);
+    } catch (error) {
+      console.error('Erro ao carregar mais profissionais:', error);
+      setError('Erro ao carregar dados');
+    } finally {
+      setCarregandoMais(false);
+    }
+  };
+
   const handleInativar = async () => {
     if (!profissionalSelecionado || !motivoInativacao.trim()) {
       setError('Motivo da inativação é obrigatório');
@@ -83,7 +107,7 @@ const Profissionais = () => {
 
   const handleExportPDF = async () => {
     try {
-      const blob = await relatorios.gerarPDF(filtros);
+      const blob = await relatorios.gerarEmSegundoPlano('pdf', filtros);
       const url = window.URL.createObjectURL(blob);
       const link = document.createElement('a');
       link.href = url;
@@ -99,7 +123,7 @@ const Profissionais = () => {
 
   const handleExportExcel = async () => {
     try {
-      const blob = await relatorios.gerarExcel(filtros);
+      const blob = await relatorios.gerarEmSegundoPlano('excel', filtros);
       const url = window.URL.createObjectURL(blob);
       const link = document.createElement('a');
       link.href = url;
@@ -113,11 +137,6 @@ const Profissionais = () => {
     }
   };
 
-  const filteredProfissionais = profissionaisList.filter(prof =>
-    prof.nome_completo.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    prof.cpf.includes(searchTerm) ||
-    prof.email.toLowerCase().includes(searchTerm.toLowerCase())
-  );
 
   const getCidadeNome = (cidadeId) => {
     const cidade = cidadesList.find(c => c.id === cidadeId);
@@ -259,7 +278,7 @@ const Profissionais = () => {
 
       {/* Lista de Profissionais */}
       <div className="grid grid-cols-1 gap-4">
-        {filteredProfissionais.map((profissional) => (
+        {profissionaisList.map((profissional) => (
           <Card key={profissional.id}>
             <CardContent className="p-6">
               <div className="flex items-center justify-between">
@@ -349,7 +368,15 @@ const Profissionais = () => {
         ))}
       </div>
 
-      {filteredProfissionais.length === 0 && (
+      {proximoCursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={carregarMais} disabled={carregandoMais}>
+            {carregandoMais ? 'Carregando...' : 'Carregar mais'}
+          </Button>
+        </div>
+      )}
+
+      {profissionaisList.length === 0 && (
         <Card>
           <CardContent className="text-center py-8">
             <p className="text-gray-500">Nenhum profissional encontrado com os filtros aplicados.</p>